@@ -1,79 +1,250 @@
+import asyncio
 import logging
-from fastapi import APIRouter
+import re
+import time
+import uuid
+from contextlib import aclosing
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request, Response
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
-from app.api.schemas import ChatRequest, ChatResponse
+from app.api import sse
+from app.api.schemas import ChatBatchItem, ChatBatchRequest, ChatRequest, ChatResponse
+from app.core import metrics
+from app.core.config import get_settings
 from app.rag.container import get_rag
-import json
+from app.rag.llm.scheduler import LLMBusy
 
 router = APIRouter(tags=["Chat"])
 logger = logging.getLogger("app.chat")
 
+# words with their trailing whitespace, so replayed answers keep newlines
+_REPLAY_RE = re.compile(r"\S+\s*")
+
 @router.post("/chat", response_model=ChatResponse, summary="Chat with the RAG Bot")
-def chat(req: ChatRequest):
+async def chat(req: ChatRequest, response: Response):
     logger.info("Received message: %s", req.message)
+    started = time.perf_counter()
+
+    # RAG container (first call builds it; keep that off the event loop)
+    rag = await run_in_threadpool(get_rag)
+    session_id = _session_id(rag, req)
+
+    try:
+        answer, citations, turn = await rag.aanswer(
+            req.message,
+            history=req.history,
+            session_id=session_id
+        )
+    except LLMBusy as e:
+        # admission control: fail fast so the client can retry
+        logger.warning("Chat rejected: %s", e)
+        raise HTTPException(status_code=503, detail=rag.busy_text, headers=_retry_after())
 
-    # RAG container
-    rag = get_rag()
+    total = time.perf_counter() - started
+    metrics.REQUEST_SECONDS.observe(total, endpoint="chat")
+    if get_settings().app.metrics.timing_header:
+        response.headers["Server-Timing"] = _server_timing(turn, total)
 
-    answer, citations = rag.chat(
-        req.message, 
-        history=req.history, 
-        session_id=req.session_id
+    return ChatResponse(
+        answer=answer,
+        citations=citations,
+        session_id=_held(rag, session_id),
+        session_restored=_session_restored(req, turn),
     )
 
-    return ChatResponse(answer=answer, citations=citations)
+
+def _retry_after() -> dict:
+    return {"Retry-After": str(max(1, round(get_settings().ollama.scheduler.queue_timeout_s)))}
+
+
+def _session_id(rag, req: ChatRequest):
+    # with server-side sessions, a request that sends history but no id starts
+    # a new session; one-off questions (neither) get none
+    if req.session_id or rag.sessions is None or not req.history:
+        return req.session_id
+    return uuid.uuid4().hex
+
+
+def _held(rag, session_id):
+    # echo the id only when the server keeps the history, so clients know they can stop sending it
+    return session_id if rag.sessions is not None else None
+
+
+def _session_restored(req: ChatRequest, turn) -> Optional[bool]:
+    # only meaningful for a session the client asked to continue
+    if not req.session_id or turn is None or turn.ctx is None:
+        return None
+    return turn.ctx.session_restored
+
+
+@router.post("/chat/batch", summary="Answer many questions; NDJSON lines as each one completes")
+async def chat_batch(req: ChatBatchRequest):
+    limit = get_settings().rag.batch.max_requests
+    if len(req.requests) > limit:
+        raise HTTPException(status_code=413, detail=f"Batch of {len(req.requests)} exceeds rag.batch.max_requests={limit}")
+    logger.info("Received BATCH of %d messages", len(req.requests))
+
+    started = time.perf_counter()
+    rag = await run_in_threadpool(get_rag)
+
+    async def lines():
+        sent = set()
+        try:
+            async for item in rag.aanswer_batch(req.requests, max_concurrency=req.max_concurrency):
+                sent.add(item.index)
+                yield ChatBatchItem(
+                    index=item.index,
+                    answer=item.answer,
+                    citations=item.citations,
+                    outcome=item.outcome,
+                    error=item.error,
+                ).model_dump_json() + "\n"
+        except Exception as e:
+            # headers are already sent; report the failure on every unanswered line
+            logger.exception("Batch failed")
+            for index in range(len(req.requests)):
+                if index not in sent:
+                    yield ChatBatchItem(index=index, error=str(e)).model_dump_json() + "\n"
+        finally:
+            metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="chat_batch")
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def _server_timing(turn, total: float) -> str:
+    timings = dict(turn.ctx.timings or {}) if turn.ctx is not None else {}
+    timings["total"] = total
+    return metrics.server_timing(timings)
+
+
+def _done_event(turn, total: float, session_id=None, session_restored=None) -> str:
+    # stream headers are already sent, so the session id and the opt-in timing breakdown ride on `done`
+    data = {}
+    if session_id:
+        data["session_id"] = session_id
+    if session_restored is not None:
+        data["session_restored"] = session_restored
+    if get_settings().app.metrics.timing_header:
+        timings = dict(turn.ctx.timings or {}) if turn is not None and turn.ctx is not None else {}
+        timings["total"] = total
+        data["timing_ms"] = {k: round(v * 1000, 1) for k, v in timings.items()}
+    return sse.event("done", data)
 
 
 @router.post("/chat/stream", summary="Chat with streaming tokens (SSE)")
-def chat_stream(req: ChatRequest):
+async def chat_stream(req: ChatRequest, request: Request):
     logger.info("Received STREAM message: %s", req.message)
 
-    rag = get_rag()
+    started = time.perf_counter()
+    rag = await run_in_threadpool(get_rag)
+    session_id = _session_id(rag, req)
+
+    stream_cfg = get_settings().app.stream
 
-    def event_stream():
-        prompt, citations, deny_text = rag.build_prompt_and_citations(
+    async def event_stream():
+        prepare = asyncio.ensure_future(rag.aprepare(
             question=req.message,
             history=req.history,
-            session_id=req.session_id,
-        )
-        if prompt is None:
-            if deny_text:
-                for word in deny_text.split():
-                    yield f"event: token\ndata: {json.dumps({'t': word + ' '})} \n\n"
-            yield "event: done\ndata: {} \n\n"
+            session_id=session_id,
+        ))
+        try:
+            # rewrite / retrieval can take a while; keep idle proxies from timing out
+            async for beat in sse.heartbeats_until(prepare, stream_cfg.heartbeat_s):
+                yield beat
+        finally:
+            if not prepare.done():
+                prepare.cancel()
+        try:
+            turn = prepare.result()
+        except LLMBusy as e:
+            # headers are sent: answer with the busy message instead of a 503
+            logger.warning("Stream rejected: %s", e)
+            yield sse.token_event(rag.busy_text)
+            yield _finish_stream(None)
+            return
+
+        # answer cache hit: replay the stored answer (one frame, or a fast word stream)
+        if turn.cached:
+            metrics.STREAM_TTFT_SECONDS.observe(time.perf_counter() - started)
+            pieces = [turn.cached_answer] if stream_cfg.coalesce else _REPLAY_RE.findall(turn.cached_answer)
+            for piece in pieces:
+                yield sse.token_event(piece)
+            yield sse.event("citations", turn.citations)
+            yield _finish_stream(turn)
+            return
+
+        # deny path (no llm call)
+        if turn.prompt is None:
+            if turn.deny_text:
+                metrics.STREAM_TTFT_SECONDS.observe(time.perf_counter() - started)
+                pieces = [turn.deny_text] if stream_cfg.coalesce else [w + " " for w in turn.deny_text.split()]
+                for piece in pieces:
+                    yield sse.token_event(piece)
+            yield _finish_stream(turn)
             return
 
-        #buffering the answer to send citation only if there is prompt 
-        answer_buffer = []
-        
+        if stream_cfg.early_citations:
+            yield sse.event("citations", turn.citations)
 
+        first_token_at = None
+        # streams token from llm, merged into fewer frames
+        tokens = sse.TokenCoalescer(
+            rag.agenerate_stream(turn, max_tokens=req.max_tokens),
+            flush_s=stream_cfg.flush_ms / 1000,
+            flush_bytes=stream_cfg.flush_bytes,
+            heartbeat_s=stream_cfg.heartbeat_s,
+        )
 
-        # deny path (no llm call)    
-        if deny_text:
-            for word in deny_text.split():
-                yield f"event: token\ndata: {json.dumps({'t': word + ' '})}\n\n"
-            yield "event: done\ndata: {}\n\n"
+        try:
+            # aclosing: an abandoned stream closes the llm stream now, not at gc
+            async with aclosing(tokens.__aiter__()) as pieces:
+                async for piece in pieces:
+                    if piece is None:
+                        yield sse.HEARTBEAT
+                        continue
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        metrics.STREAM_TTFT_SECONDS.observe(first_token_at - started)
+                    yield sse.token_event(piece)
+        except LLMBusy as e:
+            logger.warning("Stream rejected: %s", e)
+            rag.busy(turn)
+            yield sse.token_event(rag.busy_text)
+            yield _finish_stream(turn)
             return
-        
-        # streams token from llm 
-        for chunk in rag.llm.generate_stream(prompt):
-            if chunk:
-                answer_buffer.append(chunk)
-                yield f"event: token\ndata: {json.dumps({'t': chunk})}\n\n"
-        
-        full_answer = "".join(answer_buffer)
+        except (asyncio.CancelledError, GeneratorExit):
+            # client went away; the upstream response is closed by now
+            rag.abort(turn, "client_disconnect")
+            raise
 
+        if first_token_at is not None and tokens.chunks > 1:
+            gen_s = time.perf_counter() - first_token_at
+            if gen_s > 0:
+                metrics.STREAM_TOKENS_PER_SECOND.observe((tokens.chunks - 1) / gen_s)
+
+        full_answer = tokens.text
+
+        citations = rag.finish(turn, full_answer)
         if rag._is_no_answer(full_answer):
-            yield "event: done\ndata: {}\n\n"
+            if stream_cfg.early_citations:
+                # retract the citations sent up front
+                yield sse.event("citations", [])
+            yield _finish_stream(turn)
             return
 
-        # send citations first
-        yield f"event: citations\ndata: {json.dumps(citations)}\n\n"
-        yield "event: done\ndata: {}\n\n"
-    
+        if not stream_cfg.early_citations:
+            yield sse.event("citations", citations)
+        yield _finish_stream(turn)
+
+    def _finish_stream(turn) -> str:
+        total = time.perf_counter() - started
+        metrics.REQUEST_SECONDS.observe(total, endpoint="chat_stream")
+        return _done_event(turn, total, _held(rag, session_id), _session_restored(req, turn))
+
     return StreamingResponse(
-        event_stream(),
+        sse.until_disconnected(request, event_stream()),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
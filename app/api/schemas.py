@@ -8,7 +8,10 @@ class ChatTurn(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
+    # optional: with server-side sessions, send only `message` + `session_id`
     history: List[ChatTurn] = Field(default_factory=list)
+    # streaming only: stop the answer after this many tokens (capped by ollama.llm.max_tokens)
+    max_tokens: Optional[int] = Field(default=None, ge=1)
 
 class Citation(BaseModel):
     source: str 
@@ -21,3 +24,21 @@ class Citation(BaseModel):
 class ChatResponse(BaseModel):
     answer: str
     citations: List[Citation] = Field(default_factory=list)
+    # session to continue (server-assigned when the request had none)
+    session_id: Optional[str] = None
+    # false: the request's session_id had no stored history (expired, evicted or
+    # server restarted), so the answer had no context; re-send `history`
+    session_restored: Optional[bool] = None
+
+class ChatBatchRequest(BaseModel):
+    requests: List[ChatRequest] = Field(min_length=1)
+    # generations in flight at once, capped by rag.batch.max_concurrency (None = that value)
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+
+class ChatBatchItem(BaseModel):
+    # one NDJSON line of /chat/batch, in completion order
+    index: int
+    answer: Optional[str] = None
+    citations: List[Citation] = Field(default_factory=list)
+    outcome: Optional[str] = None
+    error: Optional[str] = None
@@ -0,0 +1,176 @@
+"""
+Server-sent event framing for the streaming chat route.
+
+`TokenCoalescer` merges LLM chunks into fewer `token` frames (flushed on a
+time or size budget) and reports idle gaps so the route can send
+heartbeat comments that keep proxies from closing the connection.
+`until_disconnected` stops the frame generator when the client goes away.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, List, Optional
+
+from starlette.requests import Request
+
+# comment frame: ignored by EventSource clients, keeps idle proxies open
+HEARTBEAT = ": keep-alive\n\n"
+
+
+def event(name: str, data: Any) -> str:
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+def token_event(text: str) -> str:
+    return event("token", {"t": text})
+
+
+async def heartbeats_until(fut: "asyncio.Future[Any]", interval_s: float) -> AsyncIterator[str]:
+    """Yield HEARTBEAT every `interval_s` until `fut` is done (interval 0 = just wait)."""
+    while True:
+        done, _ = await asyncio.wait({fut}, timeout=interval_s if interval_s > 0 else None)
+        if done:
+            return
+        yield HEARTBEAT
+
+
+async def _disconnected(request: Request) -> None:
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def until_disconnected(request: Request, frames: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Relay `frames` until the client disconnects, then cancel the frame
+    generator where it is waiting (its finally blocks close the LLM stream
+    and the upstream response). Without this a closed tab is only noticed
+    on the next send, and the generator is never closed at all.
+    """
+    it = frames.__aiter__()
+    gone = asyncio.ensure_future(_disconnected(request))
+    step: Optional["asyncio.Future[str]"] = None
+    try:
+        while not gone.done():
+            step = asyncio.ensure_future(it.__anext__())
+            await asyncio.wait({step, gone}, return_when=asyncio.FIRST_COMPLETED)
+            if not step.done():
+                break
+            try:
+                frame = step.result()
+            except StopAsyncIteration:
+                return
+            finally:
+                step = None
+            yield frame
+    finally:
+        gone.cancel()
+        if step is not None and not step.done():
+            step.cancel()
+            await asyncio.wait({step})
+        await it.aclose()
+
+
+class TokenCoalescer:
+    """
+    Async iterator over coalesced text from an async chunk stream.
+
+    The first chunk is passed through at once (time to first token is
+    unchanged); after that chunks are buffered until `flush_s` has passed
+    since the oldest buffered one or `flush_bytes` are buffered. With both
+    budgets at 0 every chunk is its own piece. When nothing arrives for
+    `heartbeat_s` (0 = never) it yields None, meaning "send a heartbeat".
+
+    `chunks` / `text` describe everything received, for metrics and for
+    post-processing the full answer.
+    """
+
+    def __init__(
+        self,
+        source: AsyncIterator[str],
+        *,
+        flush_s: float = 0.03,
+        flush_bytes: int = 64,
+        heartbeat_s: float = 0.0,
+    ) -> None:
+        self._source = source.__aiter__()
+        self.flush_s = flush_s
+        self.flush_bytes = flush_bytes
+        self.heartbeat_s = heartbeat_s
+        self.chunks = 0
+        self._parts: List[str] = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    async def __aiter__(self) -> AsyncIterator[Optional[str]]:
+        loop = asyncio.get_running_loop()
+        passthrough = self.flush_s <= 0 and self.flush_bytes <= 0
+        buf: List[str] = []
+        size = 0
+        buffered_at = 0.0
+        last_out = loop.time()
+        # the pending __anext__ survives timeouts (cancelling it would end the source)
+        pending: Optional["asyncio.Future[str]"] = None
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(self._source.__anext__())
+
+                deadlines = []
+                if buf and self.flush_s > 0:
+                    deadlines.append(buffered_at + self.flush_s)
+                if self.heartbeat_s > 0:
+                    deadlines.append(last_out + self.heartbeat_s)
+                timeout = max(0.0, min(deadlines) - loop.time()) if deadlines else None
+                done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+                if not done:
+                    if buf:
+                        yield "".join(buf)
+                        buf, size = [], 0
+                    else:
+                        yield None
+                    last_out = loop.time()
+                    continue
+
+                try:
+                    chunk = pending.result()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    pending = None
+                if not chunk:
+                    continue
+
+                self.chunks += 1
+                self._parts.append(chunk)
+                if passthrough or self.chunks == 1:
+                    yield chunk
+                    last_out = loop.time()
+                    continue
+
+                if not buf:
+                    buffered_at = loop.time()
+                buf.append(chunk)
+                size += len(chunk.encode("utf-8"))
+                if (self.flush_bytes > 0 and size >= self.flush_bytes) or (
+                    self.flush_s > 0 and loop.time() - buffered_at >= self.flush_s
+                ):
+                    yield "".join(buf)
+                    buf, size = [], 0
+                    last_out = loop.time()
+
+            if buf:
+                yield "".join(buf)
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
+                # let the cancellation land before closing the source generator
+                await asyncio.wait({pending})
+            aclose = getattr(self._source, "aclose", None)
+            if aclose is not None:
+                await aclose()
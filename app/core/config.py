@@ -3,7 +3,7 @@ from __future__ import annotations
 
 from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Literal
+from typing import Any, Dict, List, Literal, Optional
 
 import yaml
 import os
@@ -54,17 +54,42 @@ def load_all_configs() -> Dict[str, Any]:
 
 # ---------- Pydantic Settings models ----------
 
+class MetricsConfig(BaseModel):
+    enabled: bool = True
+    # per-request stage timings in a `Server-Timing` response header
+    # (and in the SSE `done` event for streams)
+    timing_header: bool = False
+
+
+class StreamConfig(BaseModel):
+    # /chat/stream: merge LLM chunks into one SSE frame per flush_ms or flush_bytes;
+    # both 0 = one frame per chunk (and word-by-word replay of deny / cached answers)
+    flush_ms: float = 30.0
+    flush_bytes: int = 64
+    # send the prompt's citations before the first token (an empty `citations`
+    # event follows if the answer turns out to be a no-answer)
+    early_citations: bool = False
+    # ": keep-alive" comment after this many idle seconds; 0 = off
+    heartbeat_s: float = 15.0
+
+    @property
+    def coalesce(self) -> bool:
+        return self.flush_ms > 0 or self.flush_bytes > 0
+
+
 class AppConfig(BaseModel):
     app_name: str = "Consultancy RAG Bot"
     log_level: str = "INFO"
     env: str = "dev"
     cors_allow_origins: List[str] = Field(default_factory=lambda: ["*"])
+    metrics: MetricsConfig = Field(default_factory=MetricsConfig)
+    stream: StreamConfig = Field(default_factory=StreamConfig)
 
 
 class ProvidersConfig(BaseModel):
     llm: Literal["ollama", "openai"] = "ollama"
     embedder: Literal["ollama", "openai"] = "ollama"
-    store: Literal["chroma", "faiss"] = "chroma"
+    store: Literal["chroma", "faiss", "numpy"] = "chroma"
 
 
 class OllamaLLMConfig(BaseModel):
@@ -72,24 +97,64 @@ class OllamaLLMConfig(BaseModel):
     temperature: float = 0.1
     api_url: str = "http://127.0.0.1:11434"
     timeout_s: int = 120
+    # per-answer streaming caps (None = unlimited); requests may only lower them
+    max_tokens: Optional[int] = None
+    stream_budget_s: Optional[float] = None
 
 
 class OllamaEmbeddingsConfig(BaseModel):
     model_name: str = "nomic-embed-text"
-    
+    batch_size: int = 32
+
+
+class OllamaHttpConfig(BaseModel):
+    pool_size: int = 10
+    async_pool_size: int = 100
+    keep_alive: bool = True
+    connect_timeout_s: float = 5.0
+    max_retries: int = 2
+    backoff_factor: float = 0.5
+
+
+class OllamaSchedulerConfig(BaseModel):
+    # admission control for LLM calls (see app.rag.llm.scheduler)
+    enabled: bool = True
+    max_concurrency: int = 2
+    # model name -> max_concurrency, overriding the default above
+    per_model: Dict[str, int] = Field(default_factory=dict)
+    max_queue: int = 32
+    queue_timeout_s: float = 10.0
+    # /chat/batch items queue behind interactive calls; None = no timeout
+    batch_queue_timeout_s: Optional[float] = None
+
+
+class OllamaSingleFlightConfig(BaseModel):
+    # concurrent identical embed / generate calls share one request to Ollama
+    enabled: bool = True
 
 
 class OllamaConfig(BaseModel):
     api_url: str = "http://127.0.0.1:11434"
+    # read timeout; connect timeout lives under `http`
     timeout_s: int = 60
+    http: OllamaHttpConfig = Field(default_factory=OllamaHttpConfig)
     llm: OllamaLLMConfig = Field(default_factory=OllamaLLMConfig)
     embeddings: OllamaEmbeddingsConfig = Field(default_factory=OllamaEmbeddingsConfig)
+    scheduler: OllamaSchedulerConfig = Field(default_factory=OllamaSchedulerConfig)
+    singleflight: OllamaSingleFlightConfig = Field(default_factory=OllamaSingleFlightConfig)
 
 
 class RagRewriteConfig(BaseModel):
     enabled: bool = True
     trigger_max_words: int = 8
     max_history_turns: int = 6
+    # llm | speculative | heuristic (see QueryRewriterConfig)
+    mode: Literal["llm", "speculative", "heuristic"] = "llm"
+    # speculative: the rewrite's results must beat the original's best distance by this much
+    speculative_margin: float = 0.05
+    # speculative: use the original results without waiting for the rewrite
+    # when they already clear good_threshold
+    speculative_early_accept: bool = True
 
 
 class RagDistanceConfig(BaseModel):
@@ -97,20 +162,123 @@ class RagDistanceConfig(BaseModel):
     weak_threshold: float = 0.55
 
 
+class RagEmbeddingCacheConfig(BaseModel):
+    enabled: bool = True
+    path: str = "storage/cache/embeddings.sqlite"
+    max_entries: int = 200_000
+
+
+class RagFaissConfig(BaseModel):
+    # used when providers.store == "faiss"
+    index_type: Literal["flat", "ivf", "hnsw"] = "flat"
+    nlist: int = 256
+    nprobe: int = 16
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    ef_search: int = 64
+    exact_filter_max: int = 4096
+
+
+class RagNumpyConfig(BaseModel):
+    # used when providers.store == "numpy"
+    dtype: Literal["float32", "float16"] = "float32"
+    block_rows: int = 16384
+
+
+class RagShardingConfig(BaseModel):
+    # one collection / index per doc_type; routed queries search a single shard
+    enabled: bool = False
+    shard_key: str = "doc_type"
+    default_shard: str = "default"
+    # threads for unrouted queries that fan out to every shard
+    fanout_workers: int = 4
+
+
+class RagHybridConfig(BaseModel):
+    # fuse BM25 (lexical) and vector candidates with reciprocal rank fusion
+    enabled: bool = False
+    lexical_pool_k: int = 25
+    rrf_k: int = 60
+    k1: float = 1.2
+    b: float = 0.75
+    # distance reported for hits that contain an identifier from the
+    # question (dates, clause numbers), so exact matches are not denied;
+    # keep it above distance.good_threshold so such a hit alone only
+    # gives a hedged (weak) answer
+    identifier_distance_cap: float = 0.50
+
+
+class RagAnswerCacheConfig(BaseModel):
+    enabled: bool = True
+    similarity_threshold: float = 0.95
+    ttl_s: float = 3600.0
+    max_entries: int = 2000
+    # how often the ingest manifest is checked for changes
+    check_interval_s: float = 2.0
+
+
+class RagRewriteCacheConfig(BaseModel):
+    enabled: bool = True
+    ttl_s: float = 86400.0
+    max_entries: int = 5000
+    # shared SQLite cache; empty keeps rewrites in-process only
+    path: str = "storage/cache/rewrites.sqlite"
+
+
+class RagSessionsConfig(BaseModel):
+    # server-side history per session_id; clients may then send only the new message
+    enabled: bool = True
+    backend: Literal["memory", "sqlite"] = "memory"
+    ttl_s: float = 3600.0
+    max_sessions: int = 10_000
+    # user turns kept per session (the pipeline reads the last 4)
+    max_turns: int = 4
+    # sqlite backend file
+    path: str = "storage/cache/sessions.sqlite"
+
+
+class RagBatchConfig(BaseModel):
+    # /chat/batch: concurrent generations per batch, and the largest batch accepted
+    max_concurrency: int = 4
+    max_requests: int = 500
+
+
+class RagIntentConfig(BaseModel):
+    # closing-intent anchor vectors, keyed by embedder model + anchor text hash
+    anchor_cache_path: str = "storage/cache/intent_anchors.json"
+
+
 class RagConfig(BaseModel):
     collection_name: str = "consultancy_kb"
     persist_dir: str = "storage/vectordb"
     top_k: int = 5
     retrieval_pool_k: int = 25
+    # keep at most one chunk per (source, page) in the top_k
+    dedup_pages: bool = True
+    # top_k selection from the pool: "dedup" (closest first) or "mmr" (diversified)
+    selection: Literal["dedup", "mmr"] = "dedup"
+    mmr_lambda: float = 0.7
     max_context_chars: int = 3000
     max_chunks_in_prompt: int = 3
     max_history: int = 6
     distance: RagDistanceConfig = Field(default_factory=RagDistanceConfig)
     rewrite: RagRewriteConfig = Field(default_factory=RagRewriteConfig)
+    rewrite_cache: RagRewriteCacheConfig = Field(default_factory=RagRewriteCacheConfig)
+    embedding_cache: RagEmbeddingCacheConfig = Field(default_factory=RagEmbeddingCacheConfig)
+    faiss: RagFaissConfig = Field(default_factory=RagFaissConfig)
+    numpy: RagNumpyConfig = Field(default_factory=RagNumpyConfig)
+    sharding: RagShardingConfig = Field(default_factory=RagShardingConfig)
+    hybrid: RagHybridConfig = Field(default_factory=RagHybridConfig)
+    answer_cache: RagAnswerCacheConfig = Field(default_factory=RagAnswerCacheConfig)
+    intent: RagIntentConfig = Field(default_factory=RagIntentConfig)
+    batch: RagBatchConfig = Field(default_factory=RagBatchConfig)
+    sessions: RagSessionsConfig = Field(default_factory=RagSessionsConfig)
 
 
 class PolicyConfig(BaseModel):
     deny_message: str = "I couldn't find relevant information in the knowledge base."
+    # answer when the LLM is saturated (a 503 detail on /chat)
+    busy_message: str = "The assistant is busy right now. Please try again in a moment."
     system_style: str = "clear, concise, policy-style"
     require_quotes_in_weak_mode: bool = True
 
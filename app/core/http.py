@@ -0,0 +1,115 @@
+# app/core/http.py
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError
+from urllib3.util import parse_url
+from urllib3.util.retry import Retry
+
+
+RETRY_STATUSES: Tuple[int, ...] = (500, 502, 503, 504)
+
+# statuses handed straight back to the caller for some paths: a 500 from
+# /api/embed is usually a batch too large for the model, which the embedder
+# splits in half, so retrying the same batch only adds backoff delay
+NO_RETRY_STATUSES: Dict[str, Tuple[int, ...]] = {"/api/embed": (500,)}
+
+
+def _retries_status(path: str, status: int) -> bool:
+    return status in RETRY_STATUSES and status not in NO_RETRY_STATUSES.get(path, ())
+
+
+@dataclass(frozen=True)
+class HttpPoolConfig:
+    # sync (requests) pool; the async pool is sized separately because
+    # each in-flight SSE stream holds one connection
+    pool_size: int = 10
+    async_pool_size: int = 100
+    keep_alive: bool = True
+    max_retries: int = 2
+    backoff_factor: float = 0.5
+
+
+class _Retry(Retry):
+    """`Retry` that skips `NO_RETRY_STATUSES` (urllib3 returns the response as is)."""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if response is not None and error is None and url:
+            if not _retries_status(parse_url(url).path or "", response.status):
+                raise MaxRetryError(_pool, url, None)
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+def create_session(cfg: HttpPoolConfig) -> requests.Session:
+    """
+    Pooled requests session: keep-alive connections plus
+    retry-with-backoff on connection errors/resets and 5xx responses
+    (minus `NO_RETRY_STATUSES`).
+    """
+    retry = _Retry(
+        total=cfg.max_retries,
+        connect=cfg.max_retries,
+        read=cfg.max_retries,
+        status=cfg.max_retries,
+        backoff_factor=cfg.backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "POST"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=cfg.pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if not cfg.keep_alive:
+        session.headers["Connection"] = "close"
+    return session
+
+
+class _AsyncRetryTransport(httpx.AsyncBaseTransport):
+    """
+    Retries a request on connection errors and 5xx statuses with
+    exponential backoff. Only the response head is inspected, so
+    streaming bodies are never replayed.
+    """
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, cfg: HttpPoolConfig) -> None:
+        self._inner = inner
+        self._cfg = cfg
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                response = await self._inner.handle_async_request(request)
+            except (httpx.ConnectError, httpx.RemoteProtocolError, httpx.ReadError):
+                if attempt >= self._cfg.max_retries:
+                    raise
+            else:
+                if not _retries_status(request.url.path, response.status_code) or attempt >= self._cfg.max_retries:
+                    return response
+                await response.aclose()
+
+            await asyncio.sleep(self._cfg.backoff_factor * (2 ** attempt))
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+def create_async_client(cfg: HttpPoolConfig, *, connect_timeout_s: float, read_timeout_s: float) -> httpx.AsyncClient:
+    """Pooled async client with the same keep-alive and retry policy as `create_session`."""
+    keepalive = cfg.async_pool_size if cfg.keep_alive else 0
+    transport = httpx.AsyncHTTPTransport(
+        limits=httpx.Limits(max_connections=cfg.async_pool_size, max_keepalive_connections=keepalive),
+    )
+    return httpx.AsyncClient(
+        transport=_AsyncRetryTransport(transport, cfg),
+        timeout=httpx.Timeout(read_timeout_s, connect=connect_timeout_s),
+    )
@@ -0,0 +1,215 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Counters and histograms are labelled by keyword arguments. When metrics
+are disabled (`configure(enabled=False)`) every update is a single flag
+check, so instrumentation can stay in place on hot paths.
+"""
+from __future__ import annotations
+
+import math
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# seconds; covers sub-millisecond cache hits up to slow generations
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250)
+
+LabelValues = Tuple[str, ...]
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+def _label_str(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "Registry", name: str, help: str, labelnames: Sequence[str]) -> None:
+        self._registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if not self._registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_label_str(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = LATENCY_BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [per-bucket counts..., sum, count]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        if not self._registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    row[i] += 1
+                    break
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines: List[str] = []
+        for key, row in items:
+            cumulative = 0.0
+            for upper, n in zip(self.buckets, row):
+                cumulative += n
+                le = f'le="{_fmt(upper)}"'
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {_fmt(cumulative)}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {_fmt(row[-2])}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {_fmt(row[-1])}")
+        return lines
+
+
+class Registry:
+    """
+    Holds metrics plus "stats" callbacks (e.g. `AnswerCache.stats`), whose
+    numeric values are exported as gauges named `<prefix>_<key>`.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self._metrics: Dict[str, _Metric] = {}
+        self._stats: Dict[str, Callable[[], Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(self, name, help, labelnames))
+
+    def histogram(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._add(Histogram(self, name, help, labelnames, buckets=buckets))
+
+    def register_stats(self, prefix: str, fn: Callable[[], Dict[str, float]]) -> None:
+        """Export `fn()` at scrape time; re-registering a prefix replaces it."""
+        with self._lock:
+            self._stats[prefix] = fn
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            stats = list(self._stats.items())
+
+        lines: List[str] = []
+        for m in metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.render())
+        for prefix, fn in stats:
+            for key, value in sorted(fn().items()):
+                if isinstance(value, (int, float)):
+                    lines.append(f"# TYPE {prefix}_{key} gauge")
+                    lines.append(f"{prefix}_{key} {_fmt(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _add(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+
+REGISTRY = Registry()
+
+
+def configure(*, enabled: bool) -> None:
+    REGISTRY.enabled = enabled
+
+
+def enabled() -> bool:
+    return REGISTRY.enabled
+
+
+def server_timing(timings: Optional[Dict[str, float]]) -> str:
+    """`Server-Timing` header value from stage -> seconds."""
+    return ", ".join(f"{name};dur={secs * 1000:.1f}" for name, secs in (timings or {}).items())
+
+
+# ---- RAG pipeline metrics ----
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_seconds", "Time spent in each RAG pipeline stage", ("stage",)
+)
+TURNS = REGISTRY.counter(
+    "rag_turns_total", "Chat turns by outcome", ("outcome",)
+)
+TURN_SECONDS = REGISTRY.histogram(
+    "rag_turn_seconds", "End-to-end chat turn time by outcome", ("outcome",)
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "rag_request_seconds", "HTTP chat request time", ("endpoint",)
+)
+STREAM_TTFT_SECONDS = REGISTRY.histogram(
+    "rag_stream_ttft_seconds", "Time from request to first streamed token"
+)
+GENERATIONS_ABORTED = REGISTRY.counter(
+    "rag_generations_aborted_total",
+    "Streamed generations stopped early (client_disconnect, max_tokens, deadline)",
+    ("reason",),
+)
+LLM_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "rag_llm_queue_wait_seconds", "Wait for an LLM slot (0 when one was free)", ("model", "priority")
+)
+LLM_REJECTED = REGISTRY.counter(
+    "rag_llm_rejected_total", "LLM calls refused by admission control", ("model", "reason")
+)
+SINGLEFLIGHT_SHARED = REGISTRY.counter(
+    "rag_singleflight_shared_total",
+    "Calls served by joining an identical in-flight call (embed, generate, stream)",
+    ("kind",),
+)
+STREAM_TOKENS_PER_SECOND = REGISTRY.histogram(
+    "rag_stream_tokens_per_second", "Streamed generation rate (chunks per second)", buckets=RATE_BUCKETS
+)
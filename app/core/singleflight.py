@@ -0,0 +1,307 @@
+"""
+Single-flight: concurrent identical calls share one upstream call.
+
+Only calls that overlap in time are merged; nothing is kept once a call
+finishes (that is what the caches are for). `SingleFlight` is for threads,
+`AsyncSingleFlight` for one event loop. The stream variants fan a single
+upstream iterator out to every subscriber; a late subscriber first gets
+the chunks produced so far, then follows live.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+)
+
+from app.core import metrics
+
+
+class SingleFlight:
+    """Thread version: followers block until the leader's call returns (or raises)."""
+
+    def __init__(self, kind: str) -> None:
+        # label for rag_singleflight_shared_total
+        self.kind = kind
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        return self.do_many([key], lambda keys: [fn()])[0]
+
+    def do_many(self, keys: Sequence[Hashable], fn: Callable[[List[Hashable]], List[Any]]) -> List[Any]:
+        """
+        Values for `keys`. Keys already in flight are joined; the rest are
+        computed with one `fn(missing_keys)` call (values in the same order).
+        """
+        owned: Dict[Hashable, Future] = {}
+        futures: Dict[Hashable, Future] = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                fut = self._inflight.get(key)
+                if fut is None:
+                    fut = self._inflight[key] = owned[key] = Future()
+                futures[key] = fut
+        if len(futures) > len(owned):
+            metrics.SINGLEFLIGHT_SHARED.inc(len(futures) - len(owned), kind=self.kind)
+
+        if owned:
+            try:
+                values = fn(list(owned))
+            except BaseException as e:
+                for fut in owned.values():
+                    fut.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    for key in owned:
+                        self._inflight.pop(key, None)
+            for fut, value in zip(owned.values(), values):
+                fut.set_result(value)
+
+        return [futures[key].result() for key in keys]
+
+
+class AsyncSingleFlight:
+    """
+    Event-loop version. The shared call runs as its own task, so a caller
+    that is cancelled does not cancel it for the others; it is cancelled
+    only when every caller waiting on it has gone.
+    """
+
+    def __init__(self, kind: str) -> None:
+        self.kind = kind
+        self._inflight: Dict[Hashable, "_AsyncFlight"] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        async def one(keys: List[Hashable]) -> List[Any]:
+            return [await fn()]
+
+        return (await self.do_many([key], one))[0]
+
+    async def do_many(
+        self, keys: Sequence[Hashable], fn: Callable[[List[Hashable]], Awaitable[List[Any]]]
+    ) -> List[Any]:
+        flights: Dict[Hashable, _AsyncFlight] = {}
+        missing: List[Hashable] = []
+        for key in dict.fromkeys(keys):
+            flight = self._inflight.get(key)
+            if flight is None:
+                missing.append(key)
+            else:
+                flights[key] = flight
+        if flights:
+            metrics.SINGLEFLIGHT_SHARED.inc(len(flights), kind=self.kind)
+
+        if missing:
+            own = _AsyncFlight(missing, asyncio.ensure_future(fn(missing)))
+            for key in missing:
+                self._inflight[key] = flights[key] = own
+            own.task.add_done_callback(lambda _, own=own: self._retire(own))
+
+        joined = list({id(f): f for f in flights.values()}.values())
+        for flight in joined:
+            flight.waiters += 1
+        try:
+            # asyncio.wait never cancels what it waits on
+            await asyncio.wait([f.task for f in joined])
+        finally:
+            for flight in joined:
+                flight.waiters -= 1
+                if flight.waiters == 0 and not flight.task.done():
+                    flight.task.cancel()
+                    # a caller arriving before the cancellation lands starts afresh
+                    self._retire(flight)
+        return [flights[key].value(key) for key in keys]
+
+    def _retire(self, flight: "_AsyncFlight") -> None:
+        for key in flight.keys:
+            if self._inflight.get(key) is flight:
+                del self._inflight[key]
+
+
+class _AsyncFlight:
+    def __init__(self, keys: List[Hashable], task: "asyncio.Future[List[Any]]") -> None:
+        self.keys = keys
+        self._index = {key: i for i, key in enumerate(keys)}
+        self.task = task
+        self.waiters = 0
+
+    def value(self, key: Hashable) -> Any:
+        # raises the call's exception for every caller
+        return self.task.result()[self._index[key]]
+
+
+# ---- streams ----
+
+
+class _Broadcast:
+    """Chunks of one upstream iterator, pulled by whichever subscriber is furthest ahead."""
+
+    def __init__(self, source: Iterator[str]) -> None:
+        self._source = source
+        self._pull = threading.Lock()
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+
+    def chunk(self, i: int) -> Optional[str]:
+        """Chunk `i`, or None at the end of the stream."""
+        while True:
+            if i < len(self.chunks):
+                return self.chunks[i]
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return None
+            with self._pull:
+                if i < len(self.chunks) or self.done:
+                    continue
+                try:
+                    self.chunks.append(next(self._source))
+                except StopIteration:
+                    self.done = True
+                except BaseException as e:
+                    self.error, self.done = e, True
+
+    def close(self) -> None:
+        with self._pull:
+            self.done = True
+            getattr(self._source, "close", lambda: None)()
+
+
+class StreamFlight:
+    """Thread version of stream fan-out; the upstream is closed when its last subscriber leaves."""
+
+    def __init__(self, kind: str = "stream") -> None:
+        self.kind = kind
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, _Broadcast] = {}
+
+    def subscribe(self, key: Hashable, open_stream: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """Chunks of the stream for `key`, joining one in flight or starting `open_stream()`."""
+        # runs on first next(), so a subscriber that is never iterated holds nothing
+        with self._lock:
+            b = self._inflight.get(key)
+            if b is None or b.done:
+                b = self._inflight[key] = _Broadcast(iter(open_stream()))
+            else:
+                metrics.SINGLEFLIGHT_SHARED.inc(kind=self.kind)
+            b.subscribers += 1
+
+        i = 0
+        try:
+            while True:
+                chunk = b.chunk(i)
+                if chunk is None:
+                    return
+                i += 1
+                yield chunk
+        finally:
+            with self._lock:
+                b.subscribers -= 1
+                last = b.subscribers == 0
+                if last or b.done:
+                    # finished streams take no new subscribers
+                    if self._inflight.get(key) is b:
+                        del self._inflight[key]
+            if last and not b.done:
+                b.close()
+
+
+class _AsyncBroadcast:
+    """
+    Async `_Broadcast`. The upstream `__anext__` runs as a task that
+    survives a subscriber being cancelled (cancelling it would end the
+    stream for everyone).
+    """
+
+    def __init__(self, source: AsyncIterator[str]) -> None:
+        self._source = source.__aiter__()
+        self._pending: Optional["asyncio.Future[str]"] = None
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+
+    async def chunk(self, i: int) -> Optional[str]:
+        while True:
+            if i < len(self.chunks):
+                return self.chunks[i]
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return None
+            if self._pending is None:
+                self._pending = asyncio.ensure_future(self._source.__anext__())
+                self._pending.add_done_callback(self._landed)
+            await asyncio.wait({self._pending})
+
+    def _landed(self, fut: "asyncio.Future[str]") -> None:
+        self._pending = None
+        if fut.cancelled():
+            self.done = True
+            return
+        error = fut.exception()
+        if isinstance(error, StopAsyncIteration):
+            self.done = True
+        elif error is not None:
+            self.error, self.done = error, True
+        else:
+            self.chunks.append(fut.result())
+
+    async def aclose(self) -> None:
+        self.done = True
+        pending = self._pending
+        if pending is not None and not pending.done():
+            pending.cancel()
+            await asyncio.wait({pending})
+        aclose = getattr(self._source, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class AsyncStreamFlight:
+    """Event-loop version of `StreamFlight`."""
+
+    def __init__(self, kind: str = "stream") -> None:
+        self.kind = kind
+        self._inflight: Dict[Hashable, _AsyncBroadcast] = {}
+
+    async def subscribe(
+        self, key: Hashable, open_stream: Callable[[], AsyncIterator[str]]
+    ) -> AsyncIterator[str]:
+        b = self._inflight.get(key)
+        if b is None or b.done:
+            b = self._inflight[key] = _AsyncBroadcast(open_stream())
+        else:
+            metrics.SINGLEFLIGHT_SHARED.inc(kind=self.kind)
+        b.subscribers += 1
+
+        i = 0
+        try:
+            while True:
+                chunk = await b.chunk(i)
+                if chunk is None:
+                    return
+                i += 1
+                yield chunk
+        finally:
+            b.subscribers -= 1
+            last = b.subscribers == 0
+            if (last or b.done) and self._inflight.get(key) is b:
+                del self._inflight[key]
+            if last and not b.done:
+                await b.aclose()
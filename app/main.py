@@ -6,8 +6,10 @@ from fastapi import FastAPI
 from fastapi.responses import RedirectResponse
 from fastapi.staticfiles import StaticFiles
 
+from app.core import metrics
 from app.core.config import get_settings
 from app.core.logging import setup_logging
+from app.rag.container import aclose_rag
 
 settings = get_settings()
 
@@ -20,14 +22,18 @@ except Exception:
 
 logger = logging.getLogger("app.main")
 
+metrics.configure(enabled=settings.app.metrics.enabled)
+
 app = FastAPI(title=settings.app.app_name, version="1.0.0")
 
 # --- API routers ---
 from app.api.routes.health import router as health_router
 from app.api.routes.chat import router as chat_router
+from app.api.routes.metrics import router as metrics_router
 
 app.include_router(health_router)
 app.include_router(chat_router)
+app.include_router(metrics_router)
 
 # ---  UI (root/ui) ---
 REPO_ROOT = Path(__file__).resolve().parents[1]   # app/ -> repo root
@@ -49,3 +55,8 @@ def _startup():
         settings.providers.llm,
         settings.providers.embedder,
     )
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    await aclose_rag()
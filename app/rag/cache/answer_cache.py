@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+@dataclass
+class AnswerCacheConfig:
+    # cosine similarity between query embeddings needed for a hit
+    similarity_threshold: float = 0.95
+    ttl_s: float = 3600.0
+    max_entries: int = 2000
+
+    # ingest writes this file whenever chunks change; a new mtime clears the cache
+    invalidate_on: Optional[Path] = None
+    # how often (at most) the invalidation file is stat'ed
+    check_interval_s: float = 2.0
+
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    citations: List[Dict[str, Any]]
+    similarity: float
+
+
+@dataclass
+class _Entry:
+    partition: str
+    vec: np.ndarray
+    answer: str
+    citations: List[Dict[str, Any]]
+    expires_at: float
+
+
+@dataclass
+class _Partition:
+    keys: List[int] = field(default_factory=list)
+    matrix: Optional[np.ndarray] = None  # rebuilt lazily from entry vectors
+
+
+class AnswerCache:
+    """
+    Semantic answer cache.
+
+    Lookups are nearest-neighbour on the (normalised) query embedding,
+    restricted to a partition made of the `where` route and the prompt
+    template version, so answers never cross routes or prompt changes.
+    Entries expire after `ttl_s`; beyond `max_entries` the least recently
+    used entry is evicted.
+    """
+
+    def __init__(self, cfg: Optional[AnswerCacheConfig] = None) -> None:
+        self.cfg = cfg or AnswerCacheConfig()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._partitions: Dict[str, _Partition] = {}
+        self._next_key = 0
+
+        self._watch_mtime = self._mtime()
+        self._next_check = time.monotonic() + self.cfg.check_interval_s
+
+    @staticmethod
+    def partition_key(where: Optional[Dict[str, Any]], template_version: str) -> str:
+        return json.dumps({"where": where or {}, "tpl": template_version}, sort_keys=True, default=str)
+
+    def get(self, vec: List[float], partition: str) -> Optional[CachedAnswer]:
+        q = self._unit(vec)
+        now = time.monotonic()
+        with self._lock:
+            self._check_invalidation(now)
+            part = self._partitions.get(partition)
+            if part is not None:
+                # the ttl is fixed, so keys are in expiry order: purge expired ones
+                # first, or an expired nearest entry would hide a valid one
+                while part.keys and self._entries[part.keys[0]].expires_at <= now:
+                    self._drop(part.keys[0])
+            if part is None or not part.keys:
+                self.misses += 1
+                return None
+
+            if part.matrix is None:
+                part.matrix = np.stack([self._entries[k].vec for k in part.keys])
+            sims = part.matrix @ q
+            best = int(np.argmax(sims))
+            key = part.keys[best]
+            entry = self._entries[key]
+
+            if float(sims[best]) < self.cfg.similarity_threshold:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return CachedAnswer(entry.answer, list(entry.citations), float(sims[best]))
+
+    def put(self, vec: List[float], partition: str, answer: str, citations: List[Dict[str, Any]]) -> None:
+        entry = _Entry(
+            partition=partition,
+            vec=self._unit(vec),
+            answer=answer,
+            citations=list(citations),
+            expires_at=time.monotonic() + self.cfg.ttl_s,
+        )
+        with self._lock:
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = entry
+            part = self._partitions.setdefault(partition, _Partition())
+            part.keys.append(key)
+            part.matrix = None
+
+            while len(self._entries) > self.cfg.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    # ---- internals ----
+
+    @staticmethod
+    def _unit(vec: List[float]) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32)
+        n = float(np.linalg.norm(v))
+        return v / n if n else v
+
+    def _drop(self, key: int) -> None:
+        entry = self._entries.pop(key)
+        part = self._partitions[entry.partition]
+        part.keys.remove(key)
+        part.matrix = None
+        if not part.keys:
+            del self._partitions[entry.partition]
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._partitions.clear()
+        self.invalidations += 1
+
+    def _mtime(self) -> Optional[int]:
+        if self.cfg.invalidate_on is None:
+            return None
+        try:
+            return os.stat(self.cfg.invalidate_on).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _check_invalidation(self, now: float) -> None:
+        if self.cfg.invalidate_on is None or now < self._next_check:
+            return
+        self._next_check = now + self.cfg.check_interval_s
+        mtime = self._mtime()
+        if mtime != self._watch_mtime:
+            self._watch_mtime = mtime
+            if self._entries:
+                self._clear()
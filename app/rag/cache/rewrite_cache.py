@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+
+@dataclass
+class RewriteCacheConfig:
+    ttl_s: float = 86400.0
+    max_entries: int = 5000
+    # optional SQLite file shared by workers / restarts; None keeps it in-process only
+    path: Optional[Path] = None
+
+
+# SQLite expiry / size pruning runs once per this many writes
+_PRUNE_EVERY = 64
+
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").split()).casefold()
+
+
+class RewriteCache:
+    """
+    Cache of query rewrites, keyed by (history, question, rewrite template, model).
+
+    An in-process LRU sits in front of an optional SQLite table, so the
+    same follow-up after the same preceding turn is rewritten once across
+    sessions (and, with a path, across workers and restarts). Entries
+    expire after `ttl_s`; both tiers are bounded by `max_entries`.
+    """
+
+    def __init__(self, cfg: Optional[RewriteCacheConfig] = None) -> None:
+        self.cfg = cfg or RewriteCacheConfig()
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+
+        self._lock = threading.Lock()
+        self._mem: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+        self._conn: Optional[sqlite3.Connection] = None
+        if self.cfg.path is not None:
+            self.cfg.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.cfg.path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS rewrites (
+                    key TEXT PRIMARY KEY,
+                    rewritten TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_rewrites_expires_at ON rewrites(expires_at);
+                """
+            )
+
+    @staticmethod
+    def key(history_text: str, question: str, template: str, model_name: str) -> str:
+        raw = "\x1f".join([_normalize(history_text), _normalize(question), template, model_name])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._mem[key]
+                entry = None
+
+            if entry is None and self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT rewritten, expires_at FROM rewrites WHERE key = ? AND expires_at > ?",
+                    (key, now),
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1])
+                    self._remember(key, entry)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._mem.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, rewritten: str) -> None:
+        entry = (rewritten, time.time() + self.cfg.ttl_s)
+        with self._lock:
+            self._remember(key, entry)
+            if self._conn is None:
+                return
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rewrites (key, rewritten, expires_at) VALUES (?, ?, ?)",
+                    (key, entry[0], entry[1]),
+                )
+                self._puts += 1
+                if self._puts % _PRUNE_EVERY:
+                    return
+                self._conn.execute("DELETE FROM rewrites WHERE expires_at <= ?", (time.time(),))
+                # keep the rows that expire last
+                self._conn.execute(
+                    "DELETE FROM rewrites WHERE key NOT IN "
+                    "(SELECT key FROM rewrites ORDER BY expires_at DESC LIMIT ?)",
+                    (self.cfg.max_entries,),
+                )
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._mem),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _remember(self, key: str, entry: Tuple[str, float]) -> None:
+        self._mem[key] = entry
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.cfg.max_entries:
+            self._mem.popitem(last=False)
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.api.schemas import ChatTurn
+
+
+@dataclass
+class SessionStoreConfig:
+    ttl_s: float = 3600.0
+    max_sessions: int = 10_000
+    # turns kept per session (the pipeline only reads the last few user turns)
+    max_turns: int = 4
+    # SqliteSessionStore file
+    path: Optional[Path] = None
+
+
+# SQLite expiry / size pruning runs once per this many writes
+_PRUNE_EVERY = 64
+
+
+class SessionStore(ABC):
+    """
+    Server-side chat history keyed by session_id, so clients can send
+    only the new message. Sessions expire `ttl_s` after their last write
+    and keep at most `max_turns` turns.
+
+    Backends implement `_load` / `_save` / `delete`; anything with
+    get/set-with-expiry semantics (SQLite, Redis) fits.
+    """
+
+    def __init__(self, cfg: Optional[SessionStoreConfig] = None) -> None:
+        self.cfg = cfg or SessionStoreConfig()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id: str) -> List[ChatTurn]:
+        return self._get(session_id) or []
+
+    def append(self, session_id: str, turn: ChatTurn) -> Tuple[List[ChatTurn], bool]:
+        """
+        Add a turn. Returns the session's (trimmed) history including it, and
+        whether the session was found (False if it expired, was evicted or
+        never existed here).
+        """
+        stored = self._get(session_id)
+        turns = ((stored or []) + [turn])[-self.cfg.max_turns:]
+        self._save(session_id, turns)
+        return turns, stored is not None
+
+    def _get(self, session_id: str) -> Optional[List[ChatTurn]]:
+        turns = self._load(session_id)
+        if turns is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return turns
+
+    def replace(self, session_id: str, turns: List[ChatTurn]) -> None:
+        self._save(session_id, list(turns)[-self.cfg.max_turns:])
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _load(self, session_id: str) -> Optional[List[ChatTurn]]:
+        """Unexpired turns, or None for an unknown / expired session."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def _save(self, session_id: str, turns: List[ChatTurn]) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hits / total if total else 0.0}
+
+    def close(self) -> None:
+        return None
+
+
+class InMemorySessionStore(SessionStore):
+    """Bounded LRU of sessions in this process."""
+
+    def __init__(self, cfg: Optional[SessionStoreConfig] = None) -> None:
+        super().__init__(cfg)
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, Tuple[List[ChatTurn], float]]" = OrderedDict()
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _load(self, session_id: str) -> Optional[List[ChatTurn]]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return list(entry[0])
+
+    def _save(self, session_id: str, turns: List[ChatTurn]) -> None:
+        with self._lock:
+            self._sessions[session_id] = (turns, time.time() + self.cfg.ttl_s)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.cfg.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            sessions = len(self._sessions)
+        return {"sessions": sessions, **super().stats()}
+
+
+class SqliteSessionStore(SessionStore):
+    """Sessions in a local SQLite file, shared by workers on one host and kept across restarts."""
+
+    def __init__(self, cfg: Optional[SessionStoreConfig] = None) -> None:
+        super().__init__(cfg)
+        if self.cfg.path is None:
+            raise ValueError("SqliteSessionStore needs cfg.path")
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.cfg.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.cfg.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                turns TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at);
+            """
+        )
+
+    def delete(self, session_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def _load(self, session_id: str) -> Optional[List[ChatTurn]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT turns FROM sessions WHERE session_id = ? AND expires_at > ?",
+                (session_id, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        return [ChatTurn(**t) for t in json.loads(row[0])]
+
+    def _save(self, session_id: str, turns: List[ChatTurn]) -> None:
+        payload = json.dumps([t.model_dump() for t in turns])
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, turns, expires_at) VALUES (?, ?, ?)",
+                (session_id, payload, time.time() + self.cfg.ttl_s),
+            )
+            self._puts += 1
+            if self._puts % _PRUNE_EVERY:
+                return
+            self._conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+            # keep the most recently written sessions
+            self._conn.execute(
+                "DELETE FROM sessions WHERE session_id NOT IN "
+                "(SELECT session_id FROM sessions ORDER BY expires_at DESC LIMIT ?)",
+                (self.cfg.max_sessions,),
+            )
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            sessions = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {"sessions": sessions, **super().stats()}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,9 +1,16 @@
 # app/rag/container.py
 from functools import lru_cache
-from app.rag.providers_factory import create_providers
+from app.rag.providers_factory import create_async_providers, create_providers
 from app.rag.rag_factory import create_rag_service
 
 @lru_cache(maxsize=1)
 def get_rag():
     embedder, llm = create_providers()
-    return create_rag_service(embedder, llm)
+    async_embedder, async_llm = create_async_providers()
+    return create_rag_service(embedder, llm, async_embedder=async_embedder, async_llm=async_llm)
+
+
+async def aclose_rag() -> None:
+    # only close what was actually built
+    if get_rag.cache_info().currsize:
+        await get_rag().aclose()
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.rag.embeddings.embedder_base import Embedder
+
+
+@dataclass
+class EmbeddingCacheConfig:
+    path: Path = Path("storage") / "cache" / "embeddings.sqlite"
+    # least recently used entries are evicted beyond this size
+    max_entries: int = 200_000
+
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").split())
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(_normalize(text).encode("utf-8")).hexdigest()
+
+
+class CachedEmbedder(Embedder):
+    """
+    Disk-backed embedding cache that wraps any Embedder.
+
+    - entries are keyed by (model name, sha256 of the whitespace-normalized text)
+    - vectors are stored as float32 blobs in SQLite
+    - size bounded with LRU eviction; `last_used` is wall-clock time (ns), so
+      processes sharing the file agree on recency
+    - all entries are dropped when the wrapped model name changes
+    """
+
+    def __init__(self, inner: Embedder, cfg: Optional[EmbeddingCacheConfig] = None) -> None:
+        self.inner = inner
+        self.cfg = cfg or EmbeddingCacheConfig()
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self.cfg.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.cfg.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vec BLOB NOT NULL,
+                last_used INTEGER NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            );
+            CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used);
+            """
+        )
+
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'model_name'").fetchone()
+        if row is None or row[0] != self.model_name:
+            self.invalidate()
+
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @property
+    def model_name(self) -> str:
+        return self.inner.model_name
+
+    def invalidate(self) -> None:
+        """Drop every cached vector and re-stamp the cache with the current model name."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('model_name', ?)",
+                (self.model_name,),
+            )
+            self._count = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": self._count}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+        self.inner.close()
+
+    def embed_one(self, text: str) -> List[float]:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        keys = [_text_hash(t) for t in texts]
+        found = self._lookup(keys)
+
+        # embed each distinct missing text once
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        miss_count = sum(1 for k in keys if k in missing)
+        with self._lock:
+            self.hits += len(keys) - miss_count
+            self.misses += miss_count
+
+        if missing:
+            vecs = self.inner.embed_many(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vecs))
+            self._store(list(fresh.items()))
+            found.update(fresh)
+
+        return [found[k] for k in keys]
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(keys))
+
+        with self._lock, self._conn:
+            # stay below SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                marks = ",".join("?" for _ in part)
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vec FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                    [self.model_name, *part],
+                ).fetchall()
+                for key, blob in rows:
+                    vec = array("f")
+                    vec.frombytes(blob)
+                    found[key] = vec.tolist()
+
+            if found:
+                now = time.time_ns()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, self.model_name, k) for k in found],
+                )
+        return found
+
+    def _store(self, items: List[Tuple[str, List[float]]]) -> None:
+        with self._lock, self._conn:
+            now = time.time_ns()
+            before = self._conn.total_changes
+            # a key stored meanwhile (another thread / process) has the same vector
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, text_hash, vec, last_used) VALUES (?, ?, ?, ?)",
+                [(self.model_name, key, array("f", vec).tobytes(), now) for key, vec in items],
+            )
+            self._count += self._conn.total_changes - before
+
+            if self._count > self.cfg.max_entries:
+                # other processes may write to the same file; count before evicting
+                self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                overflow = self._count - self.cfg.max_entries
+                if overflow > 0:
+                    self._conn.execute(
+                        "DELETE FROM embeddings WHERE rowid IN "
+                        "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                        (overflow,),
+                    )
+                    self._count -= overflow
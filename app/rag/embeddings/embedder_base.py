@@ -1,11 +1,17 @@
 from __future__ import annotations
 from typing import Any, Dict, List, Optional
 from abc import ABC, abstractmethod
+import asyncio
 
 
 class Embedder(ABC):
     """Abstract base class for embedding models."""
 
+    @property
+    def model_name(self) -> str:
+        """Name of the underlying embedding model (used to key caches)."""
+        return type(self).__name__
+
     @abstractmethod
     def embed_one(self, text: str) -> List[float]:
         """Generate an embedding for a single piece of text.
@@ -28,3 +34,28 @@ class Embedder(ABC):
         """
         return [self.embed_one(text) for text in texts]
 
+    def close(self) -> None:
+        """Release network resources held by the embedder."""
+        return None
+
+
+class AsyncEmbedder(ABC):
+    """Async counterpart of `Embedder` used on the request path."""
+
+    @property
+    def model_name(self) -> str:
+        """Name of the underlying embedding model (used to key caches)."""
+        return type(self).__name__
+
+    @abstractmethod
+    async def embed_one(self, text: str) -> List[float]:
+        """Generate an embedding for a single piece of text."""
+        raise NotImplementedError
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for multiple texts (concurrently by default)."""
+        return list(await asyncio.gather(*(self.embed_one(t) for t in texts)))
+
+    async def aclose(self) -> None:
+        """Release network resources held by the embedder."""
+        return None
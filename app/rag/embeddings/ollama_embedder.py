@@ -1,14 +1,20 @@
 from __future__ import annotations
-from typing import List
-from app.rag.embeddings.embedder_base import Embedder
+from typing import List, Optional
+from app.rag.embeddings.embedder_base import AsyncEmbedder, Embedder
 from dataclasses import dataclass
 import requests, os
+import httpx
+
+from app.core.http import HttpPoolConfig, create_async_client, create_session
 
 @dataclass
 class OllamaEmbedderConfig:
     model_name: str = "nomic-embed-text"
     api_url: str = "http://localhost:11434"
     timeout_s: int = 60
+    connect_timeout_s: float = 5.0
+    # max texts per /api/embed request
+    batch_size: int = 32
 
 
 class OllamaEmbedder(Embedder):
@@ -16,14 +22,28 @@ class OllamaEmbedder(Embedder):
     Ollama-based embedding implementation.
 
     This embedder:
-    - uses Ollama's /api/embeddings endpoint
+    - uses Ollama's /api/embeddings endpoint for single texts
+    - uses Ollama's /api/embed endpoint (input list) for batches
     - produces vectors suitable for Chroma
     - must be used consistently for BOTH:
         - document embeddings (ingest time)
         - query embeddings (runtime)
     """
-    def __init__(self, config: OllamaEmbedderConfig):
+    def __init__(self, config: OllamaEmbedderConfig, session: Optional[requests.Session] = None):
         self.cfg = config
+        self._base_url = os.getenv("OLLAMA_API_URL", self.cfg.api_url)
+        self._timeout = (self.cfg.connect_timeout_s, self.cfg.timeout_s)
+        # pooled keep-alive session, usually shared with the LLM provider
+        self._session = session or create_session(HttpPoolConfig())
+        # flipped off the first time the server rejects /api/embed
+        self._batch_supported = True
+
+    def close(self) -> None:
+        self._session.close()
+
+    @property
+    def model_name(self) -> str:
+        return self.cfg.model_name
 
     def embed_one(self, text: str) -> List[float]:
         """Generate an embedding for a single piece of text using Ollama.
@@ -32,25 +52,156 @@ class OllamaEmbedder(Embedder):
         Returns:
             List[float]: The embedding vector.
         """
-        base_url = os.getenv("OLLAMA_API_URL", self.cfg.api_url)
-        url = f"{base_url}/api/embeddings"
+        url = f"{self._base_url}/api/embeddings"
         payload = {
             "model": self.cfg.model_name,
             "prompt": text
         }
         try:
-            response = requests.post(
-                url, 
-                json=payload, 
-                timeout=self.cfg.timeout_s
+            response = self._session.post(
+                url,
+                json=payload,
+                timeout=self._timeout
             )
 
             response.raise_for_status()
-            
+
             data = response.json()
-            
+
             embedding = data["embedding"]
-            
+
             return embedding
         except requests.RequestException as e:
-            raise RuntimeError(f"Failed to get embedding from Ollama: {e}")
\ No newline at end of file
+            raise RuntimeError(f"Failed to get embedding from Ollama: {e}")
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for many texts with batched /api/embed calls.
+
+        Texts are sent in groups of `batch_size`; results keep the input order.
+        Falls back to one /api/embeddings call per text when the server
+        does not support batching.
+        """
+        if not texts:
+            return []
+
+        size = max(1, int(self.cfg.batch_size))
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), size):
+            vectors.extend(self._embed_batch(texts[start:start + size]))
+        return vectors
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        if not self._batch_supported:
+            return [self.embed_one(text) for text in batch]
+
+        url = f"{self._base_url}/api/embed"
+        payload = {
+            "model": self.cfg.model_name,
+            "input": batch,
+        }
+        try:
+            response = self._session.post(url, json=payload, timeout=self._timeout)
+        except requests.RequestException as e:
+            raise RuntimeError(f"Failed to get embeddings from Ollama: {e}")
+
+        # older Ollama servers have no /api/embed -> per-item calls from now on
+        if response.status_code in (404, 405, 501):
+            self._batch_supported = False
+            return [self.embed_one(text) for text in batch]
+
+        # oversized batch (payload / context limits) -> split in half and retry
+        if response.status_code in (400, 413, 500) and len(batch) > 1:
+            mid = len(batch) // 2
+            return self._embed_batch(batch[:mid]) + self._embed_batch(batch[mid:])
+
+        try:
+            response.raise_for_status()
+            embeddings = response.json()["embeddings"]
+        except (requests.RequestException, ValueError, KeyError) as e:
+            raise RuntimeError(f"Failed to get embeddings from Ollama: {e}")
+
+        if len(embeddings) != len(batch):
+            raise RuntimeError(
+                f"Ollama returned {len(embeddings)} embeddings for {len(batch)} inputs"
+            )
+        return embeddings
+
+
+class AsyncOllamaEmbedder(AsyncEmbedder):
+    """
+    Async Ollama embedder for the request path.
+
+    Uses a pooled `httpx.AsyncClient` so concurrent requests share
+    keep-alive connections instead of blocking a worker thread each.
+    Same endpoints and batching rules as `OllamaEmbedder`.
+    """
+    def __init__(self, config: OllamaEmbedderConfig, client: Optional[httpx.AsyncClient] = None):
+        self.cfg = config
+        self._base_url = os.getenv("OLLAMA_API_URL", self.cfg.api_url)
+        self._client = client or create_async_client(
+            HttpPoolConfig(), connect_timeout_s=self.cfg.connect_timeout_s, read_timeout_s=self.cfg.timeout_s
+        )
+        self._batch_supported = True
+
+    @property
+    def model_name(self) -> str:
+        return self.cfg.model_name
+
+    async def aclose(self) -> None:
+        # closing a shared client twice is a no-op
+        await self._client.aclose()
+
+    async def embed_one(self, text: str) -> List[float]:
+        payload = {"model": self.cfg.model_name, "prompt": text}
+        try:
+            response = await self._client.post(
+                f"{self._base_url}/api/embeddings",
+                json=payload,
+            )
+            response.raise_for_status()
+            return response.json()["embedding"]
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"Failed to get embedding from Ollama: {e}")
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        size = max(1, int(self.cfg.batch_size))
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), size):
+            vectors.extend(await self._embed_batch(texts[start:start + size]))
+        return vectors
+
+    async def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        if not self._batch_supported:
+            return [await self.embed_one(text) for text in batch]
+
+        payload = {"model": self.cfg.model_name, "input": batch}
+        try:
+            response = await self._client.post(
+                f"{self._base_url}/api/embed",
+                json=payload,
+            )
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"Failed to get embeddings from Ollama: {e}")
+
+        if response.status_code in (404, 405, 501):
+            self._batch_supported = False
+            return [await self.embed_one(text) for text in batch]
+
+        if response.status_code in (400, 413, 500) and len(batch) > 1:
+            mid = len(batch) // 2
+            return await self._embed_batch(batch[:mid]) + await self._embed_batch(batch[mid:])
+
+        try:
+            response.raise_for_status()
+            embeddings = response.json()["embeddings"]
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            raise RuntimeError(f"Failed to get embeddings from Ollama: {e}")
+
+        if len(embeddings) != len(batch):
+            raise RuntimeError(
+                f"Ollama returned {len(embeddings)} embeddings for {len(batch)} inputs"
+            )
+        return embeddings
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from typing import List
+
+from app.core.singleflight import AsyncSingleFlight, SingleFlight
+from app.rag.embeddings.embedder_base import AsyncEmbedder, Embedder
+
+
+class SingleFlightEmbedder(Embedder):
+    """
+    Wraps an Embedder so that concurrent calls for the same text share one
+    upstream request. Keys are (model name, exact text); an `embed_many`
+    joins texts already in flight and sends the rest as one batch.
+    """
+
+    def __init__(self, inner: Embedder) -> None:
+        self.inner = inner
+        self._flight = SingleFlight("embed")
+
+    @property
+    def model_name(self) -> str:
+        return self.inner.model_name
+
+    def embed_one(self, text: str) -> List[float]:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        model = self.model_name
+        return self._flight.do_many(
+            [(model, t) for t in texts],
+            lambda keys: self.inner.embed_many([t for _, t in keys]),
+        )
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+class AsyncSingleFlightEmbedder(AsyncEmbedder):
+    """Async `SingleFlightEmbedder`."""
+
+    def __init__(self, inner: AsyncEmbedder) -> None:
+        self.inner = inner
+        self._flight = AsyncSingleFlight("embed")
+
+    @property
+    def model_name(self) -> str:
+        return self.inner.model_name
+
+    async def embed_one(self, text: str) -> List[float]:
+        return (await self.embed_many([text]))[0]
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        model = self.model_name
+        return await self._flight.do_many(
+            [(model, t) for t in texts],
+            lambda keys: self.inner.embed_many([t for _, t in keys]),
+        )
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+@dataclass
+class ManifestEntry:
+    path: str  # relative to docs_root, posix style
+    size: int
+    mtime_ns: int
+    sha256: str
+    chunk_ids: List[str] = field(default_factory=list)
+
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class IngestManifest:
+    """
+    Persisted record of what the last ingest wrote to the vector store.
+
+    One entry per source file: size, mtime, content hash and the chunk ids
+    written for it. Drives delta ingest (skip unchanged files, delete
+    chunk ids that a changed or removed file no longer produces).
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: Path, entries: Optional[Dict[str, ManifestEntry]] = None) -> None:
+        self.path = path
+        self.entries: Dict[str, ManifestEntry] = entries or {}
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: Path) -> "IngestManifest":
+        if not path.exists():
+            return cls(path)
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data.get("version") != cls.VERSION:
+            # unknown layout -> behave like a first run
+            return cls(path)
+        entries = {e["path"]: ManifestEntry(**e) for e in data.get("files", [])}
+        return cls(path, entries)
+
+    def get(self, rel_path: str) -> Optional[ManifestEntry]:
+        return self.entries.get(rel_path)
+
+    def set(self, entry: ManifestEntry) -> None:
+        self.entries[entry.path] = entry
+        self.dirty = True
+
+    def remove(self, rel_path: str) -> Optional[ManifestEntry]:
+        entry = self.entries.pop(rel_path, None)
+        if entry is not None:
+            self.dirty = True
+        return entry
+
+    def save(self) -> None:
+        """Write the manifest atomically (temp file + rename)."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "version": self.VERSION,
+            "files": [asdict(self.entries[k]) for k in sorted(self.entries)],
+        }
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(payload, indent=1), encoding="utf-8")
+        os.replace(tmp, self.path)
+        self.dirty = False
@@ -1,12 +1,13 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional
 from dataclasses import dataclass
 from pathlib import Path
 
-from app.rag.ingest.loader_pdf import load_pdf
-from app.rag.ingest.chunker import chunk_text
+from app.rag.ingest.manifest import IngestManifest, ManifestEntry, file_sha256
+from app.rag.ingest.stages import FileJob, StagedIngest
 
-from app.rag.store.chroma_store import ChromaStore
+from app.rag.store.lexical_index import LexicalIndex
+from app.rag.store.vectordb_base import VectorStore
 from app.rag.embeddings.embedder_base import Embedder
 
 @dataclass
@@ -18,6 +19,28 @@ class IngestPipelineConfig:
     chunk_size: int = 1000
     chunk_overlap: int = 200
 
+    # delta ingest: None disables the manifest (every file is re-ingested)
+    manifest_path: Optional[Path] = None
+    # ignore the manifest's unchanged-file check and re-ingest everything
+    force: bool = False
+    # only these docs_root/<doc_type>/ folders (e.g. to rebuild one shard);
+    # manifest entries of other doc_types are left alone. None = all
+    doc_types: Optional[tuple[str, ...]] = None
+
+    # staged engine: pypdf worker processes (0 = parse in-thread),
+    # embedding threads, texts per embed call, chunks per upsert,
+    # and the depth of the bounded queues between stages
+    parse_workers: int = 2
+    embed_workers: int = 2
+    embed_batch_size: int = 64
+    upsert_batch_size: int = 256
+    queue_size: int = 4
+
+
+def default_manifest_path(persist_dir: Path, collection_name: str) -> Path:
+    """Manifest lives next to the vector store files, one per collection."""
+    return persist_dir / f"{collection_name}.manifest.json"
+
 
 def inter_pdf_files(docs_root: Path) -> Iterable[tuple[str, Path]]:
     """
@@ -29,47 +52,131 @@ def inter_pdf_files(docs_root: Path) -> Iterable[tuple[str, Path]]:
         for fp in sorted(doc_type_dir.glob("*.pdf")):
             yield (doc_type, fp)
 
-def ingest_folder(cfg: IngestPipelineConfig, *, embedder: Embedder, store: ChromaStore) -> int:
+
+def _doc_type_of(rel_path: str) -> str:
+    return rel_path.split("/", 1)[0].lower()
+
+
+def _delete_ids(store: VectorStore, lexical: Optional[LexicalIndex], ids: Iterable[str]) -> int:
+    ids = sorted(set(ids))
+    if ids:
+        store.delete(ids=ids)
+        if lexical is not None:
+            lexical.delete(ids=ids)
+    return len(ids)
+
+
+def ingest_folder(
+    cfg: IngestPipelineConfig,
+    *,
+    embedder: Embedder,
+    store: VectorStore,
+    lexical: Optional[LexicalIndex] = None,
+) -> int:
     """
     Ingest documents from the specified folder into the vector store.
     returns the total number of chunks ingested/added.
+
+    With `cfg.manifest_path` set, only new or changed files are parsed and
+    embedded, and chunk ids no longer produced by a changed or deleted
+    file are removed from the store.
+
+    Parsing, embedding and upserts run as overlapping stages
+    (see `StagedIngest`); per-stage throughput is printed at the end.
+
+    When `lexical` is given, the BM25 index is updated alongside every
+    store upsert/delete and persisted with the store.
     """
     if not cfg.docs_root.exists():
         raise FileNotFoundError(f"Docs root not found: {cfg.docs_root.resolve()}")
 
-    total_chunks = 0
+    manifest = IngestManifest.load(cfg.manifest_path) if cfg.manifest_path else None
+
+    force = cfg.force
+    if manifest is not None and manifest.entries and lexical is not None and lexical.count() == 0:
+        # lexical index enabled after the store was built: it has to see every chunk once
+        print("Lexical index is empty; re-ingesting all files to build it")
+        force = True
 
+    skipped = 0
+    deleted = 0
+    seen: set[str] = set()
+    jobs: List[FileJob] = []
+    # rel_path -> (size, mtime_ns, sha256, previous entry)
+    planned: Dict[str, tuple[int, int, str, Optional[ManifestEntry]]] = {}
+
+    doc_types = {d.lower() for d in cfg.doc_types} if cfg.doc_types is not None else None
     for doc_type, pdf_path in inter_pdf_files(cfg.docs_root):
-        pages = load_pdf(pdf_path)
-        print(f"[{doc_type}] {pdf_path.name} : pages = {len(pages)}")
+        if doc_types is not None and doc_type not in doc_types:
+            continue
+        rel_path = pdf_path.relative_to(cfg.docs_root).as_posix()
+        seen.add(rel_path)
+
+        prev: Optional[ManifestEntry] = None
+        digest = ""
+        stat = pdf_path.stat()
+        if manifest is not None:
+            prev = manifest.get(rel_path)
+            if prev and not force:
+                # cheap check first, hash only when size/mtime moved
+                if prev.size == stat.st_size and prev.mtime_ns == stat.st_mtime_ns:
+                    skipped += 1
+                    continue
+                digest = file_sha256(pdf_path)
+                if prev.sha256 == digest:
+                    manifest.set(ManifestEntry(rel_path, stat.st_size, stat.st_mtime_ns, digest, prev.chunk_ids))
+                    skipped += 1
+                    continue
+            digest = digest or file_sha256(pdf_path)
 
-        for page in pages:
-            chunks = chunk_text(page.text, chunk_size=cfg.chunk_size, overlap=cfg.chunk_overlap)
-            if not chunks:
+        jobs.append(FileJob(doc_type=doc_type, path=pdf_path, rel_path=rel_path))
+        planned[rel_path] = (stat.st_size, stat.st_mtime_ns, digest, prev)
+
+    engine = StagedIngest(
+        embedder=embedder,
+        store=store,
+        chunk_size=cfg.chunk_size,
+        chunk_overlap=cfg.chunk_overlap,
+        parse_workers=cfg.parse_workers,
+        embed_workers=cfg.embed_workers,
+        embed_batch_size=cfg.embed_batch_size,
+        upsert_batch_size=cfg.upsert_batch_size,
+        queue_size=cfg.queue_size,
+        lexical=lexical,
+    )
+    written = engine.run(jobs) if jobs else {}
+    total_chunks = sum(len(ids) for ids in written.values())
+
+    if manifest is not None:
+        for rel_path, ids in written.items():
+            size, mtime_ns, digest, prev = planned[rel_path]
+            # drop chunks the previous version produced but this one did not
+            if prev is not None:
+                deleted += _delete_ids(store, lexical, set(prev.chunk_ids) - set(ids))
+            manifest.set(ManifestEntry(rel_path, size, mtime_ns, digest, ids))
+
+        # files that disappeared from docs_root; a chunk id written in this
+        # run (e.g. an entry from before ids carried the folder) is kept
+        kept = {cid for ids in written.values() for cid in ids}
+        for rel_path in sorted(set(manifest.entries) - seen):
+            if doc_types is not None and _doc_type_of(rel_path) not in doc_types:
                 continue
+            entry = manifest.remove(rel_path)
+            deleted += _delete_ids(store, lexical, set(entry.chunk_ids) - kept)
+            print(f"[removed] {rel_path} : chunks = {len(entry.chunk_ids)}")
+
+    # flush the store before the manifest so the manifest never
+    # records chunks the store does not have on disk
+    store.persist()
+    if lexical is not None:
+        lexical.persist()
+
+    if manifest is not None:
+        if manifest.dirty:
+            manifest.save()
+        print(f"Delta ingest: unchanged files = {skipped}, stale chunks deleted = {deleted}")
 
-            # get ids and metadatas for each chunk
-            ids = [f"{pdf_path.name}::p{page.page}::c{idx}" for idx in range(len(chunks))]
-            metadatas = [
-                {
-                    "source": pdf_path.name,
-                    "doc_type": doc_type,
-                    "page": page.page,
-                }
-                for _ in chunks
-            ]
-
-            # embed
-            vecs = embedder.embed_many(chunks)
-            # upsert
-            store.upsert(
-                ids=ids,
-                documents=chunks,
-                embeddings=vecs,
-                metadatas=metadatas,
-            )
-
-            total_chunks += len(chunks)
+    if jobs:
+        print(engine.stats.summary())
 
     return total_chunks
-    
\ No newline at end of file
@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.rag.ingest.chunker import chunk_text
+from app.rag.ingest.loader_pdf import load_pdf
+from app.rag.embeddings.embedder_base import Embedder
+from app.rag.store.lexical_index import LexicalIndex
+
+
+@dataclass
+class FileJob:
+    doc_type: str
+    path: Path
+    rel_path: str
+
+
+@dataclass
+class ChunkRecord:
+    id: str
+    text: str
+    metadata: Dict[str, Any]
+    rel_path: str  # owning file, for the manifest
+
+
+@dataclass
+class StageStats:
+    items: int = 0
+    busy_s: float = 0.0
+
+    def rate(self) -> float:
+        return self.items / self.busy_s if self.busy_s > 0 else 0.0
+
+
+@dataclass
+class IngestStats:
+    files: int = 0
+    pages: int = 0
+    parse: StageStats = field(default_factory=StageStats)  # items = pages
+    embed: StageStats = field(default_factory=StageStats)  # items = chunks
+    write: StageStats = field(default_factory=StageStats)  # items = chunks
+    upserts: int = 0
+    wall_s: float = 0.0
+
+    def summary(self) -> str:
+        return "\n".join([
+            f"Ingest stages ({self.files} files, {self.wall_s:.2f}s wall):",
+            f"  parse : {self.parse.items} pages in {self.parse.busy_s:.2f}s busy ({self.parse.rate():.1f} pages/s)",
+            f"  embed : {self.embed.items} chunks in {self.embed.busy_s:.2f}s busy ({self.embed.rate():.1f} chunks/s)",
+            f"  write : {self.write.items} chunks in {self.write.busy_s:.2f}s busy, {self.upserts} upserts ({self.write.rate():.1f} chunks/s)",
+        ])
+
+
+def parse_and_chunk(path: Path, chunk_size: int, overlap: int) -> List[Tuple[int, List[str]]]:
+    """
+    CPU stage: extract text with pypdf and chunk it.
+    Module level so it can run in a worker process.
+    """
+    out: List[Tuple[int, List[str]]] = []
+    for page in load_pdf(path):
+        chunks = chunk_text(page.text, chunk_size=chunk_size, overlap=overlap)
+        if chunks:
+            out.append((page.page, chunks))
+    return out
+
+
+def _timed_parse(path: Path, chunk_size: int, overlap: int) -> Tuple[List[Tuple[int, List[str]]], float]:
+    t0 = time.perf_counter()
+    pages = parse_and_chunk(path, chunk_size, overlap)
+    return pages, time.perf_counter() - t0
+
+
+class _InlineExecutor(Executor):
+    """Runs parse jobs in the calling thread (parse_workers=0)."""
+
+    def submit(self, fn, /, *args, **kwargs):  # type: ignore[override]
+        fut: Future = Future()
+        try:
+            fut.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            fut.set_exception(e)
+        return fut
+
+
+_DONE = object()
+
+
+class StagedIngest:
+    """
+    Pipelined ingest engine:
+
+        parse (process pool) -> embed (thread pool) -> write (single thread)
+
+    Stages are connected by bounded queues so a slow embedder or store
+    applies backpressure to the parser instead of buffering the corpus.
+    Embed batches and upsert batches both span pages and files.
+    """
+
+    def __init__(
+        self,
+        *,
+        embedder: Embedder,
+        store: Any,
+        chunk_size: int,
+        chunk_overlap: int,
+        parse_workers: int = 2,
+        embed_workers: int = 2,
+        embed_batch_size: int = 64,
+        upsert_batch_size: int = 256,
+        queue_size: int = 4,
+        lexical: Optional[LexicalIndex] = None,
+    ) -> None:
+        self.embedder = embedder
+        self.store = store
+        self.lexical = lexical
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.parse_workers = max(0, parse_workers)
+        self.embed_workers = max(1, embed_workers)
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.upsert_batch_size = max(1, upsert_batch_size)
+        self.queue_size = max(1, queue_size)
+
+        self.stats = IngestStats()
+        self._stats_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+
+    def run(self, jobs: List[FileJob]) -> Dict[str, List[str]]:
+        """
+        Ingest every job. Returns {rel_path: chunk ids written}.
+        Raises the first stage error after all stages have stopped.
+        """
+        started = time.perf_counter()
+        written: Dict[str, List[str]] = {job.rel_path: [] for job in jobs}
+
+        embed_q: "queue.Queue[Any]" = queue.Queue(maxsize=self.queue_size)
+        write_q: "queue.Queue[Any]" = queue.Queue(maxsize=self.queue_size)
+
+        embed_threads = [
+            threading.Thread(target=self._guard, args=(self._embed_stage, embed_q, write_q), daemon=True)
+            for _ in range(self.embed_workers)
+        ]
+        writer = threading.Thread(target=self._guard, args=(self._write_stage, write_q, written), daemon=True)
+        for t in embed_threads:
+            t.start()
+        writer.start()
+
+        try:
+            self._guard(self._parse_stage, jobs, embed_q)
+        finally:
+            for _ in embed_threads:
+                self._put(embed_q, _DONE, force=True)
+            for t in embed_threads:
+                t.join()
+            self._put(write_q, _DONE, force=True)
+            writer.join()
+            self.stats.wall_s = time.perf_counter() - started
+
+        if self._errors:
+            raise self._errors[0]
+        return written
+
+    # --- plumbing ---
+
+    def _guard(self, fn: Callable[..., None], *args: Any) -> None:
+        try:
+            fn(*args)
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+
+    def _put(self, q: "queue.Queue[Any]", item: Any, force: bool = False) -> bool:
+        """Blocking put that gives up once another stage failed."""
+        while True:
+            if self._stop.is_set() and not force:
+                return False
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if force and self._stop.is_set():
+                    # consumers may be gone; drain one slot to make room
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def _get(self, q: "queue.Queue[Any]") -> Any:
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return _DONE
+
+    # --- stages ---
+
+    def _parse_executor(self) -> Executor:
+        if self.parse_workers == 0:
+            return _InlineExecutor()
+        # the embed / write threads are already running, and ProcessPoolExecutor
+        # starts its workers on first submit: never fork this process
+        return ProcessPoolExecutor(max_workers=self.parse_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _iter_parsed(self, pool: Executor, jobs: List[FileJob]) -> Iterator[Tuple[FileJob, List[Tuple[int, List[str]]], float]]:
+        # keep a bounded window of files in flight; yield in submission order
+        window = max(1, self.parse_workers * 2)
+        pending: List[Tuple[FileJob, Future]] = []
+        it = iter(jobs)
+
+        while True:
+            while len(pending) < window:
+                job = next(it, None)
+                if job is None:
+                    break
+                pending.append((job, pool.submit(_timed_parse, job.path, self.chunk_size, self.chunk_overlap)))
+            if not pending:
+                return
+            job, fut = pending.pop(0)
+            pages, elapsed = fut.result()
+            yield job, pages, elapsed
+
+    def _parse_stage(self, jobs: List[FileJob], embed_q: "queue.Queue[Any]") -> None:
+        batch: List[ChunkRecord] = []
+        pool = self._parse_executor()
+        try:
+            for job, pages, elapsed in self._iter_parsed(pool, jobs):
+                if self._stop.is_set():
+                    return
+                print(f"[{job.doc_type}] {job.path.name} : pages = {len(pages)}")
+                with self._stats_lock:
+                    self.stats.files += 1
+                    self.stats.pages += len(pages)
+                    self.stats.parse.items += len(pages)
+                    self.stats.parse.busy_s += elapsed
+
+                for page_no, chunks in pages:
+                    for idx, text in enumerate(chunks):
+                        batch.append(ChunkRecord(
+                            # rel_path, not the file name: same-name files in two folders must not collide
+                            id=f"{job.rel_path}::p{page_no}::c{idx}",
+                            text=text,
+                            metadata={"source": job.path.name, "doc_type": job.doc_type, "page": page_no},
+                            rel_path=job.rel_path,
+                        ))
+                        if len(batch) >= self.embed_batch_size:
+                            if not self._put(embed_q, batch):
+                                return
+                            batch = []
+            if batch:
+                self._put(embed_q, batch)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _embed_stage(self, embed_q: "queue.Queue[Any]", write_q: "queue.Queue[Any]") -> None:
+        while True:
+            item = self._get(embed_q)
+            if item is _DONE or self._stop.is_set():
+                return
+            records = item
+            t0 = time.perf_counter()
+            vecs = self.embedder.embed_many([r.text for r in records])
+            with self._stats_lock:
+                self.stats.embed.items += len(records)
+                self.stats.embed.busy_s += time.perf_counter() - t0
+            if not self._put(write_q, (records, vecs)):
+                return
+
+    def _write_stage(self, write_q: "queue.Queue[Any]", written: Dict[str, List[str]]) -> None:
+        pending: List[Tuple[ChunkRecord, List[float]]] = []
+
+        def flush() -> None:
+            if not pending:
+                return
+            t0 = time.perf_counter()
+            self.store.upsert(
+                ids=[r.id for r, _ in pending],
+                documents=[r.text for r, _ in pending],
+                embeddings=[v for _, v in pending],
+                metadatas=[r.metadata for r, _ in pending],
+            )
+            if self.lexical is not None:
+                self.lexical.add(ids=[r.id for r, _ in pending], documents=[r.text for r, _ in pending])
+            with self._stats_lock:
+                self.stats.write.items += len(pending)
+                self.stats.write.busy_s += time.perf_counter() - t0
+                self.stats.upserts += 1
+            for rec, _ in pending:
+                written[rec.rel_path].append(rec.id)
+            pending.clear()
+
+        while True:
+            item = self._get(write_q)
+            if item is _DONE:
+                if not self._stop.is_set():
+                    flush()
+                return
+            records, vecs = item
+            pending.extend(zip(records, vecs))
+            if len(pending) >= self.upsert_batch_size:
+                flush()
@@ -1,7 +1,22 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import Iterator
+from typing import AsyncIterator, Iterator, Optional
+
+
+class StreamStop(str):
+    """
+    Last chunk of a stream cut short by its limits: an empty string that
+    carries `reason` ("max_tokens" or "deadline"). Concatenating it is a
+    no-op; consumers that care (TurnContext) check for it.
+    """
+
+    reason: str
+
+    def __new__(cls, reason: str) -> "StreamStop":
+        chunk = super().__new__(cls, "")
+        chunk.reason = reason
+        return chunk
 
 class LLM(ABC):
     """
@@ -13,9 +28,39 @@ class LLM(ABC):
         """Generate a text completion for the given prompt."""
         raise NotImplementedError
 
-    @abstractmethod
-    def generate_stream(self, prompt:str) -> Iterator[str]:
-        
+    def generate_stream(
+        self, prompt:str, *, max_tokens: Optional[int] = None, budget_s: Optional[float] = None
+    ) -> Iterator[str]:
+        """
+        Yield completion chunks. The stream ends early after `max_tokens`
+        chunks or `budget_s` seconds, with a final `StreamStop` chunk;
+        closing the iterator cancels the request.
+        """
         # Default fallback
         yield self.generate(prompt)
 
+    def close(self) -> None:
+        """Release network resources held by the model client."""
+        return None
+
+
+class AsyncLLM(ABC):
+    """
+    Async counterpart of `LLM` used on the request path.
+    """
+
+    @abstractmethod
+    async def generate(self, prompt: str) -> str:
+        """Generate a text completion for the given prompt."""
+        raise NotImplementedError
+
+    async def generate_stream(
+        self, prompt: str, *, max_tokens: Optional[int] = None, budget_s: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """Yield completion chunks as they arrive; limits as in `LLM.generate_stream`."""
+        # Default fallback
+        yield await self.generate(prompt)
+
+    async def aclose(self) -> None:
+        """Release network resources held by the model client."""
+        return None
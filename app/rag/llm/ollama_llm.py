@@ -1,30 +1,125 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Any, Dict, List, Iterator
+from typing import Any, AsyncIterator, Dict, List, Iterator, Optional, Tuple
 import requests
-import json, os
+import httpx
+import asyncio, json, os, time
 
-from app.rag.llm.llm_base import LLM
+from app.core import metrics
+from app.core.http import HttpPoolConfig, create_async_client, create_session
+from app.rag.llm.llm_base import AsyncLLM, LLM, StreamStop
 
 @dataclass
 class OllamaLLMConfig:
     model_name: str = "llama3.1:latest"
     api_url: str = "http://localhost:11434"
     timeout_s: int = 120
+    connect_timeout_s: float = 5.0
     temperature: float = 0.2
+    # streaming caps; a request can lower them, never raise them (None = unlimited)
+    max_tokens: Optional[int] = None
+    stream_budget_s: Optional[float] = None
+
+
+def _cap(value, limit):
+    if value is None:
+        return limit
+    return value if limit is None else min(value, limit)
+
+
+def _set_read_timeout(response: requests.Response, secs: float) -> None:
+    # urllib3 sets the socket timeout once per request; tighten it as the budget runs down
+    sock = getattr(getattr(response.raw, "_connection", None), "sock", None)
+    if sock is not None:
+        sock.settimeout(secs)
+
+
+class _StreamLimits:
+    """
+    Per-stream token / wall-clock budget. `num_predict` makes Ollama stop
+    by itself; the client-side checks also cover chunks that are not one
+    token each. Every read waits at most the remaining budget, so a
+    stalled server cannot outlast it. Breaking out of the response context
+    closes the connection, which cancels the generation in Ollama.
+    """
+
+    def __init__(self, cfg: OllamaLLMConfig, max_tokens: Optional[int], budget_s: Optional[float]):
+        self.max_tokens = _cap(max_tokens, cfg.max_tokens)
+        budget_s = _cap(budget_s, cfg.stream_budget_s)
+        self.deadline = time.monotonic() + budget_s if budget_s is not None else None
+        self.chunks = 0
+        # why the stream was cut short (max_tokens | deadline), None if it ran to the end
+        self.stopped: Optional[str] = None
+
+    def options(self, cfg: OllamaLLMConfig) -> Dict[str, Any]:
+        opts: Dict[str, Any] = {"temperature": cfg.temperature}
+        if self.max_tokens is not None:
+            opts["num_predict"] = self.max_tokens
+        return opts
+
+    def remaining(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        # a 0 socket timeout would mean non-blocking
+        return max(0.001, self.deadline - time.monotonic())
+
+    def read_timeout(self, read_timeout_s: float) -> float:
+        remaining = self.remaining()
+        return read_timeout_s if remaining is None else min(read_timeout_s, remaining)
+
+    async def anext(self, lines: AsyncIterator[str]) -> str:
+        """Next line, raising TimeoutError once the budget is used up."""
+        remaining = self.remaining()
+        if remaining is None:
+            return await lines.__anext__()
+        return await asyncio.wait_for(lines.__anext__(), remaining)
+
+    def stop(self, reason: str) -> None:
+        self.stopped = reason
+        metrics.GENERATIONS_ABORTED.inc(reason=reason)
+
+    def expired(self) -> bool:
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.stop("deadline")
+            return True
+        return False
+
+    def parse(self, line: str) -> Tuple[str, bool]:
+        """(chunk, stop) for one NDJSON line of /api/generate."""
+        obj = json.loads(line)
+        if obj.get("done"):
+            if obj.get("done_reason") == "length":
+                self.stop("max_tokens")
+            return "", True
+        return obj.get("response") or "", False
+
+    def spent(self) -> bool:
+        """Count one yielded chunk; True once the token budget is used up."""
+        self.chunks += 1
+        if self.max_tokens is not None and self.chunks >= self.max_tokens:
+            self.stop("max_tokens")
+            return True
+        return False
+
 
 class OllamaLLM(LLM):
     """
     This class implements the LLM interface to interact with an Ollama server.
     """
 
-    def __init__(self, cfg: OllamaLLMConfig):
+    def __init__(self, cfg: OllamaLLMConfig, session: Optional[requests.Session] = None):
         self.cfg = cfg
+        self._base_url = os.getenv("OLLAMA_API_URL", self.cfg.api_url)
+        self._timeout = (self.cfg.connect_timeout_s, self.cfg.timeout_s)
+        # pooled keep-alive session, usually shared with the embedder
+        self._session = session or create_session(HttpPoolConfig())
+
+    def close(self) -> None:
+        self._session.close()
 
     def generate(self, prompt: str) -> str:
         """Generate a text completion for the given prompt using Ollama API."""
-        base_url = os.getenv("OLLAMA_API_URL", self.cfg.api_url)
-        url = f"{base_url}/api/generate"
+        url = f"{self._base_url}/api/generate"
 
         payload = {
             "model": self.cfg.model_name,
@@ -34,10 +129,10 @@ class OllamaLLM(LLM):
                 "temperature": self.cfg.temperature,
             },
         }
-        response = requests.post(
+        response = self._session.post(
             url,
             json=payload,
-            timeout=self.cfg.timeout_s,
+            timeout=self._timeout,
         )
         response.raise_for_status()
         data = response.json()
@@ -47,32 +142,132 @@ class OllamaLLM(LLM):
         return data["response"].strip()
 
     #for streaming
-    def generate_stream(self, prompt:str) -> Iterator[str]:
+    def generate_stream(
+        self, prompt:str, *, max_tokens: Optional[int] = None, budget_s: Optional[float] = None
+    ) -> Iterator[str]:
         """
             Streaming from Ollama : yields token chunks as they arrive.
+            Closing the generator (or hitting a limit) closes the response.
         """
-        base_url = os.getenv("OLLAMA_API_URL", self.cfg.api_url)
-        url = f"{base_url}/api/generate"
+        limits = _StreamLimits(self.cfg, max_tokens, budget_s)
+        url = f"{self._base_url}/api/generate"
         payload = {
             "model": self.cfg.model_name,
             "prompt": prompt,
             "stream": True,
-            "options": {
+            "options": limits.options(self.cfg),
+        }
+
+        timeout = (self.cfg.connect_timeout_s, limits.read_timeout(self.cfg.timeout_s))
+        with self._session.post(url, json=payload, stream = True, timeout=timeout) as r:
+            r.raise_for_status()
+
+            lines = r.iter_lines(decode_unicode=True)
+            while True:
+                if limits.deadline is not None:
+                    _set_read_timeout(r, limits.read_timeout(self.cfg.timeout_s))
+                try:
+                    line = next(lines)
+                except StopIteration:
+                    break
+                except requests.exceptions.RequestException:
+                    # a read timed out: fine if it was the stream budget that ran out
+                    if limits.expired():
+                        break
+                    raise
+                if limits.expired():
+                    break
+                if not line:
+                    continue
+                chunk, stop = limits.parse(line)
+                if stop:
+                    break
+                if chunk:
+                    yield chunk
+                    if limits.spent():
+                        break
+        if limits.stopped:
+            # after the response is closed
+            yield StreamStop(limits.stopped)
+
+
+class AsyncOllamaLLM(AsyncLLM):
+    """
+    Async Ollama client for the request path.
+
+    Uses a pooled `httpx.AsyncClient`; a stream in progress holds a
+    connection but no worker thread.
+    """
+
+    def __init__(self, cfg: OllamaLLMConfig, client: Optional[httpx.AsyncClient] = None):
+        self.cfg = cfg
+        self._base_url = os.getenv("OLLAMA_API_URL", self.cfg.api_url)
+        self._client = client or create_async_client(
+            HttpPoolConfig(), connect_timeout_s=self.cfg.connect_timeout_s, read_timeout_s=self.cfg.timeout_s
+        )
+
+    def _payload(self, prompt: str, stream: bool, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return {
+            "model": self.cfg.model_name,
+            "prompt": prompt,
+            "stream": stream,
+            "options": options or {
                 "temperature": self.cfg.temperature,
             },
         }
 
-        with requests.post(url, json=payload, stream = True, timeout=self.cfg.timeout_s) as r:
+    async def aclose(self) -> None:
+        # closing a shared client twice is a no-op
+        await self._client.aclose()
+
+    async def generate(self, prompt: str) -> str:
+        """Generate a text completion for the given prompt using Ollama API."""
+        response = await self._client.post(
+            f"{self._base_url}/api/generate",
+            json=self._payload(prompt, stream=False),
+        )
+        response.raise_for_status()
+        data = response.json()
+        if "response" not in data:
+            raise RuntimeError(f"Ollama generate response missing 'response': {data}")
+
+        return data["response"].strip()
+
+    async def generate_stream(
+        self, prompt: str, *, max_tokens: Optional[int] = None, budget_s: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """
+            Streaming from Ollama : yields token chunks as they arrive.
+            `aclose()` on the generator (or hitting a limit) closes the response.
+        """
+        limits = _StreamLimits(self.cfg, max_tokens, budget_s)
+        async with self._client.stream(
+            "POST",
+            f"{self._base_url}/api/generate",
+            json=self._payload(prompt, stream=True, options=limits.options(self.cfg)),
+        ) as r:
             r.raise_for_status()
 
-            for line in r.iter_lines(decode_unicode=True):
+            lines = r.aiter_lines()
+            while True:
+                try:
+                    line = await limits.anext(lines)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    limits.stop("deadline")
+                    break
+                if limits.expired():
+                    break
                 if not line:
                     continue
-                obj = json.loads(line)
-                if obj.get("done"):
+                chunk, stop = limits.parse(line)
+                if stop:
                     break
-                
-                chunk = obj.get("response") or ""
                 if chunk:
                     yield chunk
-        
\ No newline at end of file
+                    if limits.spent():
+                        break
+        if limits.stopped:
+            # after the response is closed
+            yield StreamStop(limits.stopped)
@@ -0,0 +1,279 @@
+"""
+Admission control in front of the LLM.
+
+One `LLMScheduler` per model caps the calls in flight; callers beyond the
+cap wait in a bounded priority queue and get `LLMBusy` when it is full or
+their wait times out, so an overloaded backend answers fast instead of
+making every request slow. Sync (thread) and async (event loop) callers
+share the same slots.
+
+The priority of a call comes from `llm_priority()` (a context variable,
+so it reaches the wrapped provider without changing the LLM interface);
+query rewrites are short and are served before queued answer generations,
+and /chat/batch items come last but wait for a slot instead of timing out.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from app.core import metrics
+from app.rag.llm.llm_base import AsyncLLM, LLM
+
+# lower value = served first
+PRIORITIES: Dict[str, int] = {"rewrite": 0, "answer": 1, "batch": 2}
+REWRITE = "rewrite"
+ANSWER = "answer"
+BATCH = "batch"
+
+_priority: ContextVar[str] = ContextVar("llm_priority", default=ANSWER)
+
+
+@contextmanager
+def llm_priority(name: str) -> Iterator[None]:
+    """Schedule LLM calls made inside the block with priority class `name`."""
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown LLM priority: {name}")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class LLMBusy(RuntimeError):
+    """No LLM slot within the queue limits; `reason` is queue_full or timeout."""
+
+    def __init__(self, model: str, reason: str):
+        super().__init__(f"LLM '{model}' is busy ({reason})")
+        self.model = model
+        self.reason = reason
+
+
+@dataclass
+class LLMSchedulerConfig:
+    max_concurrency: int = 2
+    # callers allowed to wait for a slot; beyond that they are rejected at once
+    max_queue: int = 32
+    # longest wait for a slot before giving up (0 = do not wait)
+    queue_timeout_s: float = 10.0
+    # same for the batch class; None = wait until a slot frees up
+    batch_queue_timeout_s: Optional[float] = None
+
+
+class _Waiter:
+    __slots__ = ("priority", "granted", "cancelled", "event", "loop", "future")
+
+    def __init__(self, priority: str):
+        self.priority = priority
+        self.granted = False
+        self.cancelled = False
+        self.event: Optional[threading.Event] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.future: Optional["asyncio.Future[None]"] = None
+
+    def wake(self) -> None:
+        if self.event is not None:
+            self.event.set()
+        elif self.loop is not None:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self) -> None:
+        if self.future is not None and not self.future.done():
+            self.future.set_result(None)
+
+
+class LLMScheduler:
+    """
+    Slots for one model. A released slot is handed straight to the best
+    queued waiter (lowest priority value, then FIFO), so a burst of answer
+    generations cannot starve a rewrite that arrives later.
+    """
+
+    def __init__(self, model: str, cfg: Optional[LLMSchedulerConfig] = None):
+        self.model = model
+        self.cfg = cfg or LLMSchedulerConfig()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._heap: List[Tuple[int, int, _Waiter]] = []
+        self._seq = itertools.count()
+        self._waiting: Dict[str, int] = {p: 0 for p in PRIORITIES}
+        self.rejected = 0
+
+    # ---- acquire / release ----
+
+    @contextmanager
+    def slot(self, priority: Optional[str] = None) -> Iterator[None]:
+        """Hold one slot for the block (blocking wait)."""
+        waiter = self._enqueue(priority or _priority.get(), lambda w: setattr(w, "event", threading.Event()))
+        if waiter is not None:
+            started = time.perf_counter()
+            try:
+                waiter.event.wait(self._queue_timeout(waiter.priority))
+            except BaseException:
+                self._abandon(waiter)
+                raise
+            self._settle(waiter, started)
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def aslot(self, priority: Optional[str] = None) -> AsyncIterator[None]:
+        """Hold one slot for the block (waits on the event loop)."""
+        loop = asyncio.get_running_loop()
+
+        def attach(w: _Waiter) -> None:
+            w.loop, w.future = loop, loop.create_future()
+
+        waiter = self._enqueue(priority or _priority.get(), attach)
+        if waiter is not None:
+            started = time.perf_counter()
+            try:
+                await asyncio.wait({waiter.future}, timeout=self._queue_timeout(waiter.priority))
+            except BaseException:
+                # cancelled while queued: a slot granted meanwhile is given back
+                self._abandon(waiter)
+                raise
+            self._settle(waiter, started)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _enqueue(self, priority: str, attach) -> Optional[_Waiter]:
+        """None when a slot was free; otherwise a queued waiter. Raises LLMBusy if the queue is full."""
+        with self._lock:
+            # the heap may still hold cancelled waiters; count live ones
+            if self._active < self.cfg.max_concurrency and not any(self._waiting.values()):
+                self._active += 1
+                metrics.LLM_QUEUE_WAIT_SECONDS.observe(0.0, model=self.model, priority=priority)
+                return None
+            timeout = self._queue_timeout(priority)
+            if sum(self._waiting.values()) >= self.cfg.max_queue or (timeout is not None and timeout <= 0):
+                self._reject("queue_full")
+            waiter = _Waiter(priority)
+            attach(waiter)
+            heapq.heappush(self._heap, (PRIORITIES[priority], next(self._seq), waiter))
+            self._waiting[priority] += 1
+            return waiter
+
+    def _queue_timeout(self, priority: str) -> Optional[float]:
+        if priority == BATCH:
+            return self.cfg.batch_queue_timeout_s
+        return self.cfg.queue_timeout_s
+
+    def _settle(self, waiter: _Waiter, started: float) -> None:
+        """After a wait: keep a granted slot, otherwise leave the queue and raise LLMBusy."""
+        with self._lock:
+            metrics.LLM_QUEUE_WAIT_SECONDS.observe(
+                time.perf_counter() - started, model=self.model, priority=waiter.priority
+            )
+            if waiter.granted:
+                return
+            waiter.cancelled = True
+            self._waiting[waiter.priority] -= 1
+            self._reject("timeout")
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        with self._lock:
+            if not waiter.granted:
+                waiter.cancelled = True
+                self._waiting[waiter.priority] -= 1
+                return
+        self._release()
+
+    def _reject(self, reason: str) -> None:
+        # called with the lock held
+        self.rejected += 1
+        metrics.LLM_REJECTED.inc(model=self.model, reason=reason)
+        raise LLMBusy(self.model, reason)
+
+    def _release(self) -> None:
+        with self._lock:
+            while self._heap:
+                _, _, waiter = heapq.heappop(self._heap)
+                if waiter.cancelled:
+                    continue
+                # hand the slot over; _active stays the same
+                waiter.granted = True
+                self._waiting[waiter.priority] -= 1
+                waiter.wake()
+                return
+            self._active -= 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            out: Dict[str, float] = {
+                "in_flight": self._active,
+                "queue_depth": sum(self._waiting.values()),
+                "rejected": self.rejected,
+            }
+            for name, n in self._waiting.items():
+                out[f"queue_depth_{name}"] = n
+        return out
+
+
+_SCHEDULERS: Dict[str, LLMScheduler] = {}
+_SCHEDULERS_LOCK = threading.Lock()
+
+
+def get_scheduler(model: str, cfg: Optional[LLMSchedulerConfig] = None) -> LLMScheduler:
+    """Process-wide scheduler for `model` (the sync and async providers share it)."""
+    with _SCHEDULERS_LOCK:
+        scheduler = _SCHEDULERS.get(model)
+        if scheduler is None:
+            scheduler = _SCHEDULERS[model] = LLMScheduler(model, cfg)
+        return scheduler
+
+
+class ScheduledLLM(LLM):
+    """Runs every call of `llm` inside a scheduler slot; a stream holds its slot until closed."""
+
+    def __init__(self, llm: LLM, scheduler: LLMScheduler):
+        self.llm = llm
+        self.scheduler = scheduler
+
+    def generate(self, prompt: str) -> str:
+        with self.scheduler.slot():
+            return self.llm.generate(prompt)
+
+    def generate_stream(self, prompt: str, **limits: Any) -> Iterator[str]:
+        with self.scheduler.slot():
+            yield from self.llm.generate_stream(prompt, **limits)
+
+    def close(self) -> None:
+        self.llm.close()
+
+
+class AsyncScheduledLLM(AsyncLLM):
+    """Async `ScheduledLLM`."""
+
+    def __init__(self, llm: AsyncLLM, scheduler: LLMScheduler):
+        self.llm = llm
+        self.scheduler = scheduler
+
+    async def generate(self, prompt: str) -> str:
+        async with self.scheduler.aslot():
+            return await self.llm.generate(prompt)
+
+    async def generate_stream(self, prompt: str, **limits: Any) -> AsyncIterator[str]:
+        async with self.scheduler.aslot():
+            stream = self.llm.generate_stream(prompt, **limits)
+            try:
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                # close the provider stream (and its response) before the slot is released
+                await stream.aclose()
+
+    async def aclose(self) -> None:
+        await self.llm.aclose()
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from typing import Any, AsyncIterator, Iterator
+
+from app.core.singleflight import AsyncSingleFlight, AsyncStreamFlight, SingleFlight, StreamFlight
+from app.rag.llm.llm_base import AsyncLLM, LLM
+
+
+def _stream_key(model: str, prompt: str, limits: dict) -> tuple:
+    # streams with different limits end differently, so they are not shared
+    return (model, prompt, tuple(sorted(limits.items())))
+
+
+class SingleFlightLLM(LLM):
+    """
+    Wraps an LLM so that concurrent identical calls (same model, exact same
+    prompt) share one upstream generation. A `generate_stream` that joins
+    late first gets the chunks produced so far; the upstream stream is
+    closed only when its last reader closes. Put it outside the scheduler,
+    so a shared call holds one slot.
+    """
+
+    def __init__(self, llm: LLM, model_name: str) -> None:
+        self.llm = llm
+        self.model_name = model_name
+        # admission control stats stay reachable through the wrapper
+        self.scheduler = getattr(llm, "scheduler", None)
+        self._calls = SingleFlight("generate")
+        self._streams = StreamFlight("stream")
+
+    def generate(self, prompt: str) -> str:
+        return self._calls.do((self.model_name, prompt), lambda: self.llm.generate(prompt))
+
+    def generate_stream(self, prompt: str, **limits: Any) -> Iterator[str]:
+        return self._streams.subscribe(
+            _stream_key(self.model_name, prompt, limits),
+            lambda: self.llm.generate_stream(prompt, **limits),
+        )
+
+    def close(self) -> None:
+        self.llm.close()
+
+
+class AsyncSingleFlightLLM(AsyncLLM):
+    """Async `SingleFlightLLM`."""
+
+    def __init__(self, llm: AsyncLLM, model_name: str) -> None:
+        self.llm = llm
+        self.model_name = model_name
+        self.scheduler = getattr(llm, "scheduler", None)
+        self._calls = AsyncSingleFlight("generate")
+        self._streams = AsyncStreamFlight("stream")
+
+    async def generate(self, prompt: str) -> str:
+        return await self._calls.do((self.model_name, prompt), lambda: self.llm.generate(prompt))
+
+    def generate_stream(self, prompt: str, **limits: Any) -> AsyncIterator[str]:
+        return self._streams.subscribe(
+            _stream_key(self.model_name, prompt, limits),
+            lambda: self.llm.generate_stream(prompt, **limits),
+        )
+
+    async def aclose(self) -> None:
+        await self.llm.aclose()
@@ -43,3 +43,40 @@ def should_rewrite(question: str, max_words: int) -> bool:
         return True
 
     return False
+
+
+# words that never make up the subject of a previous question
+_SUBJECT_DROP = set(
+    "what which who whom whose when where why how is are was were am be been do does did can could would "
+    "should will may might shall the a an of in on at to for from by with about and or but not no please "
+    "tell me explain describe give show list say says said mean means i we you my our your there here "
+    "any some more much many".split()
+) | set(_PRONOUNS) | {"their", "these", "those"}
+
+_PRONOUN_RE = re.compile(r"\b(it|this|that|they|them|its|their)\b", re.IGNORECASE)
+_WORD_RE = re.compile(r"[A-Za-z0-9][\w./-]*")
+
+
+def subject_phrase(text: str, max_words: int = 8) -> str:
+    """Content words of a question, e.g. "What is the reimbursement deadline?" -> "reimbursement deadline"."""
+    words = [w for w in _WORD_RE.findall(text or "") if w.lower() not in _SUBJECT_DROP]
+    return " ".join(words[:max_words])
+
+
+def heuristic_rewrite(question: str, previous_question: str) -> str:
+    """
+    Cheap, non-LLM rewrite: replace the first pronoun with the subject of
+    the previous user question, or append that subject when there is no
+    pronoun to replace. Returns the question unchanged if there is no subject.
+    """
+    q = (question or "").strip()
+    subject = subject_phrase(previous_question)
+    if not q or not subject:
+        return q
+
+    def _sub(m: re.Match) -> str:
+        return f"{subject}'s" if m.group(1).lower() in ("its", "their") else subject
+
+    if _PRONOUN_RE.search(q):
+        return _PRONOUN_RE.sub(_sub, q, count=1)
+    return f"{q.rstrip('?.! ')} ({subject})"
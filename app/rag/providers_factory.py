@@ -1,27 +1,103 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Tuple
+from pathlib import Path
+from typing import Optional, Tuple
+
+import requests
 
 from app.core.config import get_settings
-from app.rag.embeddings.embedder_base import Embedder
-from app.rag.llm.llm_base import LLM
+from app.core.http import HttpPoolConfig, create_async_client, create_session
+from app.rag.embeddings.embedder_base import AsyncEmbedder, Embedder
+from app.rag.llm.llm_base import AsyncLLM, LLM
+
+from app.rag.embeddings.ollama_embedder import AsyncOllamaEmbedder, OllamaEmbedder, OllamaEmbedderConfig
+from app.rag.embeddings.cached_embedder import CachedEmbedder, EmbeddingCacheConfig
+from app.rag.embeddings.singleflight_embedder import AsyncSingleFlightEmbedder, SingleFlightEmbedder
+from app.rag.llm.ollama_llm import AsyncOllamaLLM, OllamaLLM, OllamaLLMConfig
+from app.rag.llm.scheduler import AsyncScheduledLLM, LLMScheduler, LLMSchedulerConfig, ScheduledLLM, get_scheduler
+from app.rag.llm.singleflight_llm import AsyncSingleFlightLLM, SingleFlightLLM
+
+
+def _http_pool_config() -> HttpPoolConfig:
+    http = get_settings().ollama.http
+    return HttpPoolConfig(
+        pool_size=http.pool_size,
+        async_pool_size=http.async_pool_size,
+        keep_alive=http.keep_alive,
+        max_retries=http.max_retries,
+        backoff_factor=http.backoff_factor,
+    )
 
-from app.rag.embeddings.ollama_embedder import OllamaEmbedder, OllamaEmbedderConfig
-from app.rag.llm.ollama_llm import OllamaLLM, OllamaLLMConfig
 
+def create_http_session() -> requests.Session:
+    """One pooled session shared by the sync Ollama providers."""
+    return create_session(_http_pool_config())
 
-def create_embedder() -> Embedder:
+
+def _ollama_embedder_config() -> OllamaEmbedderConfig:
     settings = get_settings()
+    return OllamaEmbedderConfig(
+        model_name=settings.ollama.embeddings.model_name,
+        api_url=settings.ollama.api_url,
+        timeout_s=settings.ollama.timeout_s,
+        connect_timeout_s=settings.ollama.http.connect_timeout_s,
+        batch_size=settings.ollama.embeddings.batch_size,
+    )
 
-    if settings.providers.embedder == "ollama":
-        return OllamaEmbedder(
-            OllamaEmbedderConfig(
-                model_name=settings.ollama.embeddings.model_name,
-                api_url=settings.ollama.api_url,
-                timeout_s=settings.ollama.timeout_s,
-            )
+
+def _ollama_llm_config() -> OllamaLLMConfig:
+    settings = get_settings()
+    return OllamaLLMConfig(
+        model_name=settings.ollama.llm.model_name,
+        api_url=settings.ollama.api_url,
+        temperature=settings.ollama.llm.temperature,
+        timeout_s=settings.ollama.timeout_s,
+        connect_timeout_s=settings.ollama.http.connect_timeout_s,
+        max_tokens=settings.ollama.llm.max_tokens,
+        stream_budget_s=settings.ollama.llm.stream_budget_s,
+    )
+
+
+def llm_scheduler() -> Optional[LLMScheduler]:
+    """Shared admission-control scheduler for the configured model; None when disabled."""
+    settings = get_settings()
+    sc = settings.ollama.scheduler
+    if not sc.enabled:
+        return None
+    model = settings.ollama.llm.model_name
+    return get_scheduler(
+        model,
+        LLMSchedulerConfig(
+            max_concurrency=sc.per_model.get(model, sc.max_concurrency),
+            max_queue=sc.max_queue,
+            queue_timeout_s=sc.queue_timeout_s,
+            batch_queue_timeout_s=sc.batch_queue_timeout_s,
+        ),
+    )
+
+
+def create_embedder(session: Optional[requests.Session] = None) -> Embedder:
+    settings = get_settings()
+    embedder = _create_base_embedder(session)
+    if settings.ollama.singleflight.enabled:
+        # under the cache: only misses reach it
+        embedder = SingleFlightEmbedder(embedder)
+
+    cache = settings.rag.embedding_cache
+    if cache.enabled:
+        embedder = CachedEmbedder(
+            embedder,
+            EmbeddingCacheConfig(path=Path(cache.path), max_entries=cache.max_entries),
         )
+    return embedder
+
+
+def _create_base_embedder(session: Optional[requests.Session] = None) -> Embedder:
+    settings = get_settings()
+
+    if settings.providers.embedder == "ollama":
+        return OllamaEmbedder(_ollama_embedder_config(), session=session or create_http_session())
 
     if settings.providers.embedder == "openai":
         raise NotImplementedError("OpenAI embedder provider not implemented yet.")
@@ -29,18 +105,18 @@ def create_embedder() -> Embedder:
     raise ValueError(f"Unknown embedder provider: {settings.providers.embedder}")
 
 
-def create_llm() -> LLM:
+def create_llm(session: Optional[requests.Session] = None) -> LLM:
     settings = get_settings()
 
     if settings.providers.llm == "ollama":
-        return OllamaLLM(
-            OllamaLLMConfig(
-                model_name=settings.ollama.llm.model_name,
-                api_url=settings.ollama.api_url,
-                temperature=settings.ollama.llm.temperature,
-                timeout_s=settings.ollama.timeout_s,
-            )
-        )
+        llm: LLM = OllamaLLM(_ollama_llm_config(), session=session or create_http_session())
+        scheduler = llm_scheduler()
+        if scheduler is not None:
+            llm = ScheduledLLM(llm, scheduler)
+        if settings.ollama.singleflight.enabled:
+            # outside the scheduler: a shared call takes one slot
+            llm = SingleFlightLLM(llm, settings.ollama.llm.model_name)
+        return llm
 
     if settings.providers.llm == "openai":
         raise NotImplementedError("OpenAI LLM provider not implemented yet.")
@@ -49,4 +125,36 @@ def create_llm() -> LLM:
 
 
 def create_providers() -> Tuple[Embedder, LLM]:
-    return create_embedder(), create_llm()
+    """
+    Sync providers sharing one pooled keep-alive session.
+    Close them with `RAGService.aclose` (wired to app shutdown).
+    """
+    session = create_http_session()
+    return create_embedder(session), create_llm(session)
+
+
+def create_async_providers() -> Tuple[Optional[AsyncEmbedder], Optional[AsyncLLM]]:
+    """
+    Async providers for the request path. Both share one pooled HTTP client.
+    Returns (None, None) for providers without an async implementation;
+    callers then fall back to the sync providers in a thread.
+    """
+    settings = get_settings()
+    if settings.providers.embedder != "ollama" or settings.providers.llm != "ollama":
+        return None, None
+
+    client = create_async_client(
+        _http_pool_config(),
+        connect_timeout_s=settings.ollama.http.connect_timeout_s,
+        read_timeout_s=settings.ollama.timeout_s,
+    )
+    embedder: AsyncEmbedder = AsyncOllamaEmbedder(_ollama_embedder_config(), client=client)
+    llm: AsyncLLM = AsyncOllamaLLM(_ollama_llm_config(), client=client)
+    scheduler = llm_scheduler()
+    if scheduler is not None:
+        # same slots as the sync provider
+        llm = AsyncScheduledLLM(llm, scheduler)
+    if settings.ollama.singleflight.enabled:
+        embedder = AsyncSingleFlightEmbedder(embedder)
+        llm = AsyncSingleFlightLLM(llm, settings.ollama.llm.model_name)
+    return embedder, llm
@@ -1,20 +1,166 @@
 from pathlib import Path
+from typing import Optional
 from app.core.config import get_settings
+from app.rag.cache.answer_cache import AnswerCache, AnswerCacheConfig
+from app.rag.cache.rewrite_cache import RewriteCache, RewriteCacheConfig
+from app.rag.cache.session_store import (
+    InMemorySessionStore,
+    SessionStore,
+    SessionStoreConfig,
+    SqliteSessionStore,
+)
+from app.rag.ingest.pipeline import default_manifest_path
 from app.rag.rag_service import RAGService
-from app.rag.store.chroma_store import ChromaStore, ChromaStoreConfig
+from app.rag.store.lexical_index import LexicalIndex, LexicalIndexConfig
+from app.rag.store.vectordb_base import VectorStore
 
-def create_rag_service(embedder, llm) -> RAGService:
+
+def create_store() -> VectorStore:
+    """
+    Build the vector store selected by `providers.store`; with
+    `rag.sharding.enabled` it is one such store per doc_type shard.
+    """
     settings = get_settings()
+    sc = settings.rag.sharding
+    if not sc.enabled:
+        return _create_backend(settings.rag.collection_name)
 
-    store = ChromaStore(
-        ChromaStoreConfig(
+    from app.rag.store.sharded_store import ShardedStore, ShardedStoreConfig
+
+    return ShardedStore(
+        ShardedStoreConfig(
+            persist_directory=Path(settings.rag.persist_dir),
             collection_name=settings.rag.collection_name,
+            shard_key=sc.shard_key,
+            default_shard=sc.default_shard,
+            fanout_workers=sc.fanout_workers,
+        ),
+        open_shard=_create_backend,
+    )
+
+
+def _create_backend(collection_name: str) -> VectorStore:
+    settings = get_settings()
+    persist_dir = Path(settings.rag.persist_dir)
+
+    if settings.providers.store == "faiss":
+        from app.rag.store.faiss_store import FaissStore, FaissStoreConfig
+
+        fc = settings.rag.faiss
+        return FaissStore(
+            FaissStoreConfig(
+                persist_directory=persist_dir,
+                collection_name=collection_name,
+                index_type=fc.index_type,
+                nlist=fc.nlist,
+                nprobe=fc.nprobe,
+                hnsw_m=fc.hnsw_m,
+                ef_construction=fc.ef_construction,
+                ef_search=fc.ef_search,
+                exact_filter_max=fc.exact_filter_max,
+            )
+        )
+
+    if settings.providers.store == "numpy":
+        from app.rag.store.numpy_store import NumpyStore, NumpyStoreConfig
+
+        nc = settings.rag.numpy
+        return NumpyStore(
+            NumpyStoreConfig(
+                persist_directory=persist_dir,
+                collection_name=collection_name,
+                dtype=nc.dtype,
+                block_rows=nc.block_rows,
+            )
+        )
+
+    from app.rag.store.chroma_store import ChromaStore, ChromaStoreConfig
+
+    return ChromaStore(
+        ChromaStoreConfig(
+            collection_name=collection_name,
+            persist_directory=persist_dir,
+        )
+    )
+
+
+def create_lexical_index() -> Optional[LexicalIndex]:
+    """BM25 index for hybrid retrieval; None when `rag.hybrid.enabled` is off."""
+    settings = get_settings()
+    hc = settings.rag.hybrid
+    if not hc.enabled:
+        return None
+    return LexicalIndex(
+        LexicalIndexConfig(
             persist_directory=Path(settings.rag.persist_dir),
+            collection_name=settings.rag.collection_name,
+            k1=hc.k1,
+            b=hc.b,
+        )
+    )
+
+
+def create_answer_cache() -> Optional[AnswerCache]:
+    """
+    Semantic answer cache; None when `rag.answer_cache.enabled` is off.
+    It is cleared whenever ingest rewrites the manifest (i.e. chunks changed).
+    """
+    settings = get_settings()
+    ac = settings.rag.answer_cache
+    if not ac.enabled:
+        return None
+    return AnswerCache(
+        AnswerCacheConfig(
+            similarity_threshold=ac.similarity_threshold,
+            ttl_s=ac.ttl_s,
+            max_entries=ac.max_entries,
+            invalidate_on=default_manifest_path(Path(settings.rag.persist_dir), settings.rag.collection_name),
+            check_interval_s=ac.check_interval_s,
         )
     )
 
+
+def create_rewrite_cache() -> Optional[RewriteCache]:
+    """Query rewrite cache; None when `rag.rewrite_cache.enabled` is off."""
+    settings = get_settings()
+    rc = settings.rag.rewrite_cache
+    if not rc.enabled:
+        return None
+    return RewriteCache(
+        RewriteCacheConfig(
+            ttl_s=rc.ttl_s,
+            max_entries=rc.max_entries,
+            path=Path(rc.path) if rc.path else None,
+        )
+    )
+
+
+def create_session_store() -> Optional[SessionStore]:
+    """Server-side chat history; None when `rag.sessions.enabled` is off."""
+    settings = get_settings()
+    sc = settings.rag.sessions
+    if not sc.enabled:
+        return None
+    cfg = SessionStoreConfig(
+        ttl_s=sc.ttl_s,
+        max_sessions=sc.max_sessions,
+        max_turns=sc.max_turns,
+        path=Path(sc.path),
+    )
+    if sc.backend == "sqlite":
+        return SqliteSessionStore(cfg)
+    return InMemorySessionStore(cfg)
+
+
+def create_rag_service(embedder, llm, async_embedder=None, async_llm=None) -> RAGService:
     return RAGService(
         embedder=embedder,
         llm=llm,
-        store=store,
-    )
\ No newline at end of file
+        store=create_store(),
+        async_embedder=async_embedder,
+        async_llm=async_llm,
+        lexical=create_lexical_index(),
+        answer_cache=create_answer_cache(),
+        rewrite_cache=create_rewrite_cache(),
+        session_store=create_session_store(),
+    )
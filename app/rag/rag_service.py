@@ -1,14 +1,27 @@
 from __future__ import annotations
-from typing import List, Optional, Tuple, Any, Dict
+from typing import AsyncIterator, Iterator, List, Optional, Sequence, Tuple, Any, Dict
+from dataclasses import dataclass, field
 from pathlib import Path
+import asyncio
+import hashlib
 import logging
+import threading
+import time
+from concurrent.futures import CancelledError, Executor, ThreadPoolExecutor, as_completed
 
+from app.core import metrics
 from app.core.config import get_settings
 
 from app.api.schemas import ChatTurn
 from app.rag.store.chroma_store import ChromaStore, ChromaStoreConfig
-from app.rag.embeddings.embedder_base import Embedder
-from app.rag.llm.llm_base import LLM
+from app.rag.embeddings.embedder_base import AsyncEmbedder, Embedder
+from app.rag.llm.llm_base import AsyncLLM, LLM
+from app.rag.llm.scheduler import BATCH, LLMBusy, llm_priority
+from app.rag.store.lexical_index import LexicalIndex, tokenize
+from app.rag.cache.answer_cache import AnswerCache
+from app.rag.cache.rewrite_cache import RewriteCache
+from app.rag.cache.session_store import SessionStore
+from app.rag.turn_context import TurnContext
 
 #rag components
 from app.rag.prompts.loader import PromptLoader
@@ -23,6 +36,43 @@ from app.rag.retrieve.intent_router import IntentRouter
 import re
 _CITE_RE = re.compile(r"\[(\d{1,3})\]") 
 
+
+@dataclass
+class PreparedTurn:
+    """
+    Everything needed to answer one turn, before any LLM generation:
+      - prompt is None  -> answer with deny_text (or cached_answer on a cache hit)
+      - cache_vec/cache_partition are set when the generated answer may be cached
+    """
+    prompt: Optional[str]
+    citations: List[dict]
+    deny_text: Optional[str] = None
+    cached_answer: Optional[str] = None
+    cache_vec: Optional[List[float]] = None
+    cache_partition: Optional[str] = None
+    ctx: Optional[TurnContext] = None
+
+    @property
+    def cached(self) -> bool:
+        return self.cached_answer is not None
+
+
+@dataclass
+class BatchAnswer:
+    """One `answer_batch` result; `index` is the request's position in the batch."""
+    index: int
+    answer: Optional[str] = None
+    citations: List[dict] = field(default_factory=list)
+    turn: Optional[PreparedTurn] = None
+    error: Optional[str] = None
+
+    @property
+    def outcome(self) -> Optional[str]:
+        if self.turn is None or self.turn.ctx is None:
+            return None
+        return self.turn.ctx.outcome
+
+
 class RAGService:
     """
         Retrieval-Augmented Generation (RAG) Service
@@ -31,10 +81,25 @@ class RAGService:
         retrieval-augmented responses.
     """
 
-    def __init__(self, embedder: Embedder, llm: LLM, store = None):
+    def __init__(
+        self,
+        embedder: Embedder,
+        llm: LLM,
+        store = None,
+        async_embedder: Optional[AsyncEmbedder] = None,
+        async_llm: Optional[AsyncLLM] = None,
+        lexical: Optional[LexicalIndex] = None,
+        answer_cache: Optional[AnswerCache] = None,
+        rewrite_cache: Optional[RewriteCache] = None,
+        session_store: Optional[SessionStore] = None,
+    ):
         
         self.embedder = embedder
         self.llm = llm
+
+        # async providers for the request path (optional; see abuild_prompt_and_citations)
+        self.async_embedder = async_embedder
+        self.async_llm = async_llm
         
         settings = get_settings()
 
@@ -54,13 +119,26 @@ class RAGService:
         self.max_chunks_in_prompt = settings.rag.max_chunks_in_prompt
         self.max_history = settings.rag.max_history
 
+        # batch answering
+        self.batch_max_concurrency = settings.rag.batch.max_concurrency
+
         # rewrite knobs
         self.enable_rewrite_query = settings.rag.rewrite.enabled
         self.rewrite_max_history_turns = settings.rag.rewrite.max_history_turns
         self.rewrite_trigger_max_words = settings.rag.rewrite.trigger_max_words
+        self.rewrite_mode = settings.rag.rewrite.mode
+        self.speculative_margin = settings.rag.rewrite.speculative_margin
+        self.speculative_early_accept = settings.rag.rewrite.speculative_early_accept
+        # sync speculative mode runs the LLM rewrite here while retrieval proceeds
+        self._rewrite_pool = (
+            ThreadPoolExecutor(max_workers=4, thread_name_prefix="rewrite")
+            if self.rewrite_mode == "speculative" else None
+        )
 
         #policy
         self.no_answer_text = settings.policy.deny_message
+        self.busy_text = settings.policy.busy_message
+        self.closing_text = "No Problem - glad I could help! If you need anything else later, just ask."
         self.require_quotes_in_weak_mode = settings.policy.require_quotes_in_weak_mode
         
         # store creation
@@ -84,6 +162,35 @@ class RAGService:
         self.answer_prompt = prompts.answer
         self.rewrite_prompt = prompts.rewrite
 
+        # semantic answer cache; entries are scoped to this template version
+        self.answer_cache = answer_cache
+
+        # server-side history by session_id (see `_session_history`)
+        self.sessions = session_store
+
+        # per-stage timings are collected only when something consumes them
+        self.timed = settings.app.metrics.enabled or settings.app.metrics.timing_header
+        if settings.app.metrics.enabled:
+            if answer_cache is not None:
+                metrics.REGISTRY.register_stats("rag_answer_cache", answer_cache.stats)
+            if rewrite_cache is not None:
+                metrics.REGISTRY.register_stats("rag_rewrite_cache", rewrite_cache.stats)
+            if session_store is not None:
+                metrics.REGISTRY.register_stats("rag_sessions", session_store.stats)
+            if hasattr(embedder, "stats"):
+                metrics.REGISTRY.register_stats("rag_embedding_cache", embedder.stats)
+            if getattr(llm, "scheduler", None) is not None:
+                metrics.REGISTRY.register_stats("rag_llm_scheduler", llm.scheduler.stats)
+        self.template_version = hashlib.sha256(
+            "\n".join([
+                self.system_prompt,
+                self.answer_prompt,
+                settings.providers.llm,
+                settings.ollama.llm.model_name,
+                self.embedder.model_name,
+            ]).encode("utf-8")
+        ).hexdigest()[:16]
+
         #prompt builder
         self.prompt_builder = PromptBuilder(
             system_prompt=self.system_prompt,
@@ -106,21 +213,38 @@ class RAGService:
                 enabled=self.enable_rewrite_query,
                 max_history_turns=self.rewrite_max_history_turns,
                 trigger_max_words=self.rewrite_trigger_max_words,
-            )
+                mode=self.rewrite_mode,
+            ),
+            cache=rewrite_cache,
+            model_name=settings.ollama.llm.model_name,
         )
 
         # retriever
         self.retriever = Retriever(
             embedder=self.embedder,
             store=self.store,
-            cfg=RetrieverConfig(top_k=self.top_k, retrieval_pool_k= self.retrieval_pool_k),
+            cfg=RetrieverConfig(
+                top_k=self.top_k,
+                retrieval_pool_k= self.retrieval_pool_k,
+                dedup_pages=settings.rag.dedup_pages,
+                selection=settings.rag.selection,
+                mmr_lambda=settings.rag.mmr_lambda,
+                hybrid=settings.rag.hybrid.enabled,
+                lexical_pool_k=settings.rag.hybrid.lexical_pool_k,
+                rrf_k=settings.rag.hybrid.rrf_k,
+                identifier_distance_cap=settings.rag.hybrid.identifier_distance_cap,
+            ),
+            async_embedder=self.async_embedder,
+            lexical=lexical,
         )
 
         # query router
         self.query_router = QueryRouter()
 
         #intent router
-        self.intent_router = IntentRouter.build(self.embedder)
+        self.intent_router = IntentRouter.build(
+            self.embedder, anchor_path=Path(settings.rag.intent.anchor_cache_path)
+        )
 
     def _user_only_history(self, history: Optional[List[ChatTurn]]) -> List[ChatTurn]:
         if not history:
@@ -132,7 +256,7 @@ class RAGService:
             Keep only citation use din the answer
         """
         if not citations:
-            return
+            return []
         
         if not answer:
             return citations[:max_used]
@@ -178,37 +302,480 @@ class RAGService:
         ]
         return any(t in a for t in triggers)
 
+    def _session_history(
+        self, ctx: TurnContext, question: str, history: Optional[List[ChatTurn]], session_id: Optional[str]
+    ) -> Optional[List[ChatTurn]]:
+        """
+            History for this turn, ending with the question (as the web UI sends it).
+            Clients that still send `history` win and re-seed the session;
+            otherwise the question is appended to the stored session and
+            ctx.session_restored tells whether that session was found.
+            Only user turns are stored, since only those are used.
+        """
+        if self.sessions is None or not session_id:
+            return history
+        if history:
+            self.sessions.replace(session_id, self._user_only_history(history))
+            return history
+        turns, ctx.session_restored = self.sessions.append(session_id, ChatTurn(role="user", text=question))
+        # no earlier turns: the question alone is not history (it would trigger a rewrite)
+        return turns if len(turns) > 1 else []
+
+    def _recent_history(self, history: Optional[List[ChatTurn]]) -> Tuple[List[ChatTurn], str]:
+        history = self._user_only_history(history)
+        history = history[-4:] or []
+
+        rewrite_hist_text = self.prompt_builder.format_history(
+            history or [],
+            self.rewrite_max_history_turns
+        )
+        return history, rewrite_hist_text
+
     def build_prompt_and_citations(
         self, 
         question:str,
         history: Optional[List[ChatTurn]] =None,
         session_id: Optional[str] = None,
-    ) -> Tuple[Optional[str], List[dict]]:
+    ) -> Tuple[Optional[str], List[dict], Optional[str]]:
         """
-            Builds the final prompt + return citations (as a plain dicts) without calling the llm and if the retrieval is insuffienct , returns (None, [])
+            Builds the final prompt + return citations (as a plain dicts) without calling the llm and if the retrieval is insuffienct , returns (None, [], deny_text)
     
         """
+        turn = self.prepare(question, history=history, session_id=session_id, use_cache=False)
+        return turn.prompt, turn.citations, turn.deny_text
 
-        if self.intent_router.is_closing(question):
-            return None, [], "No Problem - glad I could help! If you need anything else later, just ask."
+    async def abuild_prompt_and_citations(
+        self,
+        question: str,
+        history: Optional[List[ChatTurn]] = None,
+        session_id: Optional[str] = None,
+    ) -> Tuple[Optional[str], List[dict], Optional[str]]:
+        """
+            Async build_prompt_and_citations; see `aprepare`.
+        """
+        turn = await self.aprepare(question, history=history, session_id=session_id, use_cache=False)
+        return turn.prompt, turn.citations, turn.deny_text
 
-        history = self._user_only_history(history)
-        history = history[-4:] or []
+    def new_turn(self, question: str, session_id: Optional[str] = None) -> TurnContext:
+        return TurnContext(
+            question=question,
+            embedder=self.embedder,
+            llm=self.llm,
+            async_embedder=self.async_embedder,
+            async_llm=self.async_llm,
+            session_id=session_id,
+            timings={} if self.timed else None,
+        )
 
-        # print("HISTORY : ", history)
-        rewrite_hist_text = self.prompt_builder.format_history(
-            history or [],
-            self.rewrite_max_history_turns
+    def prepare(
+        self,
+        question: str,
+        history: Optional[List[ChatTurn]] = None,
+        session_id: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> PreparedTurn:
+        """
+            Everything up to (not including) generation: intent check, rewrite,
+            routing, query embedding, answer-cache lookup, retrieval and prompt.
+            Intermediate results live on the turn's TurnContext (`turn.ctx`).
+        """
+        ctx = self.new_turn(question, session_id)
+        history = self._session_history(ctx, question, history, session_id)
+
+        # rules first; the question is embedded only if they are undecided
+        closing = self.intent_router.precheck(question)
+        if closing is None:
+            closing = self.intent_router.confirm(ctx.embed(question))
+        if closing:
+            return self._done(ctx, PreparedTurn(None, [], self.closing_text), "closing")
+
+        history, rewrite_hist_text = self._recent_history(history)
+        if self.rewrite_mode == "speculative" and self.rewriter.wants_rewrite(question, rewrite_hist_text):
+            q_vec = self._speculate(ctx, question, rewrite_hist_text)
+        else:
+            with ctx.stage("rewrite"):
+                ctx.rewritten = self.rewriter.maybe_rewrite(
+                    question, rewrite_hist_text, generate=ctx.rewrite, history=history
+                ).strip()
+            ctx.where = self.query_router.route_where(ctx.rewritten)
+            q_vec = ctx.embed(ctx.rewritten)
+
+        partition = self._cache_partition(ctx.where) if use_cache else None
+        with ctx.stage("answer_cache"):
+            hit = self._cache_lookup(q_vec, partition, question)
+        if hit is not None:
+            return self._done(ctx, hit, "cached")
+
+        if ctx.retrieval is None:
+            with ctx.stage("retrieve"):
+                ctx.retrieval = self.retriever.retrieve(ctx.rewritten, where=ctx.where, q_vec=q_vec)
+        docs, citations, dists = ctx.retrieval
+        with ctx.stage("prompt"):
+            built = self._assemble_prompt(question, history, docs, citations, dists, session_id)
+        return self._prepared(ctx, built, q_vec, partition)
+
+    async def aprepare(
+        self,
+        question: str,
+        history: Optional[List[ChatTurn]] = None,
+        session_id: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> PreparedTurn:
+        """
+            Async prepare: network calls go through the async
+            providers, so the event loop is never blocked on Ollama.
+            Falls back to the sync pipeline in a thread when no async providers are set.
+        """
+        if self.async_embedder is None or self.async_llm is None:
+            return await asyncio.to_thread(self.prepare, question, history, session_id, use_cache)
+
+        ctx = self.new_turn(question, session_id)
+        history = self._session_history(ctx, question, history, session_id)
+
+        closing = self.intent_router.precheck(question)
+        if closing is None:
+            q_raw = await ctx.aembed(question)
+            await self.intent_router.aensure_anchors(self.async_embedder)
+            closing = self.intent_router.confirm(q_raw)
+        if closing:
+            return self._done(ctx, PreparedTurn(None, [], self.closing_text), "closing")
+
+        history, rewrite_hist_text = self._recent_history(history)
+        if self.rewrite_mode == "speculative" and self.rewriter.wants_rewrite(question, rewrite_hist_text):
+            q_vec = await self._aspeculate(ctx, question, rewrite_hist_text)
+        else:
+            with ctx.stage("rewrite"):
+                ctx.rewritten = (
+                    await self.rewriter.amaybe_rewrite(
+                        question, rewrite_hist_text, generate=ctx.arewrite, history=history
+                    )
+                ).strip()
+            ctx.where = self.query_router.route_where(ctx.rewritten)
+            q_vec = await ctx.aembed(ctx.rewritten)
+
+        partition = self._cache_partition(ctx.where) if use_cache else None
+        with ctx.stage("answer_cache"):
+            hit = self._cache_lookup(q_vec, partition, question)
+        if hit is not None:
+            return self._done(ctx, hit, "cached")
+
+        if ctx.retrieval is None:
+            with ctx.stage("retrieve"):
+                ctx.retrieval = await self.retriever.aretrieve(ctx.rewritten, where=ctx.where, q_vec=q_vec)
+        docs, citations, dists = ctx.retrieval
+        with ctx.stage("prompt"):
+            built = self._assemble_prompt(question, history, docs, citations, dists, session_id)
+        return self._prepared(ctx, built, q_vec, partition)
+
+    def prepare_many(self, requests: Sequence[Any], pool: Optional[Executor] = None) -> List[PreparedTurn]:
+        """
+            Batch `prepare` for ChatRequest-like items (message, history, session_id).
+            LLM rewrites run on `pool` (if given), every query text is embedded
+            in one `embed_many` call, and retrieval is one multi-vector store
+            query per route (see `Retriever.retrieve_many`). Rewrites run
+            before the intent check so that one embed call covers both;
+            speculative rewrite is not used for batches.
+        """
+        n = len(requests)
+        ctxs = [self.new_turn(r.message, r.session_id) for r in requests]
+        turns: List[Optional[PreparedTurn]] = [None] * n
+        closing = [self.intent_router.precheck(r.message) for r in requests]
+        recent = [
+            self._recent_history(self._session_history(ctx, r.message, r.history, r.session_id))
+            for ctx, r in zip(ctxs, requests)
+        ]
+
+        def rewrite(i: int) -> str:
+            ctx, (history, hist_text) = ctxs[i], recent[i]
+            with ctx.stage("rewrite"):
+                try:
+                    return self.rewriter.maybe_rewrite(
+                        requests[i].message, hist_text, generate=ctx.rewrite, history=history
+                    ).strip()
+                except Exception as e:
+                    self.logger.warning(f"RAG Batch: rewrite failed, using the question as is: {e}")
+                    return requests[i].message.strip()
+
+        todo = [i for i in range(n) if not closing[i]]
+        rewritten = list(pool.map(rewrite, todo)) if pool is not None else [rewrite(i) for i in todo]
+        for i, text in zip(todo, rewritten):
+            ctxs[i].rewritten = text
+            ctxs[i].where = self.query_router.route_where(text)
+
+        # one embedding call for every distinct text in the batch
+        texts: Dict[str, None] = {}
+        for i in todo:
+            if closing[i] is None:
+                texts[requests[i].message.strip()] = None
+            texts[ctxs[i].rewritten] = None
+        t0 = time.perf_counter()
+        vecs = dict(zip(texts, self.embedder.embed_many(list(texts)))) if texts else {}
+        embed_s = time.perf_counter() - t0
+
+        pending: List[int] = []
+        for i in todo:
+            ctx, question = ctxs[i], requests[i].message
+            ctx.add_time("embed", embed_s)
+            ctx.embed_calls += 1
+            for text in {question.strip(), ctx.rewritten}:
+                if text in vecs:
+                    ctx.remember_embedding(text, vecs[text])
+            if closing[i] is None and self.intent_router.confirm(vecs[question.strip()]):
+                closing[i] = True
+                continue
+
+            with ctx.stage("answer_cache"):
+                hit = self._cache_lookup(vecs[ctx.rewritten], self._cache_partition(ctx.where), question)
+            if hit is not None:
+                turns[i] = self._done(ctx, hit, "cached")
+                continue
+            pending.append(i)
+
+        for i in range(n):
+            if closing[i]:
+                turns[i] = self._done(ctxs[i], PreparedTurn(None, [], self.closing_text), "closing")
+
+        t0 = time.perf_counter()
+        retrieved = self.retriever.retrieve_many(
+            [ctxs[i].rewritten for i in pending],
+            wheres=[ctxs[i].where for i in pending],
+            q_vecs=[vecs[ctxs[i].rewritten] for i in pending],
+        ) if pending else []
+        retrieve_s = time.perf_counter() - t0
+
+        for i, retrieval in zip(pending, retrieved):
+            ctx = ctxs[i]
+            ctx.add_time("retrieve", retrieve_s)
+            ctx.retrieval = retrieval
+            docs, citations, dists = retrieval
+            with ctx.stage("prompt"):
+                built = self._assemble_prompt(
+                    requests[i].message, recent[i][0], docs, citations, dists, requests[i].session_id
+                )
+            turns[i] = self._prepared(ctx, built, vecs[ctx.rewritten], self._cache_partition(ctx.where))
+        return turns
+
+    def _speculate(self, ctx: TurnContext, question: str, rewrite_hist_text: str) -> List[float]:
+        """
+            Speculative rewrite: retrieve for the original question while the
+            LLM rewrite runs in a worker thread, then keep whichever retrieval
+            wins (see `_prefer_rewrite`). Sets ctx.rewritten/where/retrieval
+            and returns the chosen query vector.
+
+            A worker thread cannot be interrupted: on early accept a rewrite
+            that has not reached the LLM yet is skipped, but one already
+            generating runs to completion and its result is dropped.
+        """
+        dropped = threading.Event()
+
+        def rewrite(prompt: str) -> str:
+            if dropped.is_set():
+                raise CancelledError()
+            return ctx.rewrite(prompt)
+
+        pending = self._rewrite_pool.submit(
+            self.rewriter.maybe_rewrite, question, rewrite_hist_text, generate=rewrite
         )
-        retrieve_question = self.rewriter.maybe_rewrite(question, rewrite_hist_text)
-        
-        where = self.query_router.route_where(retrieve_question)
-        docs, citations, dists = self.retriever.retrieve(retrieve_question, where=where)
+
+        original = question.strip()
+        ctx.rewritten = original
+        ctx.where = self.query_router.route_where(original)
+        q_vec = ctx.embed(original)
+        with ctx.stage("retrieve"):
+            ctx.retrieval = self.retriever.retrieve(original, where=ctx.where, q_vec=q_vec)
+
+        best = self._best_distance(ctx.retrieval[2])
+        if self._early_accept(best):
+            dropped.set()
+            pending.cancel()
+            ctx.speculation = "early_accept"
+            return q_vec
+
+        # only the time spent blocked on the rewrite is on the critical path
+        with ctx.stage("rewrite"):
+            rewritten = pending.result().strip()
+        if not self._adds_terms(original, rewritten):
+            ctx.speculation = "no_new_terms"
+            return q_vec
+
+        r_where = self.query_router.route_where(rewritten)
+        r_vec = ctx.embed(rewritten)
+        with ctx.stage("retrieve"):
+            r_retrieval = self.retriever.retrieve(rewritten, where=r_where, q_vec=r_vec)
+        if not self._prefer_rewrite(best, self._best_distance(r_retrieval[2])):
+            ctx.speculation = "original"
+            return q_vec
+
+        ctx.speculation = "rewrite"
+        ctx.rewritten, ctx.where, ctx.retrieval = rewritten, r_where, r_retrieval
+        return r_vec
+
+    async def _aspeculate(self, ctx: TurnContext, question: str, rewrite_hist_text: str) -> List[float]:
+        """
+            Async `_speculate`: the rewrite is a task that is cancelled on early accept.
+        """
+        pending = asyncio.create_task(
+            self.rewriter.amaybe_rewrite(question, rewrite_hist_text, generate=ctx.arewrite)
+        )
+        try:
+            original = question.strip()
+            ctx.rewritten = original
+            ctx.where = self.query_router.route_where(original)
+            q_vec = await ctx.aembed(original)
+            with ctx.stage("retrieve"):
+                ctx.retrieval = await self.retriever.aretrieve(original, where=ctx.where, q_vec=q_vec)
+
+            best = self._best_distance(ctx.retrieval[2])
+            if self._early_accept(best):
+                ctx.speculation = "early_accept"
+                return q_vec
+
+            with ctx.stage("rewrite"):
+                rewritten = (await pending).strip()
+        finally:
+            if not pending.done():
+                pending.cancel()
+
+        if not self._adds_terms(original, rewritten):
+            ctx.speculation = "no_new_terms"
+            return q_vec
+
+        r_where = self.query_router.route_where(rewritten)
+        r_vec = await ctx.aembed(rewritten)
+        with ctx.stage("retrieve"):
+            r_retrieval = await self.retriever.aretrieve(rewritten, where=r_where, q_vec=r_vec)
+        if not self._prefer_rewrite(best, self._best_distance(r_retrieval[2])):
+            ctx.speculation = "original"
+            return q_vec
+
+        ctx.speculation = "rewrite"
+        ctx.rewritten, ctx.where, ctx.retrieval = rewritten, r_where, r_retrieval
+        return r_vec
+
+    def _early_accept(self, best: Optional[float]) -> bool:
+        return self.speculative_early_accept and best is not None and best <= self.good_threshold
+
+    @staticmethod
+    def _adds_terms(original: str, rewritten: str) -> bool:
+        # a rewrite that only reorders / drops words cannot retrieve anything new
+        return bool(set(tokenize(rewritten)) - set(tokenize(original)))
+
+    def _prefer_rewrite(self, best_original: Optional[float], best_rewrite: Optional[float]) -> bool:
+        if best_rewrite is None:
+            return False
+        if best_original is None:
+            return True
+        return best_rewrite + self.speculative_margin < best_original
+
+    @staticmethod
+    def _best_distance(dists: List[float]) -> Optional[float]:
+        # hybrid results are in fused order, so take the closest rather than the first
+        return min((d for d in dists if d is not None), default=None)
+
+    def generate(self, turn: PreparedTurn) -> str:
+        try:
+            with turn.ctx.stage("generate"):
+                return turn.ctx.generate(turn.prompt)
+        except LLMBusy:
+            self.busy(turn)
+            raise
+
+    async def agenerate(self, turn: PreparedTurn) -> str:
+        try:
+            with turn.ctx.stage("generate"):
+                return await turn.ctx.agenerate(turn.prompt)
+        except LLMBusy:
+            self.busy(turn)
+            raise
+
+    def agenerate_stream(
+        self, turn: PreparedTurn, *, max_tokens: Optional[int] = None, budget_s: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """
+            Answer tokens for a prepared turn (async provider, or the sync one in a thread).
+            The provider stops after `max_tokens` / `budget_s` (capped by its config);
+            closing the iterator closes the upstream stream.
+        """
+        return turn.ctx.agenerate_stream(turn.prompt, max_tokens=max_tokens, budget_s=budget_s)
+
+    def busy(self, turn: PreparedTurn) -> None:
+        """Record a turn refused by LLM admission control (`LLMBusy`)."""
+        self._done(turn.ctx, turn, "busy")
+
+    def abort(self, turn: PreparedTurn, reason: str) -> None:
+        """Record a generation abandoned before it finished (e.g. reason="client_disconnect")."""
+        metrics.GENERATIONS_ABORTED.inc(reason=reason)
+        self._done(turn.ctx, turn, "aborted")
+
+    def finish(self, turn: PreparedTurn, answer: str) -> List[dict]:
+        """
+            Post-process a generated answer: returns the citations to show
+            (none for a no-answer) and stores good answers in the answer cache.
+            Answers cut short by the stream limits are shown but never cached.
+        """
+        if self._is_no_answer(answer):
+            self._done(turn.ctx, turn, "no_answer")
+            return []
+        if turn.ctx is not None and turn.ctx.stopped:
+            self._done(turn.ctx, turn, "truncated")
+            return turn.citations
+        if self.answer_cache is not None and turn.cache_partition is not None:
+            self.answer_cache.put(turn.cache_vec, turn.cache_partition, answer, turn.citations)
+        self._done(turn.ctx, turn, "answered")
+        return turn.citations
+
+    def _done(self, ctx: Optional[TurnContext], turn: PreparedTurn, outcome: str) -> PreparedTurn:
+        turn.ctx = ctx
+        if ctx is not None:
+            ctx.outcome = outcome
+            self.logger.info(f"RAG Turn: {ctx.summary()}")
+            metrics.TURNS.inc(outcome=outcome)
+            metrics.TURN_SECONDS.observe(ctx.elapsed(), outcome=outcome)
+            for stage, secs in (ctx.timings or {}).items():
+                metrics.STAGE_SECONDS.observe(secs, stage=stage)
+        return turn
+
+    def _cache_partition(self, where: Optional[Dict[str, Any]]) -> Optional[str]:
+        if self.answer_cache is None:
+            return None
+        return AnswerCache.partition_key(where, self.template_version)
+
+    def _cache_lookup(self, q_vec: List[float], partition: Optional[str], question: str) -> Optional[PreparedTurn]:
+        if partition is None:
+            return None
+        hit = self.answer_cache.get(q_vec, partition)
+        if hit is None:
+            return None
+        self.logger.info(f"RAG Chat: answer cache hit similarity={hit.similarity:.3f} question='{question}' stats={self.answer_cache.stats()}")
+        return PreparedTurn(None, hit.citations, cached_answer=hit.answer)
+
+    def _prepared(
+        self,
+        ctx: TurnContext,
+        built: Tuple[Optional[str], List[dict], Optional[str]],
+        q_vec: List[float],
+        partition: Optional[str],
+    ) -> PreparedTurn:
+        prompt, citations, deny_text = built
+        if prompt is None:
+            # denies are cheap to recompute and never cached
+            return self._done(ctx, PreparedTurn(None, citations, deny_text), "deny")
+        return PreparedTurn(prompt, citations, deny_text, cache_vec=q_vec, cache_partition=partition, ctx=ctx)
+
+    def _assemble_prompt(
+        self,
+        question: str,
+        history: List[ChatTurn],
+        docs: List[str],
+        citations: List[Any],
+        dists: List[float],
+        session_id: Optional[str],
+    ) -> Tuple[Optional[str], List[dict], Optional[str]]:
         
         if not docs:
             return None, [], self.no_answer_text
 
-        best = dists[0] if dists else None
+        best = self._best_distance(dists)
         if best is None or best > self.weak_threshold:
             return None, [], self.no_answer_text
         
@@ -232,7 +799,7 @@ class RAGService:
             require_quotes_in_weak_mode=self.require_quotes_in_weak_mode
         )
         if self._is_no_answer(prompt):
-            print("*"*80)
+            self.logger.debug(f"RAG Chat: prompt contains the no-answer text; denying question='{question}'")
             return None, [], self.no_answer_text
             
         cite_dicts = self._to_cite_dicts(citations)
@@ -261,52 +828,158 @@ class RAGService:
     def chat(self, question: str, history: Optional[List[ChatTurn]] = None, session_id: Optional[str] = None):
         """
         Full RAG pipeline: retrieve documents and generate an answer.
+        Same pipeline as the streaming route (prepare + generate + finish).
 
         Returns:
             - Generated answer string
             - List of corresponding citations
         """
-        history = self._user_only_history(history)
-        history = history[-4:] or []
+        answer, citations, _ = self.answer(question, history=history, session_id=session_id)
+        return answer, citations
 
-        print("HISTORY : ", history)
-        rewrite_hist_text = self.prompt_builder.format_history(
-            history or [],
-            self.rewrite_max_history_turns
-        )
-        retrieve_question = self.rewriter.maybe_rewrite(question, rewrite_hist_text)
-        
-        where = self.query_router.route_where(retrieve_question)
-        docs, citations, dists = self.retriever.retrieve(retrieve_question, where=where)
-        
-        if not docs:
-            return self.no_answer_text, []
-        
-        best = dists[0] if dists else None
+    def answer(
+        self,
+        question: str,
+        history: Optional[List[ChatTurn]] = None,
+        session_id: Optional[str] = None,
+    ) -> Tuple[str, List[dict], PreparedTurn]:
+        """
+        Like `chat`, but also returns the PreparedTurn (its ctx carries the stage timings).
+        """
+        turn = self.prepare(question, history=history, session_id=session_id)
+        done = self._without_llm(turn)
+        if done is not None:
+            return done[0], done[1], turn
 
-        if best is None or best > self.weak_threshold:
-            return self.no_answer_text, []
-        
-        weak = best > self.good_threshold
+        answer = self.generate(turn)
+        return answer, self.finish(turn, answer), turn
 
+    def answer_batch(self, requests: Sequence[Any], max_concurrency: Optional[int] = None) -> Iterator[BatchAnswer]:
+        """
+        Answer many ChatRequest-like items. Preparation is batched (see
+        `prepare_many`); generations run on at most `max_concurrency`
+        threads (capped by rag.batch.max_concurrency) and results are
+        yielded as each one completes.
+        """
+        pool = ThreadPoolExecutor(max_workers=self._batch_workers(max_concurrency), thread_name_prefix="batch")
         try:
-            self.logger.info(f"RAG Chat: best_distance={best:.3f} weak={weak} question='{question}' session_id='{session_id}'")
-        except Exception:
-            pass
-        print("DEBUG: RAGService.chat best distance:", dists)
+            turns = self.prepare_many(requests, pool)
+            futures = {}
+            for i, turn in enumerate(turns):
+                done = self._without_llm(turn)
+                if done is not None:
+                    yield BatchAnswer(i, done[0], done[1], turn)
+                else:
+                    futures[pool.submit(self._generate_batch, turn)] = i
+            for fut in as_completed(futures):
+                i = futures[fut]
+                try:
+                    answer = fut.result()
+                except Exception as e:
+                    yield self._batch_error(i, turns[i], e)
+                    continue
+                yield BatchAnswer(i, answer, self.finish(turns[i], answer), turns[i])
+        finally:
+            # a consumer that stops early (GeneratorExit) must not wait for queued generations
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _batch_workers(self, max_concurrency: Optional[int]) -> int:
+        # a request may lower the configured concurrency, never raise it
+        return max(1, min(max_concurrency or self.batch_max_concurrency, self.batch_max_concurrency))
+
+    async def achat(self, question: str, history: Optional[List[ChatTurn]] = None, session_id: Optional[str] = None):
+        """
+        Async chat; see `chat`.
+        """
+        if self.async_llm is None:
+            return await asyncio.to_thread(self.chat, question, history, session_id)
 
-        history_text = self.prompt_builder.format_history(history or [], self.max_history)
+        answer, citations, _ = await self.aanswer(question, history=history, session_id=session_id)
+        return answer, citations
 
-        context_text = self.context_packer.pack(docs)
+    async def aanswer(
+        self,
+        question: str,
+        history: Optional[List[ChatTurn]] = None,
+        session_id: Optional[str] = None,
+    ) -> Tuple[str, List[dict], PreparedTurn]:
+        """
+        Like `achat`, but also returns the PreparedTurn (its ctx carries the stage timings).
+        """
+        turn = await self.aprepare(question, history=history, session_id=session_id)
+        done = self._without_llm(turn)
+        if done is not None:
+            return done[0], done[1], turn
 
-        prompt = self.prompt_builder.build(
-            history=history_text,
-            context=context_text,
-            question=question,
-            weak=weak,
-            require_quotes_in_weak_mode=self.require_quotes_in_weak_mode
-        )
-        
-        answer = self.llm.generate(prompt)
+        answer = await self.agenerate(turn)
+        return answer, self.finish(turn, answer), turn
 
-        return answer, citations
\ No newline at end of file
+    async def aanswer_batch(
+        self, requests: Sequence[Any], max_concurrency: Optional[int] = None
+    ) -> AsyncIterator[BatchAnswer]:
+        """
+        Async `answer_batch`: batched preparation runs in a worker thread,
+        generations go through the async provider behind a semaphore.
+        """
+        workers = self._batch_workers(max_concurrency)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+            turns = await asyncio.to_thread(self.prepare_many, requests, pool)
+
+        gate = asyncio.Semaphore(workers)
+
+        async def run(i: int, turn: PreparedTurn) -> BatchAnswer:
+            async with gate:
+                try:
+                    with llm_priority(BATCH):
+                        answer = await self.agenerate(turn)
+                except Exception as e:
+                    return self._batch_error(i, turn, e)
+            return BatchAnswer(i, answer, self.finish(turn, answer), turn)
+
+        tasks = []
+        for i, turn in enumerate(turns):
+            done = self._without_llm(turn)
+            if done is not None:
+                yield BatchAnswer(i, done[0], done[1], turn)
+            else:
+                tasks.append(asyncio.create_task(run(i, turn)))
+        try:
+            for fut in asyncio.as_completed(tasks):
+                yield await fut
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _without_llm(self, turn: PreparedTurn) -> Optional[Tuple[str, List[dict]]]:
+        """(answer, citations) for turns that need no generation: cache hits and denies."""
+        if turn.cached:
+            return turn.cached_answer, turn.citations
+        if turn.prompt is None:
+            return turn.deny_text or self.no_answer_text, []
+        return None
+
+    def _generate_batch(self, turn: PreparedTurn) -> str:
+        # pool threads do not inherit the caller's context, so set the priority here
+        with llm_priority(BATCH):
+            return self.generate(turn)
+
+    def _batch_error(self, index: int, turn: PreparedTurn, error: Exception) -> BatchAnswer:
+        self.logger.error(f"RAG Batch: generation failed for item {index}: {error}")
+        if not isinstance(error, LLMBusy):
+            # busy turns are already recorded by generate()
+            self._done(turn.ctx, turn, "error")
+        return BatchAnswer(index, turn=turn, error=str(error))
+
+    async def aclose(self) -> None:
+        """Close pooled connections held by the providers."""
+        if self._rewrite_pool is not None:
+            self._rewrite_pool.shutdown(wait=False, cancel_futures=True)
+        if self.rewriter.cache is not None:
+            self.rewriter.cache.close()
+        if self.sessions is not None:
+            self.sessions.close()
+        self.embedder.close()
+        self.llm.close()
+        for provider in (self.async_embedder, self.async_llm):
+            if provider is not None:
+                await provider.aclose()
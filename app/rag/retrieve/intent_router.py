@@ -1,16 +1,13 @@
-import math
+import hashlib
+import json
+import os
 import re
-from dataclasses import dataclass
-from typing import Any, List
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, List, Optional
 
-
-def _cosine(a: List[float], b: List[float]) -> float:
-    dot = sum(x * y for x, y in zip(a, b))
-    na = math.sqrt(sum(x * x for x in a))
-    nb = math.sqrt(sum(y * y for y in b))
-    if na == 0 or nb == 0:
-        return 0.0
-    return dot / (na * nb)
+import numpy as np
 
 
 # If the user message looks like a real question, NEVER treat it as "closing"
@@ -25,41 +22,72 @@ CLOSE_PHRASES = re.compile(
     re.IGNORECASE
 )
 
+# Better anchors (multi-example) — reduces random misfires
+Q_TEXTS = (
+    "User asks a question about the documents.",
+    "User wants an answer or explanation.",
+    "User asks for clarification or a follow-up."
+)
+CLOSE_TEXTS = (
+    "User says thank you.",
+    "User says goodbye.",
+    "User is done and ends the conversation."
+)
+
 
-def _avg(vectors: List[List[float]]) -> List[float]:
-    n = len(vectors)
-    if n == 0:
-        return []
-    dim = len(vectors[0])
-    return [sum(v[i] for v in vectors) / n for i in range(dim)]
+def _unit(v) -> np.ndarray:
+    v = np.asarray(v, dtype=np.float32)
+    n = float(np.linalg.norm(v))
+    return v / n if n else v
 
 
 @dataclass
 class IntentRouter:
+    """
+    Closing-intent detection: regex guards first, then (only when the
+    rules are undecided) embedding similarity against two anchor vectors.
+
+    Anchors are built lazily on first use and persisted at `anchor_path`,
+    keyed by embedder model name + anchor-text hash, so restarts do not
+    re-embed them.
+    """
     embedder: Any
-    q_anchor: List[float]
-    close_anchor: List[float]
+    anchor_path: Optional[Path] = None
+    # rows: [question anchor, closing anchor], unit length
+    anchors: Optional[np.ndarray] = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
 
     @classmethod
-    def build(cls, embedder: Any) -> "IntentRouter":
-        # Better anchors (multi-example) — reduces random misfires
-        q_texts = [
-            "User asks a question about the documents.",
-            "User wants an answer or explanation.",
-            "User asks for clarification or a follow-up."
-        ]
-        close_texts = [
-            "User says thank you.",
-            "User says goodbye.",
-            "User is done and ends the conversation."
-        ]
-
-        q_anchor = _avg([embedder.embed_one(t) for t in q_texts])
-        close_anchor = _avg([embedder.embed_one(t) for t in close_texts])
-
-        return cls(embedder=embedder, q_anchor=q_anchor, close_anchor=close_anchor)
-
-    def is_closing(self, text: str) -> bool:
+    def build(cls, embedder: Any, anchor_path: Optional[Path] = None) -> "IntentRouter":
+        # no embedding calls here; see _ensure_anchors
+        return cls(embedder=embedder, anchor_path=anchor_path)
+
+    def is_closing(self, text: str, *, q_vec: Optional[List[float]] = None) -> bool:
+        """`q_vec` (embedding of the stripped text) skips the embed call when given."""
+        decided = self.precheck(text)
+        if decided is not None:
+            return decided
+
+        # 3) Optional: embedding confirmation with threshold + margin
+        if q_vec is None:
+            q_vec = self.embedder.embed_one(text.strip())
+        return self.confirm(q_vec)
+
+    async def ais_closing(self, text: str, *, embedder, q_vec: Optional[List[float]] = None) -> bool:
+        """
+            Same as is_closing, embedding with an async embedder.
+        """
+        decided = self.precheck(text)
+        if decided is not None:
+            return decided
+
+        if q_vec is None:
+            q_vec = await embedder.embed_one(text.strip())
+        await self.aensure_anchors(embedder)
+        return self.confirm(q_vec)
+
+    def precheck(self, text: str) -> Optional[bool]:
+        """Rule-based decision; None means the embedding check is needed."""
         t = (text or "").strip()
         if not t:
             return True
@@ -73,10 +101,65 @@ class IntentRouter:
         if not CLOSE_PHRASES.search(t):
             return False
 
-        # 3) Optional: embedding confirmation with threshold + margin
-        v = self.embedder.embed_one(t)
-        sim_close = _cosine(v, self.close_anchor)
-        sim_q = _cosine(v, self.q_anchor)
+        return None
+
+    def confirm(self, v: List[float]) -> bool:
+        """Embedding check for text the rules could not decide."""
+        self._ensure_anchors()
+        sim_q, sim_close = (self.anchors @ _unit(v)).tolist()
 
         # Require BOTH a minimum similarity and a margin
         return (sim_close > 0.35) and ((sim_close - sim_q) > 0.05)
+
+    # ---- anchors ----
+
+    def _ensure_anchors(self) -> None:
+        if self.anchors is not None:
+            return
+        with self._lock:
+            if self.anchors is None and not self._load_anchors():
+                self._set_anchors(self.embedder.embed_many(list(Q_TEXTS + CLOSE_TEXTS)))
+
+    async def aensure_anchors(self, embedder) -> None:
+        if self.anchors is not None:
+            return
+        if not self._load_anchors():
+            vecs = await embedder.embed_many(list(Q_TEXTS + CLOSE_TEXTS))
+            with self._lock:
+                if self.anchors is None:
+                    self._set_anchors(vecs)
+
+    def _key(self) -> str:
+        texts = "\n".join(Q_TEXTS) + "\n--\n" + "\n".join(CLOSE_TEXTS)
+        model = getattr(self.embedder, "model_name", type(self.embedder).__name__)
+        return f"{model}:{hashlib.sha256(texts.encode('utf-8')).hexdigest()[:16]}"
+
+    def _read_file(self) -> dict:
+        try:
+            return json.loads(self.anchor_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _load_anchors(self) -> bool:
+        if self.anchor_path is None:
+            return False
+        entry = self._read_file().get(self._key())
+        if not entry:
+            return False
+        self.anchors = np.asarray(entry, dtype=np.float32)
+        return True
+
+    def _set_anchors(self, vecs: List[List[float]]) -> None:
+        vecs = np.asarray(vecs, dtype=np.float32)
+        n_q = len(Q_TEXTS)
+        anchors = np.stack([_unit(vecs[:n_q].mean(axis=0)), _unit(vecs[n_q:].mean(axis=0))])
+
+        if self.anchor_path is not None:
+            data = self._read_file()
+            data[self._key()] = anchors.tolist()
+            self.anchor_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.anchor_path.with_suffix(self.anchor_path.suffix + ".tmp")
+            tmp.write_text(json.dumps(data), encoding="utf-8")
+            os.replace(tmp, self.anchor_path)
+
+        self.anchors = anchors
@@ -1,8 +1,9 @@
-from typing import List
-from app.rag.policy.rewrite_rules import should_rewrite
+from typing import Awaitable, Callable, List, Literal, Optional
+from app.rag.policy.rewrite_rules import heuristic_rewrite, should_rewrite
 from dataclasses import dataclass
 from app.api.schemas import ChatTurn
 from app.rag.llm.llm_base import LLM
+from app.rag.cache.rewrite_cache import RewriteCache
 import re
 
 @dataclass(frozen=True)
@@ -11,33 +12,127 @@ class QueryRewriterConfig:
     max_history_turns: int
     trigger_max_words: int
     max_rewrite_chars: int = 300
+    # llm: rewrite with the LLM before retrieval
+    # speculative: LLM rewrite runs concurrently with retrieval (see RAGService)
+    # heuristic: substitute pronouns from the previous user turn, no LLM call
+    mode: Literal["llm", "speculative", "heuristic"] = "llm"
 
 
 class QueryRewriter:
     """
         Decide whether to rewrite the question for clarity, and do so if needed.
-        Rewrite the question using the LLM to add context from history.
+        Rewrite the question using the LLM to add context from history
+        (or, in heuristic mode, with pronoun substitution from the previous turn).
+        LLM rewrites are memoized in `cache` when one is given.
 
     """
 
-    def __init__ (self, *, llm, rewrite_template:str, cfg: QueryRewriterConfig) -> None:
+    def __init__ (
+        self,
+        *,
+        llm,
+        rewrite_template:str,
+        cfg: QueryRewriterConfig,
+        cache: Optional[RewriteCache] = None,
+        model_name: str = "",
+    ) -> None:
         self.llm = llm
         self.rewrite_template = (rewrite_template or "").strip()
         self.cfg = cfg
+        self.cache = cache
+        self.model_name = model_name
 
-    def maybe_rewrite(self, question: str, history_text: str) ->  str:
+    def wants_rewrite(self, question: str, history_text: str) -> bool:
+        return self._rewrite_prompt(question, history_text) is not None
+
+    def heuristic_rewrite(self, question: str, history: Optional[List[ChatTurn]]) -> str:
+        """Non-LLM rewrite against the previous user turn (the current question may be the last turn)."""
+        previous = [
+            t.text for t in (history or [])
+            if t.role == "user" and t.text.strip() != question.strip()
+        ]
+        if not previous:
+            return question
+        return heuristic_rewrite(question, previous[-1]) or question
+
+    def maybe_rewrite(
+        self,
+        question: str,
+        history_text: str,
+        *,
+        generate: Optional[Callable[[str], str]] = None,
+        history: Optional[List[ChatTurn]] = None,
+    ) ->  str:
+        """
+            `generate` overrides self.llm.generate (e.g. a per-turn counting wrapper).
+            `history` is needed by heuristic mode.
+        """
+        prompt = self._rewrite_prompt(question, history_text)
+        if prompt is None:
+            return question
+        if self.cfg.mode == "heuristic":
+            return self.heuristic_rewrite(question, history)
+
+        key = self._cache_key(question, history_text)
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            return cached
+
+        generate = generate or self.llm.generate
+        rewritten = self._clean(generate(prompt), question)
+        if key:
+            self.cache.put(key, rewritten)
+        return rewritten
+
+    async def amaybe_rewrite(
+        self,
+        question: str,
+        history_text: str,
+        *,
+        llm=None,
+        generate: Optional[Callable[[str], Awaitable[str]]] = None,
+        history: Optional[List[ChatTurn]] = None,
+    ) -> str:
+        """
+            Same as maybe_rewrite, using an async LLM (or an async `generate` callable).
+        """
+        prompt = self._rewrite_prompt(question, history_text)
+        if prompt is None:
+            return question
+        if self.cfg.mode == "heuristic":
+            return self.heuristic_rewrite(question, history)
+
+        key = self._cache_key(question, history_text)
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            return cached
+
+        generate = generate or llm.generate
+        rewritten = self._clean(await generate(prompt), question)
+        if key:
+            self.cache.put(key, rewritten)
+        return rewritten
+
+    def _cache_key(self, question: str, history_text: str) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return RewriteCache.key(history_text, question, self.rewrite_template, self.model_name)
+
+    def _rewrite_prompt(self, question: str, history_text: str) -> Optional[str]:
         # check for reasons to rewrite
         if not self.cfg.enabled:
-            return question
+            return None
         
         if not should_rewrite(question, self.cfg.trigger_max_words):
-            return question
+            return None
         
         if not (history_text or "").strip():
-            return question
+            return None
         
-        prompt = self.rewrite_template.format(history=history_text, question=question)
-        rewritten = (self.llm.generate(prompt) or "").strip()
+        return self.rewrite_template.format(history=history_text, question=question)
+
+    def _clean(self, rewritten: str, question: str) -> str:
+        rewritten = (rewritten or "").strip()
 
         # safety fallback: if llm fails to rewrite or return empty/junk/multi-line, take either first like or fallback
         rewritten = (rewritten.splitlines()[0].strip() if rewritten else " ").strip()
@@ -49,4 +144,3 @@ class QueryRewriter:
             return question 
         
         return rewritten
-
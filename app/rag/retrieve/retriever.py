@@ -1,13 +1,32 @@
 from __future__ import annotations
+import asyncio
+import json
 from dataclasses import dataclass
-from typing import List, Optional, Tuple, Dict, Any
+from typing import List, Literal, Optional, Tuple, Dict, Any
+
+import numpy as np
 
 from app.api.schemas import Citation
+from app.rag.store.vectordb_base import matches_where
 
 @dataclass(frozen=True)
 class RetrieverConfig:
     top_k: int
     retrieval_pool_k: int
+    # one chunk per (source, page) before filling up with the rest
+    dedup_pages: bool = True
+
+    # dedup: closest-first with the (source, page) dedup above
+    # mmr: maximal marginal relevance over the pool's embeddings;
+    #      mmr_lambda = 1 is pure relevance, lower values favour diversity
+    selection: Literal["dedup", "mmr"] = "dedup"
+    mmr_lambda: float = 0.7
+
+    # hybrid mode: fuse BM25 hits from the lexical index with the vector pool
+    hybrid: bool = False
+    lexical_pool_k: int = 25
+    rrf_k: int = 60
+    identifier_distance_cap: Optional[float] = None
 
 
 class Retriever:
@@ -21,23 +40,165 @@ class Retriever:
 
     """
 
-    def __init__(self, *, embedder, store:Any, cfg: RetrieverConfig)-> None:
+    def __init__(self, *, embedder, store:Any, cfg: RetrieverConfig, async_embedder=None, lexical=None)-> None:
         self.embedder=embedder
+        self.async_embedder = async_embedder
         self.store= store
+        self.lexical = lexical
         self.cfg = cfg or RetrieverConfig()
 
+    @property
+    def hybrid(self) -> bool:
+        return self.cfg.hybrid and self.lexical is not None
+
     
-    def retrieve(self, question:str, *, where: Optional[Dict[str, Any]] = None) -> Tuple[List[str], List[Citation], List[float]]:
+    def retrieve(
+        self,
+        question:str,
+        *,
+        where: Optional[Dict[str, Any]] = None,
+        q_vec: Optional[List[float]] = None,
+    ) -> Tuple[List[str], List[Citation], List[float]]:
+        """`q_vec` skips embedding when the caller already has the question's vector."""
+        if q_vec is None:
+            q_vec = self.embedder.embed_one(question)
+        return self._select(self._search(question, q_vec, where), ranked=self.hybrid)
+
+    async def aretrieve(
+        self,
+        question: str,
+        *,
+        where: Optional[Dict[str, Any]] = None,
+        q_vec: Optional[List[float]] = None,
+    ) -> Tuple[List[str], List[Citation], List[float]]:
+        """
+            Async retrieve: embeds with the async embedder (if any) and runs the
+            blocking store query in a worker thread.
+        """
+        if q_vec is None:
+            if self.async_embedder is not None:
+                q_vec = await self.async_embedder.embed_one(question)
+            else:
+                q_vec = await asyncio.to_thread(self.embedder.embed_one, question)
+        results = await asyncio.to_thread(self._search, question, q_vec, where)
+        return self._select(results, ranked=self.hybrid)
 
-        q_vec = self.embedder.embed_one(question)
+    def retrieve_many(
+        self,
+        questions: List[str],
+        *,
+        wheres: List[Optional[Dict[str, Any]]],
+        q_vecs: List[List[float]],
+    ) -> List[Tuple[List[str], List[Citation], List[float]]]:
+        """
+            Batch retrieve: one multi-vector store query per distinct `where`
+            instead of one query per question. Results keep the input order.
+        """
+        groups: Dict[str, List[int]] = {}
+        for i, where in enumerate(wheres):
+            groups.setdefault(json.dumps(where, sort_keys=True), []).append(i)
+
+        out: List[Any] = [None] * len(questions)
+        for rows in groups.values():
+            where = wheres[rows[0]]
+            results = self._query([q_vecs[i] for i in rows], where)
+            for j, i in enumerate(rows):
+                single = self._row(results, j)
+                if self.hybrid:
+                    single = self._fuse(questions[i], q_vecs[i], single, where)
+                out[i] = self._select(single, ranked=self.hybrid)
+        return out
+
+    def _search(self, question: str, q_vec: List[float], where: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        results = self._query([q_vec], where)
+        if self.hybrid:
+            results = self._fuse(question, q_vec, results, where)
+        return results
+
+    def _query(self, q_vecs: List[List[float]], where: Optional[Dict[str, Any]]) -> Dict[str, Any]:
         pool_k = max(self.cfg.retrieval_pool_k, self.cfg.top_k)
 
-        results = self.store.query(
-            query_embeddings=[q_vec], 
+        return self.store.query(
+            query_embeddings=q_vecs, 
             n_results=pool_k, 
             where=where,
+            include_embeddings=self.cfg.selection == "mmr",
         )
 
+    @staticmethod
+    def _row(results: Dict[str, Any], j: int) -> Dict[str, Any]:
+        """Single-query view (still one inner list) of a multi-query result."""
+        out: Dict[str, Any] = {}
+        for key in ("ids", "documents", "metadatas", "distances", "embeddings"):
+            col = results.get(key)
+            if col is not None:
+                out[key] = [col[j]]
+        return out
+
+    def _fuse(
+        self,
+        question: str,
+        q_vec: List[float],
+        results: Dict[str, Any],
+        where: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """
+        Reciprocal rank fusion of the vector pool and BM25 hits.
+        Returns Chroma-shaped results in fused order. Lexical-only hits are
+        fetched from the store and get their real cosine distance; hits that
+        contain an identifier from the question have their distance capped.
+        """
+        hits = self.lexical.search(question, k=self.cfg.lexical_pool_k)
+        if not hits:
+            return results
+
+        ids = results.get("ids", [[]])[0]
+        docs = results.get("documents", [[]])[0]
+        metas = results.get("metadatas", [[]])[0]
+        dists = results.get("distances", [[]])[0]
+        embs = results.get("embeddings")
+        embs = embs[0] if embs is not None else [None] * len(ids)
+        pool: Dict[str, Tuple[str, Dict[str, Any], float, Any]] = {
+            cid: (doc, meta, dist, emb) for cid, doc, meta, dist, emb in zip(ids, docs, metas, dists, embs)
+        }
+
+        missing = [h.id for h in hits if h.id not in pool]
+        if missing:
+            got = self.store.get(ids=missing, include_embeddings=True)
+            q = np.asarray(q_vec, dtype=np.float32)
+            q = q / (np.linalg.norm(q) or 1.0)
+            for cid, doc, meta, emb in zip(got["ids"], got["documents"], got["metadatas"], got["embeddings"]):
+                if where and not matches_where(meta, where):
+                    continue
+                v = np.asarray(emb, dtype=np.float32)
+                pool[cid] = (doc, meta, 1.0 - float(q @ v) / (float(np.linalg.norm(v)) or 1.0), v)
+
+        k = self.cfg.rrf_k
+        scores: Dict[str, float] = {}
+        for rank, cid in enumerate(ids):
+            scores[cid] = 1.0 / (k + rank + 1)
+        for rank, hit in enumerate(hits):
+            if hit.id in pool:
+                scores[hit.id] = scores.get(hit.id, 0.0) + 1.0 / (k + rank + 1)
+
+        cap = self.cfg.identifier_distance_cap
+        capped = {h.id for h in hits if h.identifier_match} if cap is not None else set()
+
+        fused = sorted(scores, key=lambda cid: scores[cid], reverse=True)
+        out: Dict[str, Any] = {"ids": [fused], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+        if self.cfg.selection == "mmr":
+            out["embeddings"] = [[pool[cid][3] for cid in fused]]
+        for cid in fused:
+            doc, meta, dist, _ = pool[cid]
+            if cid in capped and dist is not None:
+                dist = min(dist, cap)
+            out["documents"][0].append(doc)
+            out["metadatas"][0].append(meta)
+            out["distances"][0].append(dist)
+        return out
+
+    def _select(self, results: Dict[str, Any], *, ranked: bool = False) -> Tuple[List[str], List[Citation], List[float]]:
+
         # print("DEBUG: RAGService.retrieve results:", results.keys())
         # print("DEBUG: RAGService.retrieve results[ids]:", results.get("ids", [[]]))
         # print("DEBUG: RAGService.retrieve results[distances]:", results.get("distances", [[]])[0][:3])
@@ -51,36 +212,13 @@ class Retriever:
         if not ids:
             return [],[],[]
 
-        # rerank locally by distanct (smaller distance = more similar)
         items = list(zip(ids, docs, metas, dists))
-        items.sort(key=lambda x: x[3] if x[3] is not None else float("inf"))
-
-        top_k = self.cfg.top_k
-        picked = []
-        seen = set()
-
-        for cid, doc, meta, dist in items:
-            source = str((meta or {}).get("source", "unknown"))
-            page = (meta or {}).get("page", None)
-            key = (source, page)
-
-            if key in seen:
-                continue
-            
-            picked.append((cid, doc, meta, dist))
-            seen.add(key)
+        embs = results.get("embeddings")
+        if self.cfg.selection == "mmr" and embs is not None and len(embs[0]) == len(items):
+            picked = [items[i] for i in self._mmr(embs[0], dists)]
+        else:
+            picked = self._dedup(items, ranked=ranked)
 
-            if len(picked) >= top_k:
-                break
-        
-        if len(picked) < top_k:
-            for cid, doc, meta, dist in items:
-                if (cid, doc, meta, dist) in picked:
-                    continue
-                picked.append((cid, doc, meta, dist))
-                if len(picked) >= top_k:
-                    break
-        
         # overwrite arrays with the selected set
         ids = [p[0] for p in picked] 
         docs = [p[1] for p in picked] 
@@ -115,4 +253,74 @@ class Retriever:
                 )
             )
 
-        return docs, citations, dists
\ No newline at end of file
+        return docs, citations, dists
+
+    def _dedup(self, items: List[Tuple[Any, ...]], *, ranked: bool) -> List[Tuple[Any, ...]]:
+        # rerank locally by distanct (smaller distance = more similar);
+        # fused (hybrid) results are already in rank order
+        if not ranked:
+            items = sorted(items, key=lambda x: x[3] if x[3] is not None else float("inf"))
+
+        top_k = self.cfg.top_k
+        picked = []
+        picked_ids = set()
+        seen = set()
+
+        for cid, doc, meta, dist in items:
+            source = str((meta or {}).get("source", "unknown"))
+            page = (meta or {}).get("page", None)
+            key = (source, page)
+
+            if self.cfg.dedup_pages and key in seen:
+                continue
+            
+            picked.append((cid, doc, meta, dist))
+            picked_ids.add(cid)
+            seen.add(key)
+
+            if len(picked) >= top_k:
+                break
+        
+        # fill up with the skipped same-page chunks
+        if len(picked) < top_k:
+            for item in items:
+                if item[0] in picked_ids:
+                    continue
+                picked.append(item)
+                picked_ids.add(item[0])
+                if len(picked) >= top_k:
+                    break
+        return picked
+
+    def _mmr(self, embeddings: List[Any], dists: List[float]) -> List[int]:
+        """
+        Greedy maximal marginal relevance over the pool: each step takes the
+        candidate maximising
+            lambda * sim(query) - (1 - lambda) * max sim(already picked).
+        Query similarity is 1 - distance; pairwise similarities come from
+        one (n, n) matrix product.
+        """
+        vecs = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vecs = vecs / norms
+
+        rel = 1.0 - np.asarray([d if d is not None else 1.0 for d in dists], dtype=np.float32)
+        pair = vecs @ vecs.T
+        lam = self.cfg.mmr_lambda
+
+        k = min(self.cfg.top_k, len(rel))
+        chosen: List[int] = []
+        # max similarity to anything chosen so far
+        redundancy = np.full(len(rel), -np.inf, dtype=np.float32)
+        available = np.ones(len(rel), dtype=bool)
+        for step in range(k):
+            score = lam * rel
+            if step:
+                score = score - (1.0 - lam) * redundancy
+            score[~available] = -np.inf
+            best = int(np.argmax(score))
+            chosen.append(best)
+            available[best] = False
+            np.maximum(redundancy, pair[best], out=redundancy)
+        return chosen
\ No newline at end of file
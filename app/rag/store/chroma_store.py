@@ -7,13 +7,15 @@ from pathlib import Path
 import chromadb
 from chromadb.config import Settings
 
+from app.rag.store.vectordb_base import VectorStore
+
 
 @dataclass
 class ChromaStoreConfig:
     persist_directory: Path
     collection_name: str = "consultancy_kb"
 
-class ChromaStore:
+class ChromaStore(VectorStore):
     """
     Block 5: Vector Store (Chroma)
 
@@ -51,6 +53,9 @@ class ChromaStore:
         count = self._collection.count()
         return {"collection": self._collection.name, "count": count}
 
+    def count(self) -> int:
+        return self._collection.count()
+
     def upsert(
         self,
         *,
@@ -69,20 +74,36 @@ class ChromaStore:
             metadatas=metadatas,
         )
     
+    def get(self, *, ids: List[str], include_embeddings: bool = False) -> Dict[str, Any]:
+        """
+        Fetch documents + metadata (and optionally embeddings) by id.
+        """
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        return self._collection.get(ids=ids, include=include)
+
+    def delete(self, *, ids: List[str], batch_size: int = 5000) -> None:
+        """
+        Remove vectors (and their documents/metadata) by id.
+        """
+        for start in range(0, len(ids), batch_size):
+            self._collection.delete(ids=ids[start:start + batch_size])
+
     def query(
         self,
         *,
         query_embeddings: List[List[float]],
         n_results: int = 3,
         where: Optional[Dict[str, Any]] = None,
+        include_embeddings: bool = False,
     ) -> Dict[str, Any]:
         """
         Similarity search in Chroma.
-        Returns documents + metadatas + distances.
+        Returns documents + metadatas + distances (+ embeddings when asked).
         """
+        include = ["documents", "metadatas", "distances"] + (["embeddings"] if include_embeddings else [])
         return self._collection.query(
             query_embeddings=query_embeddings,
             n_results=n_results,
             where=where,
-            include=["documents", "metadatas", "distances"],
+            include=include,
         )
\ No newline at end of file
@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import json
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Literal, Optional
+
+from app.rag.store.snapshot import SnapshotDir
+from app.rag.store.vectordb_base import VectorStore, matches_where
+
+try:  # optional dependency: only needed when providers.store == "faiss"
+    import faiss
+    import numpy as np
+except ImportError:  # pragma: no cover
+    faiss = None
+    np = None
+
+
+@dataclass
+class FaissStoreConfig:
+    persist_directory: Path
+    collection_name: str = "consultancy_kb"
+
+    # flat = exact search; ivf / hnsw = approximate, for large collections
+    index_type: Literal["flat", "ivf", "hnsw"] = "flat"
+    nlist: int = 256
+    nprobe: int = 16
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    ef_search: int = 64
+
+    # filtered queries whose allow-list is at most this many rows are
+    # scored exactly with numpy instead of going through the ANN index
+    exact_filter_max: int = 4096
+
+
+class FaissStore(VectorStore):
+    """
+    Vector store backed by an in-process FAISS index.
+
+    Vectors are L2-normalised and searched by inner product, so
+    `distance = 1 - cosine similarity` matches Chroma's cosine space.
+    Documents and metadata live in a JSON sidecar next to the index.
+
+    Writes are buffered in memory; `persist()` writes a new snapshot
+    generation atomically (see `SnapshotDir`). Readers in other processes
+    pick up a newer generation on their next query.
+    """
+
+    def __init__(self, cfg: FaissStoreConfig):
+        if faiss is None:
+            raise RuntimeError("FaissStore requires the `faiss-cpu` and `numpy` packages")
+
+        self.cfg = cfg
+        self._snapshots = SnapshotDir(cfg.persist_directory / f"{cfg.collection_name}.faiss")
+        self._lock = threading.RLock()
+
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._row_of: Dict[str, int] = {}
+        self._vectors = None  # np.ndarray (n, dim) float32
+
+        self._index = None
+        self._index_stale = True  # index must be rebuilt before the next search
+        self._unsaved = False
+        self._loaded_token: Optional[str] = None
+        self._where_rows: Dict[str, Any] = {}
+
+        self._load()
+
+    @property
+    def collection_name(self) -> str:
+        return self.cfg.collection_name
+
+    def count(self) -> int:
+        with self._lock:
+            self._maybe_reload()
+            return len(self._ids)
+
+    # ---- writes ----
+
+    def upsert(
+        self,
+        *,
+        ids: List[str],
+        documents: List[str],
+        embeddings: List[List[float]],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        """
+        Insert or replace entries. New ids are appended to the live index;
+        overwriting an existing id marks the index for a rebuild.
+        """
+        if not ids:
+            return
+        vecs = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        metadatas = metadatas or [{} for _ in ids]
+
+        with self._lock:
+            self._maybe_reload()
+            if self._vectors is not None and vecs.shape[1] != self._vectors.shape[1]:
+                raise ValueError(
+                    f"Embedding dim {vecs.shape[1]} does not match store dim {self._vectors.shape[1]}"
+                )
+
+            new_rows: List[int] = []
+            for i, doc_id in enumerate(ids):
+                row = self._row_of.get(doc_id)
+                if row is None:
+                    new_rows.append(i)
+                    continue
+                self._vectors[row] = vecs[i]
+                self._documents[row] = documents[i]
+                self._metadatas[row] = metadatas[i] or {}
+                self._index_stale = True
+
+            if new_rows:
+                start = len(self._ids)
+                for offset, i in enumerate(new_rows):
+                    self._row_of[ids[i]] = start + offset
+                    self._ids.append(ids[i])
+                    self._documents.append(documents[i])
+                    self._metadatas.append(metadatas[i] or {})
+                added = vecs[new_rows]
+                self._vectors = added if self._vectors is None else np.vstack([self._vectors, added])
+                if self._index is not None and not self._index_stale and self._index.is_trained:
+                    self._index.add(added)
+                else:
+                    self._index_stale = True
+
+            self._where_rows.clear()
+            self._unsaved = True
+
+    def get(self, *, ids: List[str], include_embeddings: bool = False) -> Dict[str, Any]:
+        with self._lock:
+            self._maybe_reload()
+            rows = [self._row_of[i] for i in ids if i in self._row_of]
+            out: Dict[str, Any] = {
+                "ids": [self._ids[r] for r in rows],
+                "documents": [self._documents[r] for r in rows],
+                "metadatas": [self._metadatas[r] for r in rows],
+            }
+            if include_embeddings:
+                out["embeddings"] = [np.asarray(self._vectors[r], dtype=np.float32) for r in rows]
+            return out
+
+    def delete(self, *, ids: List[str]) -> None:
+        with self._lock:
+            self._maybe_reload()
+            drop = {self._row_of[i] for i in ids if i in self._row_of}
+            if not drop:
+                return
+            keep = [r for r in range(len(self._ids)) if r not in drop]
+            self._ids = [self._ids[r] for r in keep]
+            self._documents = [self._documents[r] for r in keep]
+            self._metadatas = [self._metadatas[r] for r in keep]
+            self._vectors = self._vectors[keep] if keep else None
+            self._row_of = {doc_id: r for r, doc_id in enumerate(self._ids)}
+
+            # faiss row ids are positions, so compacting means a rebuild
+            self._index_stale = True
+            self._where_rows.clear()
+            self._unsaved = True
+
+    def persist(self) -> None:
+        """Write index + vectors + sidecar as a new snapshot generation."""
+        with self._lock:
+            if not self._unsaved:
+                return
+            if self._index_stale:
+                self._rebuild_index()
+
+            def write(tmp: Path) -> None:
+                if self._vectors is not None:
+                    np.save(tmp / "vectors.npy", self._vectors)
+                    faiss.write_index(self._index, str(tmp / "index.faiss"))
+                sidecar = {
+                    "index_type": self.cfg.index_type,
+                    "ids": self._ids,
+                    "documents": self._documents,
+                    "metadatas": self._metadatas,
+                }
+                (tmp / "docstore.json").write_text(json.dumps(sidecar), encoding="utf-8")
+
+            self._loaded_token = self._snapshots.write(write).name
+            self._unsaved = False
+
+    # ---- reads ----
+
+    def query(
+        self,
+        *,
+        query_embeddings: List[List[float]],
+        n_results: int = 3,
+        where: Optional[Dict[str, Any]] = None,
+        include_embeddings: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Similarity search. `where` is resolved to an id allow-list which
+        is passed to FAISS as a search-time selector.
+        """
+        q = self._normalize(np.asarray(query_embeddings, dtype=np.float32))
+        out: Dict[str, Any] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if include_embeddings:
+            out["embeddings"] = []
+
+        with self._lock:
+            self._maybe_reload()
+            rows = self._allowed_rows(where)
+            if not self._ids or (rows is not None and len(rows) == 0):
+                for key in out:
+                    out[key] = [[] for _ in range(len(q))]
+                return out
+
+            if rows is not None and len(rows) <= self.cfg.exact_filter_max:
+                sims, idx = self._exact_search(q, rows, n_results)
+            else:
+                if self._index_stale:
+                    self._rebuild_index()
+                k = min(n_results, len(self._ids) if rows is None else len(rows))
+                sims, idx = self._index.search(q, k, params=self._search_params(rows))
+
+            for sim_row, idx_row in zip(sims, idx):
+                hits = [(int(r), float(s)) for r, s in zip(idx_row, sim_row) if r >= 0]
+                out["ids"].append([self._ids[r] for r, _ in hits])
+                out["documents"].append([self._documents[r] for r, _ in hits])
+                out["metadatas"].append([self._metadatas[r] for r, _ in hits])
+                out["distances"].append([1.0 - s for _, s in hits])
+                if include_embeddings:
+                    out["embeddings"].append(self._vectors[[r for r, _ in hits]])
+        return out
+
+    # ---- internals ----
+
+    @staticmethod
+    def _normalize(vecs):
+        if vecs.ndim == 1:
+            vecs = vecs.reshape(1, -1)
+        vecs = np.ascontiguousarray(vecs, dtype=np.float32)
+        faiss.normalize_L2(vecs)
+        return vecs
+
+    def _allowed_rows(self, where: Optional[Dict[str, Any]]):
+        if not where:
+            return None
+        key = json.dumps(where, sort_keys=True, default=str)
+        rows = self._where_rows.get(key)
+        if rows is None:
+            rows = np.fromiter(
+                (r for r, meta in enumerate(self._metadatas) if matches_where(meta, where)),
+                dtype=np.int64,
+            )
+            self._where_rows[key] = rows
+        return rows
+
+    def _exact_search(self, q, rows, n_results: int):
+        sims = q @ self._vectors[rows].T
+        k = min(n_results, len(rows))
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_sims, axis=1)
+        return np.take_along_axis(top_sims, order, axis=1), rows[np.take_along_axis(top, order, axis=1)]
+
+    def _search_params(self, rows):
+        sel = faiss.IDSelectorBatch(rows) if rows is not None else None
+        if self.cfg.index_type == "ivf":
+            return faiss.SearchParametersIVF(sel=sel, nprobe=self.cfg.nprobe)
+        if self.cfg.index_type == "hnsw":
+            return faiss.SearchParametersHNSW(sel=sel, efSearch=self.cfg.ef_search)
+        return faiss.SearchParameters(sel=sel) if sel is not None else None
+
+    def _rebuild_index(self) -> None:
+        if self._vectors is None:
+            self._index = None
+            self._index_stale = False
+            return
+
+        n, dim = self._vectors.shape
+        if self.cfg.index_type == "ivf":
+            # faiss wants ~39 training points per list; shrink nlist for small collections
+            nlist = max(1, min(self.cfg.nlist, n // 39))
+            index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            index.train(self._vectors)
+            index.nprobe = self.cfg.nprobe
+        elif self.cfg.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, self.cfg.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = self.cfg.ef_construction
+            index.hnsw.efSearch = self.cfg.ef_search
+        else:
+            index = faiss.IndexFlatIP(dim)
+
+        index.add(self._vectors)
+        self._index = index
+        self._index_stale = False
+
+    def _maybe_reload(self) -> None:
+        # pick up a snapshot written by another process (e.g. an ingest run),
+        # unless we hold writes of our own that have not been persisted yet
+        if self._unsaved:
+            return
+        if self._snapshots.token() != self._loaded_token:
+            self._load()
+
+    def _load(self) -> None:
+        token = self._snapshots.token()
+        gen = self._snapshots.current()
+        if gen is None:
+            self._loaded_token = token
+            return
+
+        sidecar = json.loads((gen / "docstore.json").read_text(encoding="utf-8"))
+        self._ids = sidecar["ids"]
+        self._documents = sidecar["documents"]
+        self._metadatas = sidecar["metadatas"]
+        self._row_of = {doc_id: r for r, doc_id in enumerate(self._ids)}
+        self._where_rows.clear()
+
+        vec_path = gen / "vectors.npy"
+        self._vectors = np.load(vec_path) if vec_path.exists() else None
+        self._index = None
+        self._index_stale = True
+
+        index_path = gen / "index.faiss"
+        if index_path.exists() and sidecar.get("index_type") == self.cfg.index_type:
+            self._index = faiss.read_index(str(index_path))
+            if self.cfg.index_type == "ivf":
+                self._index.nprobe = self.cfg.nprobe
+            elif self.cfg.index_type == "hnsw":
+                self._index.hnsw.efSearch = self.cfg.ef_search
+            self._index_stale = False
+
+        self._loaded_token = token
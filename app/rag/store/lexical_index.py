@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import json
+import math
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.rag.store.snapshot import SnapshotDir
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[./\-:][a-z0-9]+)*")
+_SPLIT_RE = re.compile(r"[./\-:]")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were what when "
+    "which who will with about does do did how".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens. Compound identifiers (`2020-04-20`, `7.2`,
+    `art-12`) are kept whole and also split into their parts, so both
+    exact and partial identifier queries hit.
+    """
+    out: List[str] = []
+    for tok in _TOKEN_RE.findall((text or "").lower()):
+        if tok in _STOPWORDS:
+            continue
+        out.append(tok)
+        if "-" in tok or "." in tok or "/" in tok or ":" in tok:
+            out.extend(p for p in _SPLIT_RE.split(tok) if p and p not in _STOPWORDS)
+    return out
+
+
+def is_identifier(token: str) -> bool:
+    """
+    Identifier-shaped tokens: dates and clause numbers (`2020-04-20`,
+    `7.2`) or letters mixed with digits (`art12`). Bare numbers such as
+    amounts, years or the parts of a split compound are not.
+    """
+    if not any(c.isdigit() for c in token):
+        return False
+    return bool(_SPLIT_RE.search(token)) or any(c.isalpha() for c in token)
+
+
+@dataclass
+class LexicalIndexConfig:
+    persist_directory: Path
+    collection_name: str = "consultancy_kb"
+    k1: float = 1.2
+    b: float = 0.75
+
+
+@dataclass(frozen=True)
+class LexicalHit:
+    id: str
+    score: float
+    # hit contains at least one identifier token from the query
+    identifier_match: bool
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index, built at ingest time next to the vector store.
+
+    The base segment is CSR-style postings (term offsets, doc rows, term
+    frequencies) in .npy files opened with mmap. Writes go to an in-memory
+    delta segment; deletes and overwrites become tombstones on the old
+    row. `persist()` merges base + delta into a new snapshot generation
+    (see `SnapshotDir`), which readers pick up on their next search.
+    """
+
+    def __init__(self, cfg: LexicalIndexConfig):
+        self.cfg = cfg
+        self._snapshots = SnapshotDir(cfg.persist_directory / f"{cfg.collection_name}.bm25")
+        self._lock = threading.RLock()
+        self._unsaved = False
+        self._loaded_token: Optional[str] = None
+        self._reset()
+        self._load()
+
+    def _reset(self) -> None:
+        # base segment (mmapped)
+        self._terms: Dict[str, int] = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._post_rows = np.zeros(0, dtype=np.int32)
+        self._post_tfs = np.zeros(0, dtype=np.uint16)
+
+        # rows = base rows followed by delta rows
+        self._doc_ids: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        self._lens = np.zeros(0, dtype=np.int32)
+        self._dead = np.zeros(0, dtype=bool)
+        self._live = 0
+        self._total_len = 0
+
+        # delta segment: term -> {row: tf}
+        self._delta: Dict[str, Dict[int, int]] = {}
+
+    def count(self) -> int:
+        with self._lock:
+            self._maybe_reload()
+            return self._live
+
+    # ---- writes ----
+
+    def add(self, *, ids: List[str], documents: List[str]) -> None:
+        """Index (or re-index) documents by id."""
+        if not ids:
+            return
+        with self._lock:
+            self._maybe_reload()
+            self._kill([i for i in ids if i in self._row_of])
+
+            start = len(self._doc_ids)
+            lens = np.zeros(len(ids), dtype=np.int32)
+            for offset, (doc_id, text) in enumerate(zip(ids, documents)):
+                row = start + offset
+                tokens = tokenize(text)
+                for term, tf in Counter(tokens).items():
+                    self._delta.setdefault(term, {})[row] = tf
+                lens[offset] = len(tokens)
+                self._doc_ids.append(doc_id)
+                self._row_of[doc_id] = row
+
+            self._lens = np.concatenate([self._lens, lens])
+            self._dead = np.concatenate([self._dead, np.zeros(len(ids), dtype=bool)])
+            self._live += len(ids)
+            self._total_len += int(lens.sum())
+            self._unsaved = True
+
+    def delete(self, *, ids: List[str]) -> None:
+        with self._lock:
+            self._maybe_reload()
+            if self._kill([i for i in ids if i in self._row_of]):
+                self._unsaved = True
+
+    def _kill(self, ids: List[str]) -> int:
+        for doc_id in ids:
+            row = self._row_of.pop(doc_id)
+            self._dead[row] = True
+            self._live -= 1
+            self._total_len -= int(self._lens[row])
+        return len(ids)
+
+    def persist(self) -> None:
+        """Merge delta + tombstones into a fresh base segment and publish it."""
+        with self._lock:
+            if not self._unsaved:
+                return
+
+            alive = ~self._dead
+            remap = np.cumsum(alive, dtype=np.int64) - 1
+
+            terms = sorted(set(self._terms) | set(self._delta))
+            offsets = [0]
+            rows_parts: List[np.ndarray] = []
+            tfs_parts: List[np.ndarray] = []
+            kept_terms: List[str] = []
+            for term in terms:
+                rows, tfs = self._postings(term)
+                keep = alive[rows]
+                rows, tfs = rows[keep], tfs[keep]
+                if not len(rows):
+                    continue
+                kept_terms.append(term)
+                rows_parts.append(remap[rows].astype(np.int32))
+                tfs_parts.append(tfs.astype(np.uint16))
+                offsets.append(offsets[-1] + len(rows))
+
+            doc_ids = [d for d, a in zip(self._doc_ids, alive) if a]
+            lens = self._lens[alive]
+
+            def write(tmp: Path) -> None:
+                np.save(tmp / "offsets.npy", np.asarray(offsets, dtype=np.int64))
+                np.save(tmp / "rows.npy", np.concatenate(rows_parts) if rows_parts else np.zeros(0, dtype=np.int32))
+                np.save(tmp / "tfs.npy", np.concatenate(tfs_parts) if tfs_parts else np.zeros(0, dtype=np.uint16))
+                np.save(tmp / "doc_len.npy", lens.astype(np.int32))
+                meta = {"version": 1, "terms": kept_terms, "doc_ids": doc_ids}
+                (tmp / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+
+            self._snapshots.write(write)
+            self._unsaved = False
+            self._load()
+
+    # ---- reads ----
+
+    def search(self, query: str, *, k: int) -> List[LexicalHit]:
+        """Top-k documents by BM25 score (only documents matching a query term)."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or k <= 0:
+            return []
+
+        with self._lock:
+            self._maybe_reload()
+            if not self._live:
+                return []
+
+            n = self._live
+            avgdl = max(self._total_len / n, 1.0)
+            k1, b = self.cfg.k1, self.cfg.b
+            scores = np.zeros(len(self._doc_ids), dtype=np.float32)
+            ident = np.zeros(len(self._doc_ids), dtype=bool)
+
+            for term in terms:
+                rows, tfs = self._postings(term)
+                if len(rows):
+                    keep = ~self._dead[rows]
+                    rows, tfs = rows[keep], tfs[keep]
+                df = len(rows)
+                if not df:
+                    continue
+                idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+                tf = tfs.astype(np.float32)
+                dl = self._lens[rows]
+                scores[rows] += idf * tf * (k1 + 1.0) / (tf + k1 * (1.0 - b + b * dl / avgdl))
+                if is_identifier(term):
+                    ident[rows] = True
+
+            hit_rows = np.flatnonzero(scores)
+            if not len(hit_rows):
+                return []
+            kk = min(k, len(hit_rows))
+            top = hit_rows[np.argpartition(-scores[hit_rows], kk - 1)[:kk]]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [LexicalHit(self._doc_ids[r], float(scores[r]), bool(ident[r])) for r in top]
+
+    # ---- internals ----
+
+    def _postings(self, term: str):
+        rows = np.zeros(0, dtype=np.int64)
+        tfs = np.zeros(0, dtype=np.uint16)
+        tid = self._terms.get(term)
+        if tid is not None:
+            start, end = int(self._offsets[tid]), int(self._offsets[tid + 1])
+            rows = self._post_rows[start:end].astype(np.int64)
+            tfs = self._post_tfs[start:end]
+        delta = self._delta.get(term)
+        if delta:
+            rows = np.concatenate([rows, np.fromiter(delta.keys(), dtype=np.int64, count=len(delta))])
+            delta_tfs = np.fromiter(delta.values(), dtype=np.int64, count=len(delta))
+            tfs = np.concatenate([tfs, np.minimum(delta_tfs, 65535).astype(np.uint16)])
+        return rows, tfs
+
+    def _maybe_reload(self) -> None:
+        if self._unsaved:
+            return
+        if self._snapshots.token() != self._loaded_token:
+            self._load()
+
+    def _load(self) -> None:
+        token = self._snapshots.token()
+        gen = self._snapshots.current()
+        self._reset()
+        if gen is not None:
+            meta = json.loads((gen / "meta.json").read_text(encoding="utf-8"))
+            self._terms = {t: i for i, t in enumerate(meta["terms"])}
+            self._offsets = np.load(gen / "offsets.npy", mmap_mode="r")
+            self._post_rows = np.load(gen / "rows.npy", mmap_mode="r")
+            self._post_tfs = np.load(gen / "tfs.npy", mmap_mode="r")
+            self._lens = np.array(np.load(gen / "doc_len.npy"))
+
+            self._doc_ids = list(meta["doc_ids"])
+            self._row_of = {doc_id: r for r, doc_id in enumerate(self._doc_ids)}
+            self._dead = np.zeros(len(self._doc_ids), dtype=bool)
+            self._live = len(self._doc_ids)
+            self._total_len = int(self._lens.sum())
+        self._loaded_token = token
@@ -0,0 +1,344 @@
+from __future__ import annotations
+
+import json
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Literal, Optional
+
+import numpy as np
+
+from app.rag.store.snapshot import SnapshotDir
+from app.rag.store.vectordb_base import VectorStore, matches_where
+
+
+@dataclass
+class NumpyStoreConfig:
+    persist_directory: Path
+    collection_name: str = "consultancy_kb"
+
+    # on-disk vector dtype. float16 halves memory, but each block is
+    # converted to float32 for scoring, which costs more than the matmul;
+    # prefer float32 unless RAM-bound
+    dtype: Literal["float32", "float16"] = "float32"
+    # rows scored per matrix multiply (bounds the float32 scratch buffer)
+    block_rows: int = 16384
+
+
+class _Column:
+    """One metadata key as dictionary-encoded int32 codes (-1 = missing)."""
+
+    def __init__(self, values: List[Any]) -> None:
+        self.vocab: Dict[Any, int] = {}
+        codes = np.full(len(values), -1, dtype=np.int32)
+        for row, value in enumerate(values):
+            if value is None:
+                continue
+            codes[row] = self.vocab.setdefault(value, len(self.vocab))
+        self.codes = codes
+
+    def isin(self, values: List[Any]) -> np.ndarray:
+        wanted = [self.vocab[v] for v in values if v in self.vocab]
+        if not wanted:
+            return np.zeros(len(self.codes), dtype=bool)
+        if len(wanted) == 1:
+            return self.codes == wanted[0]
+        return np.isin(self.codes, wanted)
+
+
+class NumpyStore(VectorStore):
+    """
+    Exact cosine search over a memory-mapped matrix of normalised vectors.
+
+    For tens of thousands of chunks a brute-force matmul is faster and more
+    predictable than an ANN index, with exact recall. The matrix is opened
+    with np.memmap, so every uvicorn worker shares one copy through the
+    page cache. Metadata is held as dictionary-encoded column arrays, so
+    equality / $in filters become boolean masks.
+
+    Writes are buffered in memory; `persist()` publishes a new snapshot
+    generation (see `SnapshotDir`), which readers pick up on their next query.
+    """
+
+    def __init__(self, cfg: NumpyStoreConfig):
+        self.cfg = cfg
+        self._snapshots = SnapshotDir(cfg.persist_directory / f"{cfg.collection_name}.numpy")
+        self._lock = threading.RLock()
+
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._row_of: Dict[str, int] = {}
+        self._columns: Optional[Dict[str, _Column]] = None  # built lazily for filtered queries
+        self._vectors: Optional[np.ndarray] = None  # memmap (read-only) or in-RAM copy after writes
+
+        self._unsaved = False
+        self._loaded_token: Optional[str] = None
+
+        self._load()
+
+    @property
+    def collection_name(self) -> str:
+        return self.cfg.collection_name
+
+    def count(self) -> int:
+        with self._lock:
+            self._maybe_reload()
+            return len(self._ids)
+
+    # ---- writes ----
+
+    def upsert(
+        self,
+        *,
+        ids: List[str],
+        documents: List[str],
+        embeddings: List[List[float]],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        if not ids:
+            return
+        vecs = self._normalize(np.asarray(embeddings, dtype=np.float32)).astype(self.cfg.dtype)
+        metadatas = metadatas or [{} for _ in ids]
+
+        with self._lock:
+            self._maybe_reload()
+            self._materialize()
+            if self._vectors is not None and vecs.shape[1] != self._vectors.shape[1]:
+                raise ValueError(
+                    f"Embedding dim {vecs.shape[1]} does not match store dim {self._vectors.shape[1]}"
+                )
+
+            new_rows: List[int] = []
+            for i, doc_id in enumerate(ids):
+                row = self._row_of.get(doc_id)
+                if row is None:
+                    new_rows.append(i)
+                    continue
+                self._vectors[row] = vecs[i]
+                self._documents[row] = documents[i]
+                self._metadatas[row] = metadatas[i] or {}
+
+            if new_rows:
+                start = len(self._ids)
+                for offset, i in enumerate(new_rows):
+                    self._row_of[ids[i]] = start + offset
+                    self._ids.append(ids[i])
+                    self._documents.append(documents[i])
+                    self._metadatas.append(metadatas[i] or {})
+                added = vecs[new_rows]
+                self._vectors = added if self._vectors is None else np.vstack([self._vectors, added])
+
+            self._columns = None
+            self._unsaved = True
+
+    def get(self, *, ids: List[str], include_embeddings: bool = False) -> Dict[str, Any]:
+        with self._lock:
+            self._maybe_reload()
+            rows = [self._row_of[i] for i in ids if i in self._row_of]
+            out: Dict[str, Any] = {
+                "ids": [self._ids[r] for r in rows],
+                "documents": [self._documents[r] for r in rows],
+                "metadatas": [self._metadatas[r] for r in rows],
+            }
+            if include_embeddings:
+                out["embeddings"] = [np.asarray(self._vectors[r], dtype=np.float32) for r in rows]
+            return out
+
+    def delete(self, *, ids: List[str]) -> None:
+        with self._lock:
+            self._maybe_reload()
+            drop = {self._row_of[i] for i in ids if i in self._row_of}
+            if not drop:
+                return
+            keep = np.array([r for r in range(len(self._ids)) if r not in drop], dtype=np.int64)
+            self._ids = [self._ids[r] for r in keep]
+            self._documents = [self._documents[r] for r in keep]
+            self._metadatas = [self._metadatas[r] for r in keep]
+            self._vectors = np.array(self._vectors[keep]) if len(keep) else None
+            self._row_of = {doc_id: r for r, doc_id in enumerate(self._ids)}
+            self._columns = None
+            self._unsaved = True
+
+    def persist(self) -> None:
+        """Write vectors + sidecar as a new generation and re-map it read-only."""
+        with self._lock:
+            if not self._unsaved:
+                return
+
+            def write(tmp: Path) -> None:
+                if self._vectors is not None:
+                    np.ascontiguousarray(self._vectors, dtype=self.cfg.dtype).tofile(tmp / "vectors.bin")
+                sidecar = {
+                    "dtype": self.cfg.dtype,
+                    "dim": 0 if self._vectors is None else int(self._vectors.shape[1]),
+                    "ids": self._ids,
+                    "documents": self._documents,
+                    "metadatas": self._metadatas,
+                }
+                (tmp / "docstore.json").write_text(json.dumps(sidecar), encoding="utf-8")
+
+            self._snapshots.write(write)
+            self._unsaved = False
+            # drop the private copy; from here on we share the page cache like readers
+            self._load()
+
+    # ---- reads ----
+
+    def query(
+        self,
+        *,
+        query_embeddings: List[List[float]],
+        n_results: int = 3,
+        where: Optional[Dict[str, Any]] = None,
+        include_embeddings: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Exact top-k by cosine similarity. All query vectors are scored
+        together, one matrix multiply per block of rows.
+        """
+        q = self._normalize(np.asarray(query_embeddings, dtype=np.float32))
+        out: Dict[str, Any] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if include_embeddings:
+            out["embeddings"] = []
+
+        with self._lock:
+            self._maybe_reload()
+            rows = None
+            if where and self._ids:
+                rows = np.flatnonzero(self._mask(where))
+
+            if not self._ids or n_results <= 0 or (rows is not None and len(rows) == 0):
+                for key in out:
+                    out[key] = [[] for _ in range(len(q))]
+                return out
+
+            sims, idx = self._top_k(q, rows, n_results)
+            for sim_row, idx_row in zip(sims, idx):
+                out["ids"].append([self._ids[r] for r in idx_row])
+                out["documents"].append([self._documents[r] for r in idx_row])
+                out["metadatas"].append([self._metadatas[r] for r in idx_row])
+                out["distances"].append([1.0 - float(s) for s in sim_row])
+                if include_embeddings:
+                    out["embeddings"].append(np.asarray(self._vectors[idx_row], dtype=np.float32))
+        return out
+
+    # ---- internals ----
+
+    @staticmethod
+    def _normalize(vecs: np.ndarray) -> np.ndarray:
+        if vecs.ndim == 1:
+            vecs = vecs.reshape(1, -1)
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vecs / norms
+
+    def _top_k(self, q: np.ndarray, rows: Optional[np.ndarray], k: int):
+        total = len(self._ids) if rows is None else len(rows)
+        block = max(1, self.cfg.block_rows)
+        cand_sims: List[np.ndarray] = []
+        cand_idx: List[np.ndarray] = []
+
+        for start in range(0, total, block):
+            end = min(total, start + block)
+            if rows is None:
+                mat = self._vectors[start:end]
+                row_ids = None
+            else:
+                row_ids = rows[start:end]
+                mat = self._vectors[row_ids]
+
+            sims = q @ np.asarray(mat, dtype=np.float32).T  # (n_queries, block)
+            kk = min(k, sims.shape[1])
+            part = np.argpartition(-sims, kk - 1, axis=1)[:, :kk]
+            cand_sims.append(np.take_along_axis(sims, part, axis=1))
+            cand_idx.append(part + start if row_ids is None else row_ids[part])
+
+        sims = np.hstack(cand_sims)
+        idx = np.hstack(cand_idx)
+        kk = min(k, sims.shape[1])
+        if sims.shape[1] > kk:
+            part = np.argpartition(-sims, kk - 1, axis=1)[:, :kk]
+            sims = np.take_along_axis(sims, part, axis=1)
+            idx = np.take_along_axis(idx, part, axis=1)
+        order = np.argsort(-sims, axis=1, kind="stable")
+        return np.take_along_axis(sims, order, axis=1), np.take_along_axis(idx, order, axis=1)
+
+    def _mask(self, where: Dict[str, Any]) -> np.ndarray:
+        n = len(self._ids)
+        mask = np.ones(n, dtype=bool)
+        for key, cond in where.items():
+            if key == "$and":
+                for sub in cond:
+                    mask &= self._mask(sub)
+                continue
+            if key == "$or":
+                any_mask = np.zeros(n, dtype=bool)
+                for sub in cond:
+                    any_mask |= self._mask(sub)
+                mask &= any_mask
+                continue
+
+            if not isinstance(cond, dict):
+                cond = {"$eq": cond}
+            col = self._get_columns().get(key)
+            for op, expected in cond.items():
+                if op == "$eq":
+                    mask &= col.isin([expected]) if col else False
+                elif op == "$in":
+                    mask &= col.isin(list(expected)) if col else False
+                elif op == "$ne":
+                    mask &= ~col.isin([expected]) if col else True
+                elif op == "$nin":
+                    mask &= ~col.isin(list(expected)) if col else True
+                else:
+                    # range operators: rare in our filters, evaluate row-wise
+                    sub = {key: {op: expected}}
+                    mask &= np.fromiter(
+                        (matches_where(m, sub) for m in self._metadatas), dtype=bool, count=n
+                    )
+        return mask
+
+    def _get_columns(self) -> Dict[str, _Column]:
+        if self._columns is None:
+            keys = {k for meta in self._metadatas for k in meta}
+            self._columns = {k: _Column([meta.get(k) for meta in self._metadatas]) for k in keys}
+        return self._columns
+
+    def _materialize(self) -> None:
+        # writes go to a private in-RAM copy; the shared mapping stays read-only
+        if isinstance(self._vectors, np.memmap):
+            self._vectors = np.array(self._vectors, dtype=self.cfg.dtype)
+
+    def _maybe_reload(self) -> None:
+        if self._unsaved:
+            return
+        if self._snapshots.token() != self._loaded_token:
+            self._load()
+
+    def _load(self) -> None:
+        token = self._snapshots.token()
+        gen = self._snapshots.current()
+        if gen is None:
+            self._loaded_token = token
+            return
+
+        sidecar = json.loads((gen / "docstore.json").read_text(encoding="utf-8"))
+        self._ids = sidecar["ids"]
+        self._documents = sidecar["documents"]
+        self._metadatas = sidecar["metadatas"]
+        self._row_of = {doc_id: r for r, doc_id in enumerate(self._ids)}
+        self._columns = None
+
+        if self._ids:
+            # a snapshot in another dtype is read as-is; the next persist rewrites it
+            self._vectors = np.memmap(
+                gen / "vectors.bin",
+                dtype=sidecar["dtype"],
+                mode="r",
+                shape=(len(self._ids), sidecar["dim"]),
+            )
+        else:
+            self._vectors = None
+
+        self._loaded_token = token
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.rag.store.vectordb_base import VectorStore
+
+
+@dataclass
+class ShardedStoreConfig:
+    persist_directory: Path
+    collection_name: str = "consultancy_kb"
+    # metadata field that picks the shard (ingest sets it from the docs/<doc_type>/ folder)
+    shard_key: str = "doc_type"
+    # shard for chunks without a shard_key value
+    default_shard: str = "default"
+    # threads for fan-out queries over every shard
+    fanout_workers: int = 4
+
+
+_SHARD_NAME_RE = re.compile(r"[^a-z0-9_-]+")
+
+
+def shard_collection_name(collection_name: str, shard: str) -> str:
+    return f"{collection_name}__{shard}"
+
+
+class ShardedStore(VectorStore):
+    """
+    One backend collection per `shard_key` value (doc_type by default).
+
+    Upserts are split by the chunk's metadata. A query whose `where` pins
+    the shard key (equality or `$in`, possibly inside `$and`) only hits the
+    matching shards. When the values are exact shard names the clause is
+    dropped, so the shard runs an unfiltered search; otherwise (e.g. "MoA"
+    for shard "moa") the shard still applies it. Any other query fans out
+    to every shard in parallel and the hits are merged by distance.
+
+    Shard names are recorded in `<collection>.shards.json` next to the
+    stores, so readers pick up shards created by a later ingest. Each shard
+    is a separate collection / index and can be rebuilt on its own
+    (`scripts.ingest_docs --shard <name>`).
+    """
+
+    def __init__(self, cfg: ShardedStoreConfig, open_shard: Callable[[str], VectorStore]):
+        """`open_shard(collection_name)` builds the backend store for one shard."""
+        self.cfg = cfg
+        self._open_shard = open_shard
+        self._registry_path = cfg.persist_directory / f"{cfg.collection_name}.shards.json"
+        self._lock = threading.RLock()
+        self._shards: Dict[str, VectorStore] = {}
+        self._registry_mtime: Optional[int] = None
+        self._registry_dirty = False
+        self._pool = ThreadPoolExecutor(max_workers=max(1, cfg.fanout_workers), thread_name_prefix="shard")
+
+        self._maybe_reload()
+
+    @property
+    def collection_name(self) -> str:
+        return self.cfg.collection_name
+
+    def shard_names(self) -> List[str]:
+        with self._lock:
+            self._maybe_reload()
+            return sorted(self._shards)
+
+    def shard(self, name: str) -> VectorStore:
+        """Backend store for one shard, created (empty) if it does not exist yet."""
+        name = self._shard_name(name)
+        with self._lock:
+            store = self._shards.get(name)
+            if store is None:
+                store = self._shards[name] = self._open_shard(shard_collection_name(self.cfg.collection_name, name))
+                self._registry_dirty = True
+            return store
+
+    def count(self) -> int:
+        return sum(s.count() for s in self._all_shards())
+
+    def heartbeat(self) -> Dict[str, Any]:
+        shards = {name: store.count() for name, store in self._named_shards()}
+        return {"collection": self.collection_name, "count": sum(shards.values()), "shards": shards}
+
+    # ---- writes ----
+
+    def upsert(
+        self,
+        *,
+        ids: List[str],
+        documents: List[str],
+        embeddings: List[List[float]],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        metas = metadatas if metadatas is not None else [{} for _ in ids]
+        groups: Dict[str, List[int]] = {}
+        for i, meta in enumerate(metas):
+            value = (meta or {}).get(self.cfg.shard_key)
+            groups.setdefault(self._shard_name(value), []).append(i)
+
+        for name, rows in groups.items():
+            self.shard(name).upsert(
+                ids=[ids[i] for i in rows],
+                documents=[documents[i] for i in rows],
+                embeddings=[embeddings[i] for i in rows],
+                metadatas=[metas[i] for i in rows] if metadatas is not None else None,
+            )
+
+    def delete(self, *, ids: List[str]) -> None:
+        # chunk ids do not encode the shard; unknown ids are ignored by every backend
+        for store in self._all_shards():
+            store.delete(ids=ids)
+
+    def persist(self) -> None:
+        for store in self._all_shards():
+            store.persist()
+        with self._lock:
+            if not self._registry_dirty:
+                return
+            self.cfg.persist_directory.mkdir(parents=True, exist_ok=True)
+            tmp = self._registry_path.with_name(self._registry_path.name + ".tmp")
+            tmp.write_text(json.dumps({"shards": sorted(self._shards)}, indent=1), encoding="utf-8")
+            os.replace(tmp, self._registry_path)
+            self._registry_mtime = self._registry_path.stat().st_mtime_ns
+            self._registry_dirty = False
+
+    # ---- reads ----
+
+    def get(self, *, ids: List[str], include_embeddings: bool = False) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"ids": [], "documents": [], "metadatas": []}
+        if include_embeddings:
+            out["embeddings"] = []
+        for store in self._all_shards():
+            res = store.get(ids=ids, include_embeddings=include_embeddings)
+            out["ids"].extend(res.get("ids") or [])
+            out["documents"].extend(res.get("documents") or [])
+            out["metadatas"].extend(res.get("metadatas") or [])
+            if include_embeddings:
+                embs = res.get("embeddings")
+                out["embeddings"].extend(list(embs) if embs is not None else [])
+        return out
+
+    def query(
+        self,
+        *,
+        query_embeddings: List[List[float]],
+        n_results: int = 3,
+        where: Optional[Dict[str, Any]] = None,
+        include_embeddings: bool = False,
+    ) -> Dict[str, Any]:
+        targets, rest = self._route(where)
+        if targets is None:
+            stores = self._all_shards()
+        else:
+            with self._lock:
+                self._maybe_reload()
+                stores = [self._shards[t] for t in targets if t in self._shards]
+
+        def run(store: VectorStore) -> Dict[str, Any]:
+            return store.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                where=rest,
+                include_embeddings=include_embeddings,
+            )
+
+        if len(stores) == 1:
+            return run(stores[0])
+        results = list(self._pool.map(run, stores))
+        return self._merge(results, len(query_embeddings), n_results, include_embeddings)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        for store in self._all_shards():
+            close = getattr(store, "close", None)
+            if close is not None:
+                close()
+
+    # ---- helpers ----
+
+    def _shard_name(self, value: Any) -> str:
+        name = _SHARD_NAME_RE.sub("_", str(value).lower()).strip("_-") if value is not None else ""
+        return name or self.cfg.default_shard
+
+    def _all_shards(self) -> List[VectorStore]:
+        return [store for _, store in self._named_shards()]
+
+    def _named_shards(self) -> List[Tuple[str, VectorStore]]:
+        with self._lock:
+            self._maybe_reload()
+            return sorted(self._shards.items())
+
+    def _maybe_reload(self) -> None:
+        """Open shards another process (ingest) added to the registry."""
+        try:
+            mtime = self._registry_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._registry_mtime:
+            return
+        self._registry_mtime = mtime
+        names = json.loads(self._registry_path.read_text(encoding="utf-8")).get("shards", [])
+        for name in names:
+            if name not in self._shards:
+                self._shards[name] = self._open_shard(shard_collection_name(self.cfg.collection_name, name))
+
+    def _route(self, where: Optional[Dict[str, Any]]) -> Tuple[Optional[List[str]], Optional[Dict[str, Any]]]:
+        """
+        (target shards or None for all, filter left for the shards).
+        Only a top-level shard-key clause, or one inside a top-level $and, routes.
+        """
+        if not where:
+            return None, where
+
+        key = self.cfg.shard_key
+        if key in where:
+            routed = self._targets(where[key])
+            if routed is not None:
+                targets, exact = routed
+                if not exact:
+                    return targets, where
+                rest = {k: v for k, v in where.items() if k != key}
+                return targets, rest or None
+
+        clauses = where.get("$and")
+        if len(where) == 1 and isinstance(clauses, list):
+            for i, clause in enumerate(clauses):
+                if not isinstance(clause, dict) or list(clause) != [key]:
+                    continue
+                routed = self._targets(clause[key])
+                if routed is None:
+                    continue
+                targets, exact = routed
+                if not exact:
+                    return targets, where
+                others = clauses[:i] + clauses[i + 1:]
+                if not others:
+                    return targets, None
+                # Chroma wants at least two operands under $and
+                return targets, others[0] if len(others) == 1 else {"$and": others}
+
+        return None, where
+
+    def _targets(self, cond: Any) -> Optional[Tuple[List[str], bool]]:
+        """
+        (shards, exact) for a shard-key condition, or None if it does not route.
+        `exact`: every value is its own shard name, so the shard holds only matches.
+        """
+        if isinstance(cond, dict):
+            if list(cond) == ["$eq"]:
+                values = [cond["$eq"]]
+            elif list(cond) == ["$in"]:
+                values = list(cond["$in"])
+            else:
+                return None
+        else:
+            values = [cond]
+        names = [self._shard_name(v) for v in values]
+        return sorted(set(names)), all(n == v for n, v in zip(names, values))
+
+    @staticmethod
+    def _merge(
+        results: List[Dict[str, Any]], n_queries: int, n_results: int, include_embeddings: bool
+    ) -> Dict[str, Any]:
+        fields = ["ids", "documents", "metadatas", "distances"] + (["embeddings"] if include_embeddings else [])
+        out: Dict[str, Any] = {f: [] for f in fields}
+        for qi in range(n_queries):
+            hits: List[Tuple[Any, ...]] = []
+            for res in results:
+                cols = []
+                for f in fields:
+                    col = res.get(f)
+                    cols.append(list(col[qi]) if col is not None and len(col) > qi else [])
+                hits.extend(zip(*cols))
+            hits.sort(key=lambda h: h[3] if h[3] is not None else float("inf"))
+            hits = hits[:n_results]
+            for j, f in enumerate(fields):
+                out[f].append([h[j] for h in hits])
+        return out
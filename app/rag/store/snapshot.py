@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+
+class SnapshotDir:
+    """
+    Atomic multi-file persistence for file-backed stores.
+
+    Each save writes a fresh `gen-<n>/` directory and then swaps the
+    `CURRENT` pointer file with os.replace, so readers always see either
+    the old or the new generation, never a half-written one. Readers can
+    poll `token()` (one tiny file read) to notice a newer generation.
+    """
+
+    POINTER = "CURRENT"
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def token(self) -> Optional[str]:
+        try:
+            return (self.root / self.POINTER).read_text(encoding="utf-8").strip() or None
+        except FileNotFoundError:
+            return None
+
+    def current(self) -> Optional[Path]:
+        name = self.token()
+        if not name:
+            return None
+        path = self.root / name
+        return path if path.is_dir() else None
+
+    def write(self, writer: Callable[[Path], None]) -> Path:
+        """Call `writer(tmp_dir)` to fill a new generation, then publish it."""
+        name = f"gen-{time.time_ns()}"
+        tmp = self.root / f".{name}.tmp"
+        tmp.mkdir()
+        try:
+            writer(tmp)
+            final = self.root / name
+            os.replace(tmp, final)
+
+            pointer_tmp = self.root / f".{self.POINTER}.tmp"
+            pointer_tmp.write_text(name, encoding="utf-8")
+            os.replace(pointer_tmp, self.root / self.POINTER)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+        self._cleanup(keep=name)
+        return final
+
+    def _cleanup(self, keep: str) -> None:
+        # open mmaps of deleted generations stay valid on POSIX
+        for child in self.root.iterdir():
+            if child.is_dir() and child.name != keep and (child.name.startswith("gen-") or child.name.endswith(".tmp")):
+                shutil.rmtree(child, ignore_errors=True)
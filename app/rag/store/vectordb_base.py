@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+
+class VectorStore(ABC):
+    """
+    Base interface for vector stores.
+
+    `query` returns Chroma-shaped results (one inner list per query vector):
+        {"ids": [[...]], "documents": [[...]], "metadatas": [[...]], "distances": [[...]]}
+    Distances are cosine distances (1 - cosine similarity); smaller is closer.
+    """
+
+    @property
+    @abstractmethod
+    def collection_name(self) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert(
+        self,
+        *,
+        ids: List[str],
+        documents: List[str],
+        embeddings: List[List[float]],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        """Insert or replace vectors + text + metadata by id."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def query(
+        self,
+        *,
+        query_embeddings: List[List[float]],
+        n_results: int = 3,
+        where: Optional[Dict[str, Any]] = None,
+        include_embeddings: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Similarity search; `where` uses Chroma's metadata filter syntax.
+        Chroma-shaped result, one list per query vector:
+            {"ids", "documents", "metadatas", "distances", "embeddings"?}
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, *, ids: List[str], include_embeddings: bool = False) -> Dict[str, Any]:
+        """
+        Fetch entries by id (unknown ids are skipped, order is not guaranteed):
+            {"ids": [...], "documents": [...], "metadatas": [...], "embeddings": [...]?}
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, *, ids: List[str]) -> None:
+        """Remove entries by id (unknown ids are ignored)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def heartbeat(self) -> Dict[str, Any]:
+        return {"collection": self.collection_name, "count": self.count()}
+
+    def persist(self) -> None:
+        """Flush pending writes to disk. No-op for stores that persist on write."""
+        return None
+
+
+def matches_where(meta: Optional[Dict[str, Any]], where: Optional[Dict[str, Any]]) -> bool:
+    """
+    Evaluate a Chroma-style `where` filter against one metadata dict.
+    Supports field equality, $eq/$ne/$in/$nin/$gt/$gte/$lt/$lte and $and/$or.
+    """
+    if not where:
+        return True
+    meta = meta or {}
+
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(matches_where(meta, c) for c in cond):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_where(meta, c) for c in cond):
+                return False
+            continue
+
+        value = meta.get(key)
+        if not isinstance(cond, dict):
+            cond = {"$eq": cond}
+        for op, expected in cond.items():
+            if op == "$eq" and value != expected:
+                return False
+            if op == "$ne" and value == expected:
+                return False
+            if op == "$in" and value not in expected:
+                return False
+            if op == "$nin" and value in expected:
+                return False
+            if op in ("$gt", "$gte", "$lt", "$lte"):
+                if value is None:
+                    return False
+                if op == "$gt" and not value > expected:
+                    return False
+                if op == "$gte" and not value >= expected:
+                    return False
+                if op == "$lt" and not value < expected:
+                    return False
+                if op == "$lte" and not value <= expected:
+                    return False
+    return True
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+from app.rag.embeddings.embedder_base import AsyncEmbedder, Embedder
+from app.rag.llm.llm_base import AsyncLLM, LLM, StreamStop
+from app.rag.llm.scheduler import REWRITE, llm_priority
+
+
+_STREAM_END = object()
+_UNTIMED = nullcontext()
+
+
+@dataclass
+class TurnContext:
+    """
+    Per-request state for one chat turn.
+
+    Carries what the pipeline computes (embeddings, rewritten question,
+    route, retrieval results) so later stages reuse earlier work instead
+    of recomputing it. Embeddings are memoized by stripped text, so each
+    distinct text is embedded at most once per turn. Embed / LLM calls are
+    counted for the per-turn log line.
+
+    When `timings` is a dict, `stage()` accumulates wall time per pipeline
+    stage into it; when it is None, timing is skipped entirely.
+    """
+    question: str
+    embedder: Embedder
+    llm: LLM
+    async_embedder: Optional[AsyncEmbedder] = None
+    async_llm: Optional[AsyncLLM] = None
+    session_id: Optional[str] = None
+
+    rewritten: Optional[str] = None
+    where: Optional[Dict[str, Any]] = None
+    retrieval: Optional[Tuple[List[str], List[Any], List[float]]] = None
+    outcome: str = "pending"
+    # speculative rewrite decision: early_accept | no_new_terms | original | rewrite
+    speculation: Optional[str] = None
+    # set when the answer stream was cut short by its limits (max_tokens | deadline)
+    stopped: Optional[str] = None
+    # question appended to a stored session: whether its history was found
+    session_restored: Optional[bool] = None
+
+    embed_calls: int = 0
+    llm_calls: int = 0
+    started: float = field(default_factory=time.perf_counter)
+    timings: Optional[Dict[str, float]] = None
+    _vecs: Dict[str, List[float]] = field(default_factory=dict, repr=False)
+
+    # ---- timing ----
+
+    def stage(self, name: str) -> ContextManager[None]:
+        if self.timings is None:
+            return _UNTIMED
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t0)
+
+    def add_time(self, name: str, secs: float) -> None:
+        """Charge time spent outside `stage()` (e.g. this turn's share of a batch call)."""
+        if self.timings is not None:
+            self.timings[name] = self.timings.get(name, 0.0) + secs
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    # ---- embeddings ----
+
+    def embed(self, text: str) -> List[float]:
+        key = (text or "").strip()
+        vec = self._vecs.get(key)
+        if vec is None:
+            with self.stage("embed"):
+                vec = self.embedder.embed_one(key)
+            self.embed_calls += 1
+            self._vecs[key] = vec
+        return vec
+
+    async def aembed(self, text: str) -> List[float]:
+        key = (text or "").strip()
+        vec = self._vecs.get(key)
+        if vec is None:
+            with self.stage("embed"):
+                if self.async_embedder is not None:
+                    vec = await self.async_embedder.embed_one(key)
+                else:
+                    vec = await asyncio.to_thread(self.embedder.embed_one, key)
+            self.embed_calls += 1
+            self._vecs[key] = vec
+        return vec
+
+    def has_embedding(self, text: str) -> bool:
+        return (text or "").strip() in self._vecs
+
+    def remember_embedding(self, text: str, vec: List[float]) -> None:
+        """Seed the memo with a vector computed elsewhere (e.g. a batched embed call)."""
+        self._vecs[(text or "").strip()] = vec
+
+    # ---- llm ----
+
+    def generate(self, prompt: str) -> str:
+        self.llm_calls += 1
+        return self.llm.generate(prompt)
+
+    async def agenerate(self, prompt: str) -> str:
+        self.llm_calls += 1
+        if self.async_llm is not None:
+            return await self.async_llm.generate(prompt)
+        return await asyncio.to_thread(self.llm.generate, prompt)
+
+    def rewrite(self, prompt: str) -> str:
+        """`generate` for query rewrites, which the LLM scheduler serves before answers."""
+        with llm_priority(REWRITE):
+            return self.generate(prompt)
+
+    async def arewrite(self, prompt: str) -> str:
+        with llm_priority(REWRITE):
+            return await self.agenerate(prompt)
+
+    async def agenerate_stream(self, prompt: str, **limits: Any) -> AsyncIterator[str]:
+        """`limits` (max_tokens, budget_s) go to the provider's generate_stream."""
+        self.llm_calls += 1
+        # time spent in the consumer between chunks counts too; it is part of streaming
+        with self.stage("generate"):
+            if self.async_llm is not None:
+                async for chunk in self.async_llm.generate_stream(prompt, **limits):
+                    if isinstance(chunk, StreamStop):
+                        self.stopped = chunk.reason
+                        continue
+                    yield chunk
+                return
+
+            # sync provider: pull each chunk in a worker thread
+            it = iter(self.llm.generate_stream(prompt, **limits))
+            lock = threading.Lock()
+            finished = False
+
+            def step() -> Any:
+                with lock:
+                    return next(it, _STREAM_END)
+
+            def close() -> None:
+                # waits for a step still running in its thread, then closes the
+                # provider's generator (and with it the upstream response)
+                with lock:
+                    getattr(it, "close", lambda: None)()
+
+            try:
+                while True:
+                    chunk = await asyncio.to_thread(step)
+                    if chunk is _STREAM_END:
+                        finished = True
+                        return
+                    if isinstance(chunk, StreamStop):
+                        self.stopped = chunk.reason
+                        continue
+                    yield chunk
+            finally:
+                if not finished:
+                    asyncio.get_running_loop().run_in_executor(None, close)
+
+    # ---- reporting ----
+
+    def summary(self) -> str:
+        return (
+            f"outcome={self.outcome} embed_calls={self.embed_calls} llm_calls={self.llm_calls} "
+            f"rewritten={self.rewritten is not None and self.rewritten != self.question.strip()} "
+            f"speculation={self.speculation} "
+            f"elapsed_ms={self.elapsed() * 1000:.0f}{self._stages_text()} session_id='{self.session_id}'"
+        )
+
+    def _stages_text(self) -> str:
+        if not self.timings:
+            return ""
+        return " stages=" + ",".join(f"{k}:{v * 1000:.0f}" for k, v in self.timings.items())
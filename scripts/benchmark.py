@@ -0,0 +1,343 @@
+"""
+Offline benchmark: ingest, Retriever.retrieve, RAGService.chat and the
+/chat/stream SSE endpoint, against scripts.fake_ollama (no Ollama, no network).
+
+    python -m scripts.benchmark --concurrency 8 --requests 200
+    python -m scripts.benchmark --out bench.json --baseline main.json
+
+Everything is written to a throwaway working directory, so the real
+storage/ is never touched. Results (throughput and p50/p95/p99 per phase
+and per pipeline stage) are printed and saved as JSON; `--baseline`
+prints the change against an earlier result file.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from scripts.fake_ollama import FakeOllamaConfig, start_fake_ollama
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+DEFAULT_QUESTIONS = (
+    "What is the policy on conflicts of interest?",
+    "Who approves travel reimbursements?",
+    "What is the deadline for submitting expense claims?",
+    "How should confidential client information be handled?",
+    "What does the memo say about remote work?",
+    "Which documents require board approval?",
+    "What are the rules for accepting gifts from clients?",
+    "How long must project records be retained?",
+)
+
+
+# ---- helpers ----
+
+def summarize(samples_s: List[float], wall_s: Optional[float] = None, errors: int = 0) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"n": len(samples_s), "errors": errors}
+    if wall_s:
+        out["throughput_rps"] = round(len(samples_s) / wall_s, 2)
+    if samples_s:
+        ms = np.asarray(samples_s) * 1000
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        out.update(
+            mean_ms=round(float(ms.mean()), 2),
+            p50_ms=round(float(p50), 2),
+            p95_ms=round(float(p95), 2),
+            p99_ms=round(float(p99), 2),
+            max_ms=round(float(ms.max()), 2),
+        )
+    return out
+
+
+def run_concurrent(fn: Callable[[str], Any], questions: List[str], concurrency: int):
+    """Run fn over questions on a thread pool; returns (latencies, results, errors, wall)."""
+    latencies: List[float] = []
+    results: List[Any] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(q: str) -> None:
+        nonlocal errors
+        t0 = time.perf_counter()
+        try:
+            res = fn(q)
+        except Exception as e:
+            with lock:
+                errors += 1
+            print(f"  error: {e!r}", file=sys.stderr)
+            return
+        dt = time.perf_counter() - t0
+        with lock:
+            latencies.append(dt)
+            results.append(res)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, questions))
+    return latencies, results, errors, time.perf_counter() - t0
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ---- phases ----
+
+def bench_ingest(docs_root: Path, embedder, quiet: bool) -> Dict[str, Any]:
+    from app.core.config import get_settings
+    from app.rag.ingest.pipeline import IngestPipelineConfig, default_manifest_path, ingest_folder
+    from app.rag.rag_factory import create_lexical_index, create_store
+
+    settings = get_settings()
+    cfg = IngestPipelineConfig(
+        docs_root=docs_root,
+        manifest_path=default_manifest_path(Path(settings.rag.persist_dir), settings.rag.collection_name),
+        force=True,
+    )
+    out = io.StringIO() if quiet else sys.stdout
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(out):
+        chunks = ingest_folder(cfg, embedder=embedder, store=create_store(), lexical=create_lexical_index())
+    secs = time.perf_counter() - t0
+    return {"seconds": round(secs, 3), "chunks": chunks, "chunks_per_s": round(chunks / secs, 1) if secs else None}
+
+
+def bench_stream(questions: List[str], concurrency: int) -> Dict[str, Any]:
+    import httpx
+    import uvicorn
+
+    from app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}/chat/stream"
+
+    totals: List[float] = []
+    ttfts: List[float] = []
+    rates: List[float] = []
+    errors = 0
+
+    async def one(client, sem, q: str) -> None:
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            first = None
+            tokens = 0
+            try:
+                async with client.stream("POST", url, json={"message": q}) as r:
+                    r.raise_for_status()
+                    async for line in r.aiter_lines():
+                        if line == "event: token":
+                            tokens += 1
+                            if first is None:
+                                first = time.perf_counter()
+            except Exception as e:
+                errors += 1
+                print(f"  error: {e!r}", file=sys.stderr)
+                return
+            end = time.perf_counter()
+            totals.append(end - t0)
+            if first is not None:
+                ttfts.append(first - t0)
+                if tokens > 1 and end > first:
+                    rates.append((tokens - 1) / (end - first))
+
+    async def drive() -> float:
+        sem = asyncio.Semaphore(concurrency)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+            t0 = time.perf_counter()
+            await asyncio.gather(*(one(client, sem, q) for q in questions))
+            return time.perf_counter() - t0
+
+    try:
+        wall = asyncio.run(drive())
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    out = summarize(totals, wall, errors)
+    out["ttft"] = summarize(ttfts)
+    out["tokens_per_s_p50"] = round(float(np.percentile(rates, 50)), 1) if rates else None
+    return out
+
+
+# ---- reporting ----
+
+def print_report(results: Dict[str, Any]) -> None:
+    ing = results.get("ingest")
+    if ing:
+        print(f"\ningest: {ing['chunks']} chunks in {ing['seconds']}s ({ing['chunks_per_s']} chunks/s)")
+
+    rows = [(f"phase:{k}", v) for k, v in results["phases"].items()]
+    if "stream" in results["phases"]:
+        rows.append(("phase:stream.ttft", results["phases"]["stream"]["ttft"]))
+    rows += [(f"stage:{k}", v) for k, v in results["stages"].items()]
+
+    print(f"\n{'':24}{'n':>6}{'err':>5}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, s in rows:
+        print(
+            f"{name:24}{s['n']:>6}{s['errors']:>5}{s.get('throughput_rps', ''):>9}"
+            f"{s.get('p50_ms', ''):>10}{s.get('p95_ms', ''):>10}{s.get('p99_ms', ''):>10}"
+        )
+
+
+def print_comparison(results: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    print(f"\nvs baseline {baseline.get('meta', {}).get('commit')}:")
+    for group in ("phases", "stages"):
+        for name, cur in results[group].items():
+            old = baseline.get(group, {}).get(name)
+            if not old:
+                continue
+            parts = []
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                if cur.get(key) is None or not old.get(key):
+                    continue
+                delta = (cur[key] - old[key]) / old[key] * 100
+                parts.append(f"{key[:3]} {old[key]:.1f} -> {cur[key]:.1f} ({delta:+.1f}%)")
+            if parts:
+                print(f"  {group[:-1]}:{name:20} " + "  ".join(parts))
+
+
+# ---- main ----
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--docs", default=str(REPO_ROOT / "data" / "docs"))
+    p.add_argument("--questions", help="file with one question per line")
+    p.add_argument("--requests", type=int, default=100, help="requests per phase")
+    p.add_argument("--concurrency", type=int, default=4)
+    p.add_argument("--phases", default="ingest,retrieve,chat,stream")
+    p.add_argument("--store", choices=("chroma", "faiss", "numpy"), help="override providers.store")
+    p.add_argument("--answer-cache", action="store_true", help="keep the semantic answer cache on")
+    p.add_argument("--latency-ms", type=float, default=50.0, help="fake LLM time to first token")
+    p.add_argument("--token-rate", type=float, default=50.0, help="fake LLM tokens per second")
+    p.add_argument("--answer-tokens", type=int, default=48)
+    p.add_argument("--embed-latency-ms", type=float, default=0.0)
+    p.add_argument("--workdir", help="working directory for storage (default: a temp dir)")
+    p.add_argument("--out", help="result JSON path (default: storage/bench/<commit>-<time>.json)")
+    p.add_argument("--baseline", help="earlier result JSON to compare against")
+    p.add_argument("--verbose", action="store_true", help="show ingest output and app logs")
+    args = p.parse_args()
+
+    phases = [x.strip() for x in args.phases.split(",") if x.strip()]
+    docs_root = Path(args.docs).resolve()
+    questions = list(DEFAULT_QUESTIONS)
+    if args.questions:
+        questions = [q.strip() for q in Path(args.questions).read_text(encoding="utf-8").splitlines() if q.strip()]
+    workload = [questions[i % len(questions)] for i in range(args.requests)]
+
+    commit = git_commit()
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    out_path = Path(args.out).resolve() if args.out else REPO_ROOT / "storage" / "bench" / f"{commit or 'nogit'}-{stamp}.json"
+    baseline_path = Path(args.baseline).resolve() if args.baseline else None
+
+    fake = start_fake_ollama(
+        FakeOllamaConfig(
+            latency_ms=args.latency_ms,
+            token_rate=args.token_rate,
+            answer_tokens=args.answer_tokens,
+            embed_latency_ms=args.embed_latency_ms,
+        )
+    )
+    os.environ["OLLAMA_API_URL"] = f"http://127.0.0.1:{fake.server_port}"
+
+    # relative storage paths in configs/ resolve against the working directory
+    workdir = Path(args.workdir).resolve() if args.workdir else Path(tempfile.mkdtemp(prefix="rag-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    os.chdir(workdir)
+
+    from app.core.config import get_settings
+
+    settings = get_settings()
+    if args.store:
+        settings.providers.store = args.store
+    settings.rag.answer_cache.enabled = args.answer_cache
+    if not args.verbose:
+        settings.app.log_level = "WARNING"
+
+    from app.rag.providers_factory import create_providers
+    from app.rag.rag_factory import create_rag_service
+
+    embedder, llm = create_providers()
+    results: Dict[str, Any] = {
+        "meta": {
+            "commit": commit,
+            "timestamp": stamp,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "store": settings.providers.store,
+            "args": vars(args),
+        },
+        "phases": {},
+        "stages": {},
+    }
+
+    if "ingest" in phases:
+        print("ingest ...")
+        results["ingest"] = bench_ingest(docs_root, embedder, quiet=not args.verbose)
+
+    rag = create_rag_service(embedder, llm)
+    if not args.verbose:
+        import logging
+        logging.getLogger().setLevel(logging.WARNING)
+
+    if "retrieve" in phases:
+        print("retrieve ...")
+        lat, _, errors, wall = run_concurrent(rag.retriever.retrieve, workload, args.concurrency)
+        results["phases"]["retrieve"] = summarize(lat, wall, errors)
+
+    if "chat" in phases:
+        print("chat ...")
+        lat, answers, errors, wall = run_concurrent(rag.answer, workload, args.concurrency)
+        results["phases"]["chat"] = summarize(lat, wall, errors)
+
+        stage_samples: Dict[str, List[float]] = {}
+        for _, _, turn in answers:
+            for stage, secs in ((turn.ctx.timings or {}) if turn.ctx is not None else {}).items():
+                stage_samples.setdefault(stage, []).append(secs)
+        results["stages"] = {k: summarize(v) for k, v in stage_samples.items()}
+
+    if "stream" in phases:
+        print("stream ...")
+        results["phases"]["stream"] = bench_stream(workload, args.concurrency)
+
+    print_report(results)
+    if baseline_path is not None:
+        print_comparison(results, json.loads(baseline_path.read_text(encoding="utf-8")))
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"\nsaved {out_path}")
+    fake.shutdown()
+
+
+if __name__ == "__main__":
+    main()
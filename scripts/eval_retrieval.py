@@ -0,0 +1,273 @@
+"""
+Retrieval quality vs. latency across a grid of settings and store backends.
+
+    python -m scripts.eval_retrieval --dataset data/eval/retrieval.jsonl \
+        --stores chroma,numpy --top-k 3,5 --pool-k 10,25 --hybrid off,on
+
+Dataset: one JSON object per line,
+
+    {"question": "...", "expected": [{"source": "aoa.pdf", "page": 5}]}
+
+`page` is optional (any page of the source counts). A flat
+{"question", "source", "page"} line is accepted too.
+
+For every (store, top_k, retrieval_pool_k, hybrid, selection) combination it
+reports recall@1, recall@k, MRR, the deny rate (best distance above each
+--weak-threshold) and per-query retrieval latency. Query embeddings are
+computed once and reused, so latency is retrieval only. Stores that are
+empty in --persist-dir are ingested from --docs first.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from itertools import product
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+
+def load_dataset(path: Path) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    for n, line in enumerate(path.read_text(encoding="utf-8").splitlines(), start=1):
+        if not line.strip():
+            continue
+        obj = json.loads(line)
+        expected = obj.get("expected")
+        if expected is None:
+            expected = [{"source": obj["source"], "page": obj.get("page")}]
+        if not obj.get("question") or not expected:
+            raise ValueError(f"{path}:{n}: needs a question and an expected source")
+        rows.append({"question": obj["question"], "expected": expected})
+    return rows
+
+
+def is_relevant(citation, expected: List[Dict[str, Any]]) -> bool:
+    source = Path(citation.source or "").name
+    for exp in expected:
+        if Path(str(exp["source"])).name != source:
+            continue
+        if exp.get("page") is None or exp["page"] == citation.page:
+            return True
+    return False
+
+
+def _csv(value: str, cast=str) -> List[Any]:
+    return [cast(x.strip()) for x in value.split(",") if x.strip()]
+
+
+def _on_off(value: str) -> List[bool]:
+    return [x in ("on", "true", "1", "yes") for x in _csv(value.lower())]
+
+
+def _selections(args) -> List[tuple]:
+    """(selection, dedup_pages, mmr_lambda) variants to evaluate."""
+    out: List[tuple] = []
+    for selection in _csv(args.selection):
+        if selection == "mmr":
+            out += [("mmr", True, lam) for lam in _csv(args.mmr_lambda, float)]
+        else:
+            out += [("dedup", dedup, 0.7) for dedup in _on_off(args.dedup)]
+    return out
+
+
+def _selection_label(selection: str, dedup: bool, lam: float) -> str:
+    if selection == "mmr":
+        return f"mmr:{lam:g}"
+    return "dedup" if dedup else "nodedup"
+
+
+def open_store(name: str, persist_dir: Path, docs_root: Path, embedder, quiet: bool):
+    """Store + lexical index for one backend, ingesting first if the store is empty."""
+    from app.core.config import get_settings
+    from app.rag.ingest.pipeline import IngestPipelineConfig, ingest_folder
+    from app.rag.rag_factory import create_store
+    from app.rag.store.lexical_index import LexicalIndex, LexicalIndexConfig
+
+    settings = get_settings()
+    settings.providers.store = name
+    settings.rag.persist_dir = str(persist_dir)
+    store = create_store()
+    lexical = LexicalIndex(
+        LexicalIndexConfig(
+            persist_directory=persist_dir,
+            collection_name=settings.rag.collection_name,
+            k1=settings.rag.hybrid.k1,
+            b=settings.rag.hybrid.b,
+        )
+    )
+
+    if store.count() == 0 or lexical.count() == 0:
+        print(f"[{name}] ingesting {docs_root} ...")
+        # no manifest: backends share persist_dir, each needs every chunk
+        out = io.StringIO() if quiet else sys.stdout
+        with contextlib.redirect_stdout(out):
+            ingest_folder(IngestPipelineConfig(docs_root=docs_root), embedder=embedder, store=store, lexical=lexical)
+    return store, lexical
+
+
+def evaluate(retriever, dataset, q_vecs, weak_thresholds: List[float], repeat: int) -> Dict[str, Any]:
+    hits_at_1 = hits_at_k = 0
+    rr_sum = 0.0
+    denies = {t: 0 for t in weak_thresholds}
+    latencies: List[float] = []
+
+    for row, q_vec in zip(dataset, q_vecs):
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            docs, citations, dists = retriever.retrieve(row["question"], q_vec=q_vec)
+            latencies.append(time.perf_counter() - t0)
+
+        ranks = [i for i, c in enumerate(citations, start=1) if is_relevant(c, row["expected"])]
+        if ranks:
+            hits_at_k += 1
+            hits_at_1 += ranks[0] == 1
+            rr_sum += 1.0 / ranks[0]
+
+        best = min((d for d in dists if d is not None), default=None)
+        for t in weak_thresholds:
+            if best is None or best > t:
+                denies[t] += 1
+
+    n = len(dataset)
+    ms = np.asarray(latencies) * 1000
+    return {
+        "recall@1": round(hits_at_1 / n, 3),
+        "recall@k": round(hits_at_k / n, 3),
+        "mrr": round(rr_sum / n, 3),
+        "deny_rate": {str(t): round(c / n, 3) for t, c in denies.items()},
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+    }
+
+
+def print_table(rows: List[Dict[str, Any]], weak_thresholds: List[float]) -> None:
+    deny_cols = "".join(f"{'deny>' + str(t):>11}" for t in weak_thresholds)
+    print(
+        f"\n{'store':8}{'top_k':>6}{'pool':>6}{'hybrid':>7}{'select':>9}"
+        f"{'R@1':>7}{'R@k':>7}{'MRR':>7}{deny_cols}{'p50 ms':>9}{'p95 ms':>9}"
+    )
+    for r in rows:
+        deny = "".join(f"{r['deny_rate'][str(t)]:>11}" for t in weak_thresholds)
+        print(
+            f"{r['store']:8}{r['top_k']:>6}{r['pool_k']:>6}{'on' if r['hybrid'] else 'off':>7}"
+            f"{r['selection']:>9}{r['recall@1']:>7}{r['recall@k']:>7}{r['mrr']:>7}"
+            f"{deny}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+        )
+
+
+def cheapest(rows: List[Dict[str, Any]], tolerance: float) -> Optional[Dict[str, Any]]:
+    """Fastest configuration whose recall@k is within `tolerance` of the best."""
+    if not rows:
+        return None
+    best = max(r["recall@k"] for r in rows)
+    ok = [r for r in rows if r["recall@k"] >= best - tolerance]
+    return min(ok, key=lambda r: (r["p50_ms"], r["top_k"], r["pool_k"]))
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--dataset", default=str(REPO_ROOT / "data" / "eval" / "retrieval.jsonl"))
+    p.add_argument("--docs", default=str(REPO_ROOT / "data" / "docs"))
+    p.add_argument("--persist-dir", help="store directory (default: a temp dir, ingested from --docs)")
+    p.add_argument("--stores", default="chroma", help="comma list of chroma, faiss, numpy")
+    p.add_argument("--top-k", default="3,5")
+    p.add_argument("--pool-k", default="10,25")
+    p.add_argument("--hybrid", default="off,on")
+    p.add_argument("--dedup", default="on", help="(source, page) dedup: on, off or on,off")
+    p.add_argument("--selection", default="dedup", help="comma list of dedup, mmr")
+    p.add_argument("--mmr-lambda", default="0.7", help="comma list; used by --selection mmr")
+    p.add_argument("--weak-threshold", help="comma list (default: rag.distance.weak_threshold)")
+    p.add_argument("--repeat", type=int, default=3, help="timed runs per query")
+    p.add_argument("--tolerance", type=float, default=0.0, help="recall@k slack when picking the cheapest config")
+    p.add_argument("--fake-ollama", action="store_true", help="embed with scripts.fake_ollama (plumbing check only)")
+    p.add_argument("--out", help="write results as JSON")
+    p.add_argument("--verbose", action="store_true")
+    args = p.parse_args()
+
+    dataset = load_dataset(Path(args.dataset))
+    docs_root = Path(args.docs).resolve()
+    out_path = Path(args.out).resolve() if args.out else None
+
+    if args.fake_ollama:
+        from scripts.fake_ollama import FakeOllamaConfig, start_fake_ollama
+
+        fake = start_fake_ollama(FakeOllamaConfig())
+        os.environ["OLLAMA_API_URL"] = f"http://127.0.0.1:{fake.server_port}"
+
+    persist_dir = Path(args.persist_dir).resolve() if args.persist_dir else None
+    if persist_dir is None:
+        # temp workdir also keeps the embedding cache out of storage/
+        os.chdir(tempfile.mkdtemp(prefix="rag-eval-"))
+        persist_dir = Path("vectordb").resolve()
+
+    from app.core.config import get_settings
+    from app.rag.providers_factory import create_embedder
+    from app.rag.retrieve.retriever import Retriever, RetrieverConfig
+
+    settings = get_settings()
+    weak_thresholds = (
+        _csv(args.weak_threshold, float) if args.weak_threshold else [settings.rag.distance.weak_threshold]
+    )
+    embedder = create_embedder()
+
+    t0 = time.perf_counter()
+    q_vecs = embedder.embed_many([row["question"] for row in dataset])
+    embed_ms = (time.perf_counter() - t0) * 1000 / len(dataset)
+    print(f"{len(dataset)} questions, embedding {embed_ms:.1f} ms/query (not included below)")
+
+    rows: List[Dict[str, Any]] = []
+    for store_name in _csv(args.stores):
+        store, lexical = open_store(store_name, persist_dir, docs_root, embedder, quiet=not args.verbose)
+        grid = product(
+            _csv(args.top_k, int), _csv(args.pool_k, int), _on_off(args.hybrid), _selections(args)
+        )
+        for top_k, pool_k, hybrid, (selection, dedup, lam) in grid:
+            retriever = Retriever(
+                embedder=embedder,
+                store=store,
+                cfg=RetrieverConfig(
+                    top_k=top_k,
+                    retrieval_pool_k=pool_k,
+                    dedup_pages=dedup,
+                    selection=selection,
+                    mmr_lambda=lam,
+                    hybrid=hybrid,
+                    lexical_pool_k=settings.rag.hybrid.lexical_pool_k,
+                    rrf_k=settings.rag.hybrid.rrf_k,
+                    identifier_distance_cap=settings.rag.hybrid.identifier_distance_cap,
+                ),
+                lexical=lexical if hybrid else None,
+            )
+            result = evaluate(retriever, dataset, q_vecs, weak_thresholds, max(1, args.repeat))
+            rows.append({
+                "store": store_name, "top_k": top_k, "pool_k": pool_k, "hybrid": hybrid,
+                "selection": _selection_label(selection, dedup, lam), **result,
+            })
+
+    print_table(rows, weak_thresholds)
+    pick = cheapest(rows, args.tolerance)
+    if pick is not None:
+        print(
+            f"\ncheapest within {args.tolerance:.2f} of best recall@k: store={pick['store']} "
+            f"top_k={pick['top_k']} pool_k={pick['pool_k']} hybrid={pick['hybrid']} selection={pick['selection']}"
+        )
+
+    if out_path is not None:
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"dataset": args.dataset, "embed_ms_per_query": round(embed_ms, 2), "results": rows}
+        out_path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+        print(f"saved {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Deterministic local stand-in for the Ollama HTTP API (no model, no network).
+
+    python -m scripts.fake_ollama --port 11434 --token-rate 40 --latency-ms 150
+
+Point the app at it with OLLAMA_API_URL=http://127.0.0.1:<port>.
+
+- /api/embeddings, /api/embed: hashed bag-of-words vectors, so texts that
+  share words are close and retrieval behaves sensibly
+- /api/generate: answers built from the first context chunk in the
+  prompt, streamed (or not) at a fixed token rate after a fixed latency
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_CONTEXT_RE = re.compile(r"\[1\]\s*(.+)", re.DOTALL)
+
+
+@dataclass
+class FakeOllamaConfig:
+    host: str = "127.0.0.1"
+    port: int = 0  # 0 = pick a free port
+    dim: int = 768
+
+    # generation
+    latency_ms: float = 50.0  # before the first token
+    token_rate: float = 50.0  # tokens / second after the first one
+    answer_tokens: int = 48
+
+    # per embedding request
+    embed_latency_ms: float = 0.0
+
+
+def hash_embedding(text: str, dim: int) -> List[float]:
+    """
+    Signed feature hashing of lowercased words, plus an equal-weight
+    component shared by every text. The shared part puts cosine distances
+    in [0, ~0.5] like a real embedding model (unrelated ~0.5, overlapping
+    words lower), so the distance thresholds let answers through.
+    """
+    v = [0.0] * dim
+    for word in _WORD_RE.findall((text or "").lower()):
+        h = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+        v[h % dim] += 1.0 if (h >> 63) & 1 else -1.0
+    n = math.sqrt(sum(x * x for x in v)) or 1.0
+    shared = 1.0 / math.sqrt(dim)
+    v = [x / n + shared for x in v]
+    n = math.sqrt(sum(x * x for x in v))
+    return [x / n for x in v]
+
+
+def fake_answer(prompt: str, n_tokens: int) -> List[str]:
+    """Token chunks (with trailing spaces) for a prompt."""
+    m = _CONTEXT_RE.search(prompt or "")
+    source = m.group(1) if m else (prompt or "")
+    words = source.split()[: max(1, n_tokens - 1)] or ["ok"]
+    return [w + " " for w in words] + ["[1]"]
+
+
+def _handler(cfg: FakeOllamaConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:
+            return
+
+        def handle_one_request(self) -> None:
+            # a client that gives up (timeout, cancelled stream) is normal in benchmarks
+            try:
+                super().handle_one_request()
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+
+        def _send_json(self, code: int, obj) -> None:
+            body = json.dumps(obj).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _chunk(self, obj) -> None:
+            line = (json.dumps(obj) + "\n").encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            self.wfile.flush()
+
+        def do_GET(self) -> None:
+            if self.path == "/api/tags":
+                return self._send_json(200, {"models": []})
+            self._send_json(404, {"error": "not found"})
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+
+            if self.path == "/api/embeddings":
+                time.sleep(cfg.embed_latency_ms / 1000)
+                return self._send_json(200, {"embedding": hash_embedding(body.get("prompt", ""), cfg.dim)})
+
+            if self.path == "/api/embed":
+                time.sleep(cfg.embed_latency_ms / 1000)
+                texts = body.get("input", [])
+                texts = [texts] if isinstance(texts, str) else texts
+                return self._send_json(200, {"embeddings": [hash_embedding(t, cfg.dim) for t in texts]})
+
+            if self.path == "/api/generate":
+                return self._generate(body)
+
+            self._send_json(404, {"error": "not found"})
+
+        def _generate(self, body) -> None:
+            tokens = fake_answer(body.get("prompt", ""), cfg.answer_tokens)
+            gap = 1.0 / cfg.token_rate if cfg.token_rate > 0 else 0.0
+            time.sleep(cfg.latency_ms / 1000)
+
+            if not body.get("stream", True):
+                time.sleep(gap * (len(tokens) - 1))
+                return self._send_json(200, {"response": "".join(tokens), "done": True})
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i, tok in enumerate(tokens):
+                if i:
+                    time.sleep(gap)
+                self._chunk({"response": tok, "done": False})
+            self._chunk({"response": "", "done": True})
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+
+def start_fake_ollama(cfg: FakeOllamaConfig) -> ThreadingHTTPServer:
+    """Serve in a daemon thread; `server.server_port` is the bound port."""
+    server = ThreadingHTTPServer((cfg.host, cfg.port), _handler(cfg))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=11434)
+    p.add_argument("--dim", type=int, default=768)
+    p.add_argument("--latency-ms", type=float, default=50.0)
+    p.add_argument("--token-rate", type=float, default=50.0)
+    p.add_argument("--answer-tokens", type=int, default=48)
+    p.add_argument("--embed-latency-ms", type=float, default=0.0)
+    args = p.parse_args()
+
+    cfg = FakeOllamaConfig(
+        host=args.host,
+        port=args.port,
+        dim=args.dim,
+        latency_ms=args.latency_ms,
+        token_rate=args.token_rate,
+        answer_tokens=args.answer_tokens,
+        embed_latency_ms=args.embed_latency_ms,
+    )
+    server = ThreadingHTTPServer((cfg.host, cfg.port), _handler(cfg))
+    server.daemon_threads = True
+    print(f"Fake Ollama listening on http://{cfg.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
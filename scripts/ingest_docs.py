@@ -1,9 +1,10 @@
 from __future__ import annotations
 from pathlib import Path
+import sys
 
-from app.rag.ingest.pipeline import IngestPipelineConfig, ingest_folder
-from app.rag.embeddings.ollama_embedder import OllamaEmbedder, OllamaEmbedderConfig
-from app.rag.store.chroma_store import ChromaStore, ChromaStoreConfig
+from app.rag.ingest.pipeline import IngestPipelineConfig, default_manifest_path, ingest_folder
+from app.rag.providers_factory import create_embedder
+from app.rag.rag_factory import create_lexical_index, create_store
 
 from app.core.config import get_settings
 
@@ -11,14 +12,18 @@ def main():
 
     settings = get_settings()
     
-    # embedder
-    embedder = OllamaEmbedder(
-        OllamaEmbedderConfig(model_name=settings.ollama.embeddings.model_name))
+    # embedder (wrapped with the on-disk embedding cache when enabled)
+    embedder = create_embedder()
     
-    # vector store
-    store = ChromaStore(
-        ChromaStoreConfig(persist_directory=Path("storage") / "vectordb", collection_name=settings.rag.collection_name)
-        )
+    # --shard <doc_type> (repeatable): re-ingest only those docs/<doc_type>/ folders
+    args = sys.argv[1:]
+    shards = tuple(args[i + 1] for i, a in enumerate(args[:-1]) if a == "--shard") or None
+
+    # vector store (chroma, faiss or numpy per providers.store; one per doc_type with rag.sharding)
+    persist_dir = Path(settings.rag.persist_dir)
+    store = create_store()
+    # BM25 index for hybrid retrieval (None when rag.hybrid is disabled)
+    lexical = create_lexical_index()
 
     # ingest pipeline config
     ingest_cfg = IngestPipelineConfig(
@@ -26,12 +31,18 @@ def main():
         allowed_ext=(".pdf",),
         chunk_size=1000,
         chunk_overlap=200,
+        manifest_path=default_manifest_path(persist_dir, settings.rag.collection_name),
+        force="--full" in args or shards is not None,
+        doc_types=shards,
     )
 
     total_chunks = ingest_folder(
-        ingest_cfg, embedder=embedder, store=store)
+        ingest_cfg, embedder=embedder, store=store, lexical=lexical)
     
     print(f"Total chunks ingested: {total_chunks}")
+    print(f"Store: {store.heartbeat()}")
+    if hasattr(embedder, "stats"):
+        print(f"Embedding cache: {embedder.stats()}")
 
 if __name__ == "__main__":
     main()
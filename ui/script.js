@@ -23,7 +23,7 @@ let isWaitingForResponse = false;
 let currentAbort = null;
 let currentTypingRow = null;
 
-let sessions = [];          // {id,title,messages:[{role,text,citations?}], history:[{role,text}]}
+let sessions = [];          // {id,title,messages:[{role,text,citations?}], history:[{role,text}], serverHeld}
 let activeChatId = null;
 let renamingChatId = null;
 
@@ -245,6 +245,8 @@ function createNewChatSession() {
     title: "New chat",
     messages: [{ role: "assistant", text: "Welcome! How can I help you." }],
     history: [],
+    // true once the server keeps this chat's history (then only the new message is sent)
+    serverHeld: false,
   };
   sessions.unshift(chat);
   activeChatId = id;
@@ -400,11 +402,12 @@ function parseSSEChunk(raw) {
   return { events, rest };
 }
 
-async function streamChat({ message, history, onCitations, onToken, onDone }) {
+async function streamChat({ message, sessionId, history, onCitations, onToken, onDone }) {
   const res = await fetch(CHAT_STREAM_ENDPOINT, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ message, history }),
+    // history is left out (undefined) when the server already holds it
+    body: JSON.stringify({ message, session_id: sessionId, history }),
     signal: currentAbort.signal,
   });
 
@@ -443,13 +446,20 @@ async function streamChat({ message, history, onCitations, onToken, onDone }) {
         }
         if (chunk) onToken(chunk);
       } else if (evt.event === "done") {
-        onDone();
+        // {session_id?, session_restored?, timing_ms?}
+        let info = {};
+        try {
+          info = JSON.parse(evt.data || "{}") || {};
+        } catch {
+          info = {};
+        }
+        onDone(info);
         return;
       }
     }
   }
 
-  onDone();
+  onDone({});
 }
 
 /* =========================================================
@@ -560,9 +570,11 @@ formEl.addEventListener("submit", async (e) => {
   currentAbort = new AbortController();
 
   try {
-    await streamChat({
+    let doneInfo = {};
+    const runStream = (history) => streamChat({
       message: msg,
-      history: chat.history,
+      sessionId: chat.id,
+      history,
       onCitations: (cites) => {
         // IMPORTANT: only store here — do not render here
         pendingCitations = Array.isArray(cites) ? cites : [];
@@ -577,9 +589,21 @@ formEl.addEventListener("submit", async (e) => {
           scrollToBottom(true);
         }
       },
-      onDone: () => {},
+      onDone: (info) => {
+        doneInfo = info || {};
+      },
     });
 
+    // after the first turn the server holds the history: send only the message
+    await runStream(chat.serverHeld ? undefined : chat.history);
+    if (doneInfo.session_restored === false) {
+      // the server lost this chat's session (expired / restarted): ask again with the history
+      pendingCitations = [];
+      streamingAssistantText = "";
+      await runStream(chat.history);
+    }
+    chat.serverHeld = Boolean(doneInfo.session_id);
+
     // Replace typing bubble with final assistant message + citations (BOTTOM only)
     if (currentTypingRow) currentTypingRow.remove();
     currentTypingRow = null;